@@ -0,0 +1,311 @@
+"""
+Zoomable, pannable board view backed by a lazily built tile pyramid.
+
+Viewport maps board (virtual) pixels to screen pixels inside the board
+area of the window. TilePyramid keeps the board image at power-of-two
+scales (level L is the source halved L times), built only when a zoom
+level first needs it, and cuts them into square tiles. Each frame only
+the tiles that intersect the view are scaled to the current zoom and
+blitted; scaled tiles live in an LRU cache, so panning and redrawing at
+a steady zoom costs a blit per visible tile.
+
+PathLayer and TrailLayer draw polylines (a mission's planned path, the
+robot's trail) onto cached transparent surfaces that are re-stroked only
+when the view changes, so a visible overlay costs one blit per frame.
+
+The board at the window's fit size is also cached on disk as raw pixels,
+keyed by the image's SHA-1 and the target size, so later launches show
+the first frame without decoding or scaling the full-size image.
+"""
+
+import hashlib
+import math
+import os
+import struct
+from collections import OrderedDict
+from pathlib import Path
+
+CACHE_MAGIC = b"SPBC"
+CACHE_HEADER = struct.Struct("<4sII")
+
+
+class Viewport:
+    def __init__(self, rect, board_w, board_h, fit_scale, max_zoom=16.0):
+        self.rect = rect  # screen area (pygame.Rect) the board is drawn into
+        self.board_w = float(board_w)
+        self.board_h = float(board_h)
+        self.fit_scale = float(fit_scale)
+        self.max_zoom = float(max_zoom)
+        self.reset()
+
+    def reset(self):
+        self.zoom = 1.0
+        self.ox = 0.0  # board coordinate at the left/top edge of the view
+        self.oy = 0.0
+
+    @property
+    def scale(self):
+        """Screen pixels per board pixel."""
+        return self.fit_scale * self.zoom
+
+    def to_screen(self, bx, by):
+        s = self.scale
+        return (
+            self.rect.left + (bx - self.ox) * s,
+            self.rect.top + (by - self.oy) * s,
+        )
+
+    def to_board(self, sx, sy):
+        s = self.scale
+        return (
+            self.ox + (sx - self.rect.left) / s,
+            self.oy + (sy - self.rect.top) / s,
+        )
+
+    def visible_board_rect(self):
+        s = self.scale
+        return self.ox, self.oy, self.rect.width / s, self.rect.height / s
+
+    def zoom_at(self, factor, screen_pos):
+        """Zoom by *factor* keeping the board point under *screen_pos* fixed."""
+        bx, by = self.to_board(*screen_pos)
+        self.zoom = min(self.max_zoom, max(1.0, self.zoom * factor))
+        s = self.scale
+        self.ox = bx - (screen_pos[0] - self.rect.left) / s
+        self.oy = by - (screen_pos[1] - self.rect.top) / s
+        self.clamp()
+
+    def pan(self, dx, dy):
+        """Move the view by a screen-pixel drag (dx, dy)."""
+        s = self.scale
+        self.ox -= dx / s
+        self.oy -= dy / s
+        self.clamp()
+
+    def clamp(self):
+        _, _, vw, vh = self.visible_board_rect()
+        self.ox = min(max(0.0, self.ox), max(0.0, self.board_w - vw))
+        self.oy = min(max(0.0, self.oy), max(0.0, self.board_h - vh))
+
+
+class TilePyramid:
+    """Board image pyramid; *load_source* returns the full-size Surface and
+    is only called when a level is first needed."""
+
+    def __init__(
+        self, load_source, source_size, image_scale=1.0, tile=256, cache_tiles=192
+    ):
+        self.load_source = load_source
+        self.source_w, self.source_h = source_size
+        self.image_scale = float(image_scale)  # board pixels per image pixel
+        self.tile = int(tile)
+        self.cache_tiles = int(cache_tiles)
+        self.max_level = max(
+            0, int(math.log2(max(self.source_w, self.source_h) / self.tile))
+        )
+        self.levels = {}
+        self.cache = OrderedDict()
+
+    def level_for(self, image_to_screen):
+        # coarsest level that still has at least one pixel per screen pixel
+        if image_to_screen >= 1.0:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1.0 / image_to_screen))))
+
+    def level(self, L):
+        surf = self.levels.get(L)
+        if surf is None:
+            import pygame
+
+            if L == 0:
+                surf = self.load_source()
+            else:
+                prev = self.level(L - 1)
+                w, h = prev.get_size()
+                surf = pygame.transform.smoothscale(
+                    prev, (max(1, w // 2), max(1, h // 2))
+                )
+            self.levels[L] = surf
+        return surf
+
+    def _scaled_tile(self, L, tx, ty, size):
+        key = (L, tx, ty, size)
+        surf = self.cache.get(key)
+        if surf is not None:
+            self.cache.move_to_end(key)
+            return surf
+        import pygame
+
+        src = self.level(L)
+        lw, lh = src.get_size()
+        r = pygame.Rect(tx * self.tile, ty * self.tile, self.tile, self.tile).clip(
+            pygame.Rect(0, 0, lw, lh)
+        )
+        piece = src.subsurface(r)
+        if size == r.size:
+            surf = piece.copy()
+        else:
+            surf = pygame.transform.smoothscale(piece, size)
+        self.cache[key] = surf
+        if len(self.cache) > self.cache_tiles:
+            self.cache.popitem(last=False)
+        return surf
+
+    def draw(self, screen, view):
+        """Blit the tiles that intersect *view* onto *screen*."""
+        image_to_screen = view.scale * self.image_scale
+        L = self.level_for(image_to_screen)
+        f = 2**L  # source pixels per level pixel
+        lvl = self.level(L)
+        lw, lh = lvl.get_size()
+        bx, by, bw, bh = view.visible_board_rect()
+        # visible area in level pixels
+        x0 = bx / self.image_scale / f
+        y0 = by / self.image_scale / f
+        x1 = (bx + bw) / self.image_scale / f
+        y1 = (by + bh) / self.image_scale / f
+        t = self.tile
+        tx0 = max(0, int(x0 // t))
+        ty0 = max(0, int(y0 // t))
+        tx1 = min((lw - 1) // t, int(x1 // t))
+        ty1 = min((lh - 1) // t, int(y1 // t))
+        to_board = self.image_scale * f
+        prev_clip = screen.get_clip()
+        screen.set_clip(view.rect)
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                # exact integer screen edges so neighbouring tiles never gap
+                left, top = view.to_screen(tx * t * to_board, ty * t * to_board)
+                right, bottom = view.to_screen(
+                    min(lw, (tx + 1) * t) * to_board, min(lh, (ty + 1) * t) * to_board
+                )
+                sx0, sy0 = int(math.floor(left)), int(math.floor(top))
+                size = (
+                    max(1, int(math.floor(right)) - sx0),
+                    max(1, int(math.floor(bottom)) - sy0),
+                )
+                screen.blit(self._scaled_tile(L, tx, ty, size), (sx0, sy0))
+        screen.set_clip(prev_clip)
+
+
+class PathLayer:
+    """Polyline in board pixels (a mission's planned path) stroked once onto
+    a transparent surface; it is re-stroked only when the view changes."""
+
+    def __init__(self, points, color, width=2):
+        self.points = list(points)
+        self.color = color
+        self.width = width
+        self.surface = None
+        self._key = None
+
+    def _render(self, view):
+        import pygame
+
+        self.surface = pygame.Surface(view.rect.size, pygame.SRCALPHA)
+        self._stroke(view, self.points)
+
+    def _stroke(self, view, points):
+        import pygame
+
+        if len(points) < 2:
+            return
+        left, top = view.rect.topleft
+        pts = [
+            (sx - left, sy - top)
+            for sx, sy in (view.to_screen(x, y) for x, y in points)
+        ]
+        pygame.draw.lines(self.surface, self.color, False, pts, self.width)
+
+    def draw(self, screen, view):
+        key = (view.zoom, view.ox, view.oy, view.rect.size)
+        if key != self._key:
+            self._render(view)
+            self._key = key
+        screen.blit(self.surface, view.rect.topleft)
+
+
+class TrailLayer(PathLayer):
+    """The robot's actual trail. New points are stroked onto the cached
+    surface as they arrive; only a view change re-strokes the whole trail."""
+
+    def __init__(self, color, width=2, min_step=1.0):
+        super().__init__((), color, width)
+        self.min_step = min_step
+        self._drawn = 0  # points already on the surface
+
+    def add(self, x, y):
+        if self.points:
+            px, py = self.points[-1]
+            if abs(x - px) < self.min_step and abs(y - py) < self.min_step:
+                return
+        self.points.append((x, y))
+
+    def clear(self):
+        self.points = []
+        self._key = None
+
+    def _render(self, view):
+        super()._render(view)
+        self._drawn = len(self.points)
+
+    def draw(self, screen, view):
+        key = (view.zoom, view.ox, view.oy, view.rect.size)
+        if key != self._key:
+            self._render(view)
+            self._key = key
+        elif self._drawn < len(self.points):
+            # overlap one point so the new segment joins the old ones
+            self._stroke(view, self.points[max(0, self._drawn - 1) :])
+            self._drawn = len(self.points)
+        screen.blit(self.surface, view.rect.topleft)
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def image_size(path):
+    """(width, height) read from a PNG header, or None for other formats."""
+    with open(path, "rb") as f:
+        head = f.read(24)
+    if len(head) == 24 and head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    return None
+
+
+def cached_scaled_board(path, size, cache_dir, digest=None):
+    """The board image smoothscaled to *size*, from *cache_dir* when possible.
+
+    Returns (surface, hit). On a miss the full image is loaded, scaled and
+    written to the cache (best effort; an unwritable cache is ignored).
+    """
+    import pygame
+
+    w, h = size
+    digest = digest or file_digest(path)
+    cache_path = Path(cache_dir) / f"{digest}_{w}x{h}.bin"
+    try:
+        data = cache_path.read_bytes()
+        magic, cw, ch = CACHE_HEADER.unpack_from(data)
+        if magic == CACHE_MAGIC and (cw, ch) == (w, h):
+            pixels = data[CACHE_HEADER.size :]
+            return pygame.image.frombytes(pixels, (w, h), "RGB").convert(), True
+    except (OSError, struct.error, ValueError):
+        pass
+
+    surf = pygame.transform.smoothscale(pygame.image.load(path).convert(), (w, h))
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, w, h))
+            f.write(pygame.image.tobytes(surf, "RGB"))
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        print("Could not write board cache:", e)
+    return surf, False
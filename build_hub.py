@@ -0,0 +1,569 @@
+"""
+Build a minimal single-file hub program from a mission file.
+
+Keeps only what the chosen entry mission can reach: DEBUG-only branches are
+folded away, docstrings are stripped, simple module constants (MAX_DPS, ports,
+PAIR_ID, ...) are inlined and unreachable functions, methods and imports are
+dropped. Unused module-level assignments are only dropped when evaluating them
+has no side effects.
+
+Usage:
+    python build_hub.py working_spike.py Run_3_Travel
+    python build_hub.py working_spike.py Run_5_Crane --out build/crane.py --mpy
+Options:
+    --out        output file (default: build/<file>_<entry>.py)
+    --slot       override the '# LEGO slot:N autostart' header slot
+    --keep-debug keep the DEBUG constant and its branches
+    --mpy        also precompile with mpy-cross (if installed)
+"""
+
+import ast
+import argparse
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+HEADER_RE = re.compile(r"^#\s*LEGO\s+slot:\s*\d+.*$")
+
+
+def read_header(src):
+    # leading '# LEGO slot:N ...' comment lines, which ast drops
+    header = []
+    for line in src.splitlines():
+        if HEADER_RE.match(line.strip()):
+            header.append(line.rstrip())
+        elif line.strip() and not line.strip().startswith("#"):
+            break
+    return header
+
+
+def is_main_guard(node):
+    # `if __name__ == "__main__":`
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+    t = node.test
+    return (
+        isinstance(t.left, ast.Name)
+        and t.left.id == "__name__"
+        and len(t.comparators) == 1
+        and isinstance(t.comparators[0], ast.Constant)
+        and t.comparators[0].value == "__main__"
+    )
+
+
+def strip_docstrings(tree):
+    for node in ast.walk(tree):
+        if isinstance(
+            node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        ):
+            body = node.body
+            if (
+                body
+                and isinstance(body[0], ast.Expr)
+                and isinstance(body[0].value, ast.Constant)
+                and isinstance(body[0].value.value, str)
+            ):
+                body.pop(0)
+                if not body and not isinstance(node, ast.Module):
+                    body.append(ast.Pass())
+
+
+def imported_names(tree):
+    names = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for a in node.names:
+                names.add((a.asname or a.name).split(".")[0])
+        elif isinstance(node, ast.ImportFrom):
+            for a in node.names:
+                names.add(a.asname or a.name)
+    return names
+
+
+def find_constants(tree, keep=()):
+    """Module-level names bound once to a literal or an imported attribute."""
+    modules = imported_names(tree)
+    assigned = {}
+    rebound = set()
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+        ):
+            name = node.targets[0].id
+            if name in assigned:
+                rebound.add(name)
+            assigned[name] = node.value
+    # names assigned through `global` inside functions are rebound at runtime
+    for func in ast.walk(tree):
+        if isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            globals_ = set()
+            for sub in ast.walk(func):
+                if isinstance(sub, ast.Global):
+                    globals_.update(sub.names)
+            for sub in ast.walk(func):
+                if (
+                    isinstance(sub, ast.Name)
+                    and isinstance(sub.ctx, ast.Store)
+                    and sub.id in globals_
+                ):
+                    rebound.add(sub.id)
+
+    consts = {}
+    for name, value in assigned.items():
+        if name in rebound or name in keep:
+            continue
+        if isinstance(value, ast.Constant) and not isinstance(value.value, str):
+            consts[name] = value
+        elif isinstance(value, ast.UnaryOp) and isinstance(value.operand, ast.Constant):
+            consts[name] = value
+        elif (
+            isinstance(value, ast.Attribute)
+            and isinstance(value.value, ast.Name)
+            and value.value.id in modules
+        ):
+            consts[name] = value
+    return consts
+
+
+def local_names(func):
+    # names bound inside func (parameters and assignments), minus globals
+    names = set()
+    a = func.args
+    for arg in a.posonlyargs + a.args + a.kwonlyargs:
+        names.add(arg.arg)
+    if a.vararg:
+        names.add(a.vararg.arg)
+    if a.kwarg:
+        names.add(a.kwarg.arg)
+    globals_ = set()
+    for sub in ast.walk(func):
+        if isinstance(sub, ast.Global):
+            globals_.update(sub.names)
+        elif isinstance(sub, ast.Name) and isinstance(sub.ctx, ast.Store):
+            names.add(sub.id)
+        elif isinstance(sub, ast.arg):
+            names.add(sub.arg)
+    return names - globals_
+
+
+class ConstantInliner(ast.NodeTransformer):
+    def __init__(self, consts):
+        self.consts = consts
+        self.shadowed = [set()]
+
+    def visit_FunctionDef(self, node):
+        self.shadowed.append(self.shadowed[-1] | local_names(node))
+        self.generic_visit(node)
+        self.shadowed.pop()
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self.shadowed.append(self.shadowed[-1] | local_names(node))
+        self.generic_visit(node)
+        self.shadowed.pop()
+        return node
+
+    def visit_Name(self, node):
+        if (
+            isinstance(node.ctx, ast.Load)
+            and node.id in self.consts
+            and node.id not in self.shadowed[-1]
+        ):
+            return ast.copy_location(
+                ast.parse(ast.unparse(self.consts[node.id]), mode="eval").body, node
+            )
+        return node
+
+
+def const_truth(node):
+    # truth value of a constant test, or None when unknown
+    if isinstance(node, ast.Constant):
+        return bool(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = const_truth(node.operand)
+        return None if inner is None else not inner
+    if isinstance(node, ast.BoolOp):
+        # only a constant prefix decides it; later operands may have effects
+        decides = isinstance(node.op, ast.Or)
+        for value in node.values:
+            truth = const_truth(value)
+            if truth is None:
+                return None
+            if truth == decides:
+                return decides
+        return not decides
+    return None
+
+
+TERMINATORS = (ast.Return, ast.Raise, ast.Continue, ast.Break)
+FOLD_MAX_EXPONENT = 64  # larger powers and shifts are left for the hub
+
+
+def foldable(op, left, right):
+    # folding must not build huge numbers (10**10**8 would hang the build)
+    if isinstance(op, ast.Pow):
+        return abs(right) <= FOLD_MAX_EXPONENT and abs(left) <= 1 << 32
+    if isinstance(op, ast.LShift):
+        return 0 <= right <= FOLD_MAX_EXPONENT
+    return True
+
+
+class DeadBranchFolder(ast.NodeTransformer):
+    def _fold_body(self, body):
+        out = []
+        for stmt in body:
+            res = self.visit(stmt)
+            if res is None:
+                continue
+            if isinstance(res, list):
+                out.extend(res)
+            else:
+                out.append(res)
+            if out and isinstance(out[-1], TERMINATORS):
+                break  # the rest of the block is unreachable
+        return out
+
+    def generic_visit(self, node):
+        for field in ("body", "orelse", "finalbody"):
+            stmts = getattr(node, field, None)
+            if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                folded = self._fold_body(stmts)
+                if not folded and field == "body":
+                    folded = [ast.Pass()]
+                setattr(node, field, folded)
+        for field, value in ast.iter_fields(node):
+            if field in ("body", "orelse", "finalbody") and isinstance(value, list):
+                continue
+            if isinstance(value, ast.AST):
+                setattr(node, field, self.visit(value))
+            elif isinstance(value, list):
+                setattr(
+                    node,
+                    field,
+                    [self.visit(v) if isinstance(v, ast.AST) else v for v in value],
+                )
+        return node
+
+    def visit_If(self, node):
+        node = self.generic_visit(node)
+        truth = const_truth(node.test)
+        if truth is None:
+            return node
+        kept = node.body if truth else node.orelse
+        kept = [s for s in kept if not isinstance(s, ast.Pass)]
+        return kept or None
+
+    def visit_IfExp(self, node):
+        node = self.generic_visit(node)
+        truth = const_truth(node.test)
+        if truth is None:
+            return node
+        return node.body if truth else node.orelse
+
+    def visit_BinOp(self, node):
+        node = self.generic_visit(node)
+        if (
+            isinstance(node.left, ast.Constant)
+            and isinstance(node.right, ast.Constant)
+            and isinstance(node.left.value, (int, float))
+            and isinstance(node.right.value, (int, float))
+            and foldable(node.op, node.left.value, node.right.value)
+        ):
+            try:
+                value = eval(
+                    compile(ast.Expression(body=node), "<fold>", "eval"), {}, {}
+                )
+            except Exception:
+                return node
+            return ast.copy_location(ast.Constant(value=value), node)
+        return node
+
+
+def referenced_names(node):
+    return {
+        n.id
+        for n in ast.walk(node)
+        if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)
+    }
+
+
+def plain_classes(tree):
+    """Classes whose construction has no side effects: no bases or decorators,
+    and an __init__ (if any) that only stores side-effect-free values."""
+    classes = set()
+    for n in tree.body:
+        if not isinstance(n, ast.ClassDef) or n.bases or n.keywords:
+            continue
+        if n.decorator_list:
+            continue
+        init = [
+            m for m in n.body if isinstance(m, ast.FunctionDef) and m.name == "__init__"
+        ]
+        if not init or all(
+            isinstance(stmt, ast.Pass)
+            or (
+                isinstance(stmt, ast.Assign)
+                and all(isinstance(t, ast.Attribute) for t in stmt.targets)
+                and is_pure(stmt.value)
+            )
+            for stmt in init[0].body
+        ):
+            classes.add(n.name)
+    return classes
+
+
+def is_pure(node, classes=()):
+    # evaluating node has no side effects: literals, names, attribute reads,
+    # containers and arithmetic of those, and constructing one of *classes*
+    if isinstance(node, (ast.Constant, ast.Name, ast.Lambda)):
+        return True
+    if isinstance(node, ast.Attribute):
+        return is_pure(node.value, classes)
+    if isinstance(node, ast.UnaryOp):
+        return is_pure(node.operand, classes)
+    if isinstance(node, ast.BinOp):
+        return is_pure(node.left, classes) and is_pure(node.right, classes)
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return all(is_pure(e, classes) for e in node.elts)
+    if isinstance(node, ast.Dict):
+        return all(k is None or is_pure(k, classes) for k in node.keys) and all(
+            is_pure(v, classes) for v in node.values
+        )
+    if isinstance(node, ast.Call):
+        return (
+            isinstance(node.func, ast.Name)
+            and node.func.id in classes
+            and all(is_pure(a, classes) for a in node.args)
+            and all(is_pure(k.value, classes) for k in node.keywords)
+        )
+    return False
+
+
+def prune_methods(tree):
+    """Drop methods of module-level classes whose name is never read as an
+    attribute anywhere (e.g. helpers only called from a folded-away branch).
+    Dunder methods are kept. True if anything was removed."""
+    attrs = {n.attr for n in ast.walk(tree) if isinstance(n, ast.Attribute)}
+    changed = False
+    for cls in tree.body:
+        if not isinstance(cls, ast.ClassDef):
+            continue
+        body = [
+            m
+            for m in cls.body
+            if not isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))
+            or (m.name.startswith("__") and m.name.endswith("__"))
+            or m.name in attrs
+        ]
+        if len(body) != len(cls.body):
+            cls.body = body or [ast.Pass()]
+            changed = True
+    return changed
+
+
+def reachable_defs(tree, roots):
+    defs = {
+        n.name: n
+        for n in tree.body
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+    # module-level tables (e.g. RUNS) make the functions they list reachable
+    for n in tree.body:
+        if isinstance(n, ast.Assign):
+            for t in n.targets:
+                if isinstance(t, ast.Name) and t.id not in defs:
+                    defs[t.id] = n.value
+    seen = set()
+    todo = [r for r in roots if r in defs]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        for ref in referenced_names(defs[name]):
+            if ref in defs and ref not in seen:
+                todo.append(ref)
+    return seen
+
+
+def prune_module(tree, entry):
+    defs = {
+        n.name
+        for n in tree.body
+        if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+    if entry not in defs:
+        raise SystemExit(f"entry '{entry}' is not a function in this file")
+
+    # call init() first unless the entry already does so itself
+    main_body = [ast.Expr(ast.Call(ast.Name(entry, ast.Load()), [], []))]
+    if "init" in defs and "init" not in reachable_defs(tree, [entry]):
+        main_body.insert(0, ast.Expr(ast.Call(ast.Name("init", ast.Load()), [], [])))
+    guard = ast.parse('if __name__ == "__main__":\n    pass').body[0]
+    guard.body = main_body
+
+    body = [n for n in tree.body if not is_main_guard(n)]
+    body.append(guard)
+    tree.body = body
+
+    # module-level code that stays (the guard, calls, assignments with side
+    # effects) needs everything it names
+    classes = plain_classes(tree)
+    roots = set()
+    for n in tree.body:
+        if isinstance(
+            n,
+            (
+                ast.FunctionDef,
+                ast.AsyncFunctionDef,
+                ast.ClassDef,
+                ast.Import,
+                ast.ImportFrom,
+            ),
+        ):
+            continue
+        if isinstance(n, ast.Assign) and is_pure(n.value, classes):
+            continue
+        roots |= referenced_names(n)
+
+    # dropping a method can orphan functions and other methods it used
+    while True:
+        keep = reachable_defs(tree, roots)
+        tree.body = [
+            n
+            for n in tree.body
+            if not isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+            or n.name in keep
+        ]
+        if not prune_methods(tree):
+            break
+
+    # drop globals for names that no longer exist, then unused side-effect-free
+    # assignments and imports (repeat until stable: removing one assignment can
+    # orphan an import)
+    while True:
+        used = set()
+        for n in tree.body:
+            if isinstance(n, ast.Assign):
+                used |= referenced_names(n.value)
+            elif not isinstance(n, (ast.Import, ast.ImportFrom)):
+                used |= referenced_names(n)
+        new_body = []
+        for n in tree.body:
+            if isinstance(n, ast.Assign):
+                targets = [t.id for t in n.targets if isinstance(t, ast.Name)]
+                if (
+                    targets
+                    and len(targets) == len(n.targets)
+                    and not (set(targets) & used)
+                    and is_pure(n.value, classes)
+                ):
+                    continue
+            elif isinstance(n, ast.Import):
+                n.names = [
+                    a for a in n.names if (a.asname or a.name).split(".")[0] in used
+                ]
+                if not n.names:
+                    continue
+            elif isinstance(n, ast.ImportFrom):
+                n.names = [a for a in n.names if (a.asname or a.name) in used]
+                if not n.names:
+                    continue
+            new_body.append(n)
+        if len(new_body) == len(tree.body):
+            break
+        tree.body = new_body
+
+    module_names = {
+        t.id
+        for n in tree.body
+        if isinstance(n, ast.Assign)
+        for t in n.targets
+        if isinstance(t, ast.Name)
+    }
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            node.body = _drop_stale_globals(node.body, module_names)
+    return tree
+
+
+def _drop_stale_globals(body, module_names):
+    out = []
+    for stmt in body:
+        if isinstance(stmt, ast.Global):
+            stmt.names = [n for n in stmt.names if n in module_names]
+            if not stmt.names:
+                continue
+        out.append(stmt)
+    return out or [ast.Pass()]
+
+
+def build(src, entry, keep_debug=False, filename="<mission>"):
+    """Return minimal hub source for *entry* from mission source *src*."""
+    tree = ast.parse(src, filename=filename)
+    strip_docstrings(tree)
+    keep = ("DEBUG",) if keep_debug else ()
+    consts = find_constants(tree, keep=keep)
+    tree = ConstantInliner(consts).visit(tree)
+    tree = DeadBranchFolder().visit(tree)
+    tree = prune_module(tree, entry)
+    ast.fix_missing_locations(tree)
+    return ast.unparse(tree) + "\n"
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("spike_file", help="mission file, e.g. working_spike.py")
+    p.add_argument("entry", help="mission to run on the hub, e.g. Run_3_Travel")
+    p.add_argument("--out", default=None, help="output .py file")
+    p.add_argument("--slot", type=int, default=None, help="override LEGO slot header")
+    p.add_argument(
+        "--keep-debug", action="store_true", help="keep DEBUG and its branches"
+    )
+    p.add_argument("--mpy", action="store_true", help="also precompile with mpy-cross")
+    p.add_argument(
+        "--mpy-cross", default="mpy-cross", help="mpy-cross executable (default: PATH)"
+    )
+    args = p.parse_args(argv[1:])
+
+    srcp = Path(args.spike_file)
+    src = srcp.read_text()
+    out_src = build(src, args.entry, keep_debug=args.keep_debug, filename=str(srcp))
+
+    header = read_header(src)
+    if args.slot is not None:
+        header = [f"# LEGO slot:{args.slot} autostart"]
+    if header:
+        out_src = "\n".join(header) + "\n" + out_src
+
+    outp = Path(args.out or Path("build") / f"{srcp.stem}_{args.entry}.py")
+    outp.parent.mkdir(parents=True, exist_ok=True)
+    outp.write_text(out_src)
+    before = len(src.encode())
+    after = len(out_src.encode())
+    print(
+        f"Wrote {outp} ({after} bytes, {100.0 * after / max(1, before):.0f}% of {before})"
+    )
+
+    if args.mpy:
+        exe = shutil.which(args.mpy_cross)
+        if exe is None:
+            print("mpy-cross not found; skipping precompile")
+            return 0
+        mpy = outp.with_suffix(".mpy")
+        res = subprocess.run([exe, "-o", str(mpy), str(outp)])
+        if res.returncode != 0:
+            print("mpy-cross failed")
+            return res.returncode
+        print(f"Wrote {mpy} ({mpy.stat().st_size} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
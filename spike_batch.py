@@ -0,0 +1,161 @@
+"""
+Parse and simulate many mission files in parallel, streaming NDJSON.
+
+Each mission of each file becomes one JSON line on stdout (or --out) as soon
+as its file has been simulated, so results can be piped into other tools
+while the batch is still running:
+
+    {"file": ..., "mission": ..., "instructions": 58, "types": {...},
+     "duration_s": 47.5, "final_pose": {"x_mm": ..., "y_mm": ..., "heading": ...},
+     "warnings": [...]}
+
+Files that fail to parse produce a single {"file": ..., "error": ...} line; a
+mission whose simulation fails produces {"file": ..., "mission": ..., "error": ...}.
+
+Usage:
+    python spike_batch.py missions/
+    python spike_batch.py "seasons/**/*.py" --workers 8 --out results.ndjson
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from spike_sim import DEFAULTS, load_program, simulate
+
+# a top-level mission definition, by the same naming rule as is_mission()
+MISSION_DEF = re.compile(rb"^(?:async\s+)?def\s+(?:Run_\w*|\w*_main)\s*\(", re.M)
+
+
+def defines_missions(path):
+    try:
+        return MISSION_DEF.search(Path(path).read_bytes()) is not None
+    except OSError:
+        return False
+
+
+def expand_sources(patterns):
+    """Mission files for directories (recursive *.spir, and *.py files that
+    define a mission) and globs."""
+    seen = set()
+    for pat in patterns:
+        p = Path(pat)
+        if p.is_dir():
+            found = sorted(
+                str(f)
+                for f in p.rglob("*")
+                if f.suffix == ".spir" or (f.suffix == ".py" and defines_missions(f))
+            )
+        else:
+            found = sorted(glob.glob(pat, recursive=True))
+        for f in found:
+            if f not in seen:
+                seen.add(f)
+                yield f
+
+
+def error_text(e):
+    return f"{type(e).__name__}: {e}"
+
+
+def analyze_file(path, params):
+    """All NDJSON records for one file (runs in a worker process)."""
+    try:
+        program = load_program(path, wheel_radius_mm=params["wheel_radius_mm"])
+    except Exception as e:
+        return [{"file": path, "error": error_text(e)}]
+    records = []
+    for name, indices in program.missions().items():
+        try:
+            traj = simulate(program, indices, **params)
+            x, y, h = traj.final_pose()
+        except Exception as e:
+            records.append({"file": path, "mission": name, "error": error_text(e)})
+            continue
+        records.append(
+            {
+                "file": path,
+                "mission": name,
+                "instructions": len(indices),
+                "types": dict(Counter(program.type(i) for i in indices)),
+                "duration_s": round(traj.duration, 3),
+                "final_pose": {
+                    "x_mm": round(x, 1),
+                    "y_mm": round(y, 1),
+                    "heading": round(h, 2),
+                },
+                "warnings": traj.warnings,
+            }
+        )
+    if not records:
+        records.append({"file": path, "mission": None, "warnings": ["no missions"]})
+    return records
+
+
+def run_batch(paths, params, out, workers=None):
+    """Stream records to *out*; keeps at most a few files in flight per worker."""
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        paths = iter(paths)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                path = next(paths, None)
+                if path is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(analyze_file, path, params)] = path
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                path = pending.pop(fut)
+                try:
+                    records = fut.result()
+                except Exception as e:  # e.g. the worker process died
+                    records = [{"file": path, "error": error_text(e)}]
+                for rec in records:
+                    out.write(json.dumps(rec) + "\n")
+                    count += 1
+            out.flush()
+    return count
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("sources", nargs="+", help="directories, files or glob patterns")
+    p.add_argument("--workers", type=int, default=None, help="worker processes")
+    p.add_argument("--out", default=None, help="write NDJSON here instead of stdout")
+    p.add_argument("--wheel-radius", type=float, default=DEFAULTS["wheel_radius_mm"])
+    p.add_argument("--wheel-base", type=float, default=DEFAULTS["wheel_base_mm"])
+    p.add_argument("--start-x", type=float, default=DEFAULTS["start_x_mm"])
+    p.add_argument("--start-y", type=float, default=DEFAULTS["start_y_mm"])
+    args = p.parse_args(argv[1:])
+
+    params = {
+        "wheel_radius_mm": args.wheel_radius,
+        "wheel_base_mm": args.wheel_base,
+        "start_x_mm": args.start_x,
+        "start_y_mm": args.start_y,
+    }
+    paths = expand_sources(args.sources)
+    if args.out:
+        with open(args.out, "w") as out:
+            n = run_batch(paths, params, out, args.workers)
+        print(f"Wrote {n} records to {Path(args.out).resolve()}", file=sys.stderr)
+    else:
+        run_batch(paths, params, sys.stdout, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
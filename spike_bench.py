@@ -0,0 +1,343 @@
+"""
+Benchmarks for the parser, the headless simulator and the renderer.
+
+Generates synthetic mission files (10 .. 10,000 calls), times
+parse_spike_file, Program save/load, headless simulation throughput
+(simulated seconds per wall second) and frame times of the pygame drawing
+paths (robot and panel, board tiles while zooming and panning, path and
+trail overlays) using SDL's dummy video driver, so no display is needed.
+
+Every metric is measured in several rounds: the value is the best round and
+"spread" is how far the slowest round was from it. Results are compared
+against a baseline file; a metric is flagged when it is worse by more than
+the threshold plus the spread of both runs, so noisy metrics (simulation
+throughput, frame times) need a larger change before they fail. Any flagged
+metric makes the exit status 1.
+
+Usage:
+    python spike_bench.py --save          # record bench_baseline.json
+    python spike_bench.py                 # compare against it
+Options:
+    --baseline   baseline file (default: bench_baseline.json)
+    --threshold  allowed slowdown fraction before flagging (default 0.15)
+    --quick      fewer sizes and frames
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from spike_ir import Program
+from spike_sim import simulate
+from spike_to_pygame import parse_spike_file
+
+SIZES = (10, 100, 1000, 10000)
+HERE = Path(__file__).resolve().parent
+# frame metrics with fewer frames per round are reported but never flagged
+MIN_SAMPLES = 20
+
+
+def synthetic_mission(n_calls, name="Run_Bench"):
+    """Source of a mission file with one mission of *n_calls* calls."""
+    lines = [
+        "import motor",
+        "import utime",
+        "from hub import port",
+        "RIGHT_ACTUATOR = port.D",
+        "",
+        "",
+        f"def {name}():",
+        "    GAIN = 2",
+    ]
+    pattern = (
+        "    gyro_follow(heading={h}, gain=GAIN, speed=50, distance={d})",
+        "    gyro_turn(heading={h}, speed=20)",
+        "    motor.run_for_degrees(RIGHT_ACTUATOR, {d}, 360)",
+        "    utime.sleep_ms(100)",
+    )
+    for i in range(n_calls):
+        h = (i * 37) % 360 - 180
+        d = 100 + (i * 13) % 400
+        lines.append(pattern[i % len(pattern)].format(h=h, d=d))
+    return "\n".join(lines) + "\n"
+
+
+def spread_of(rounds):
+    # how far the slowest round is from the best one, as a fraction
+    best = min(rounds)
+    return max(rounds) / best - 1.0 if best > 0 else 0.0
+
+
+def timed(fn, repeat, min_time=0.05):
+    """(seconds per call in the best of *repeat* rounds, spread), each round
+    looping long enough (like timeit) that timer resolution doesn't dominate."""
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        times.append((time.perf_counter() - t0) / loops)
+    return min(times), spread_of(times)
+
+
+def record(results, name, fn, repeat, min_time=0.05):
+    secs, spread = timed(fn, repeat, min_time)
+    results[name] = {"value": secs, "unit": "s", "spread": spread}
+
+
+def bench_parse(results, sizes, repeat, tmp):
+    for n in sizes:
+        path = tmp / f"bench_{n}.py"
+        path.write_text(synthetic_mission(n))
+        record(results, f"parse_{n}_calls", lambda: parse_spike_file(path), repeat)
+
+        prog = Program.from_instructions(parse_spike_file(path))
+        spir = tmp / f"bench_{n}.spir"
+        record(results, f"spir_save_{n}_calls", lambda: prog.save(spir), repeat)
+        record(results, f"spir_load_{n}_calls", lambda: Program.load(spir), repeat)
+
+
+def bench_sim(results, sizes, repeat, tmp):
+    cases = [(f"{n}_calls", tmp / f"bench_{n}.py") for n in sizes if n <= 1000]
+    cases.append(("working_spike", HERE / "working_spike.py"))
+    for label, path in cases:
+        if not path.exists():
+            continue
+        prog = Program.from_instructions(parse_spike_file(path))
+        sim_secs = sum(simulate(prog, r).duration for r in prog.missions().values())
+        # shares the machine with everything else: more and longer rounds
+        wall, spread = timed(
+            lambda: [simulate(prog, r) for r in prog.missions().values()],
+            2 * repeat,
+            min_time=0.2,
+        )
+        results[f"sim_throughput_{label}"] = {
+            "value": sim_secs / wall if wall > 0 else 0.0,
+            "unit": "sim-s/s",
+            "higher_is_better": True,
+            "spread": spread,
+        }
+
+
+def frame_stats(results, prefix, rounds):
+    """Frame-time metrics from per-round lists of frame times."""
+    means = [statistics.fmean(r) for r in rounds]
+    p95s = [sorted(r)[int(0.95 * (len(r) - 1))] for r in rounds]
+    samples = min(len(r) for r in rounds)
+    results[f"{prefix}_mean"] = {
+        "value": min(means),
+        "unit": "s",
+        "spread": spread_of(means),
+        "samples": samples,
+    }
+    results[f"{prefix}_p95"] = {
+        "value": min(p95s),
+        "unit": "s",
+        "spread": spread_of(p95s),
+        "samples": samples,
+    }
+
+
+def synthetic_board(pygame, size):
+    """Board-sized Surface with enough detail that scaling it is real work."""
+    board = pygame.Surface(size)
+    board.fill((60, 120, 60))
+    w, h = size
+    for i in range(0, w, 32):
+        pygame.draw.line(board, (40 + i % 160, 90, 60), (i, 0), (w - i, h), 3)
+    for j in range(0, h, 48):
+        pygame.draw.rect(board, (200, 180 - j % 120, 90), (j % w, j, 40, 24))
+    return board
+
+
+def bench_tiles(results, pygame, screen, rect, rounds, frames):
+    from board_view import TilePyramid, Viewport
+
+    source = synthetic_board(pygame, (4096, 2048))
+    virt_w, virt_h = 2 * rect.width, rect.height
+    fit = rect.width / virt_w
+    cx, cy = rect.center
+    times = []
+    for _ in range(rounds):
+        # a fresh pyramid each round, so level builds and tile scaling count
+        pyramid = TilePyramid(
+            lambda: source, source.get_size(), image_scale=virt_w / 4096
+        )
+        view = Viewport(rect, virt_w, virt_h, fit)
+        round_times = []
+        for k in range(frames):
+            t0 = time.perf_counter()
+            if k % 40 == 0:
+                # zoom in and back out in steps, like the mouse wheel
+                view.zoom_at(1.25 if (k // 40) % 8 < 4 else 0.8, (cx, cy))
+            view.pan(7, 3 if k % 80 < 40 else -3)
+            pyramid.draw(screen, view)
+            pygame.display.flip()
+            round_times.append(time.perf_counter() - t0)
+        times.append(round_times)
+    frame_stats(results, "tiles_frame_time", times)
+
+
+def bench_overlays(results, pygame, screen, rect, rounds, frames):
+    from board_view import PathLayer, TrailLayer, Viewport
+
+    virt_w, virt_h = 2 * rect.width, rect.height
+    fit = rect.width / virt_w
+    paths = [
+        [
+            (
+                virt_w * (0.5 + 0.45 * math.cos(t / 40 + m)),
+                virt_h * (0.5 + 0.45 * math.sin(t / 25 + m)),
+            )
+            for t in range(500)
+        ]
+        for m in range(4)
+    ]
+    cx, cy = rect.center
+    steady, moving = [], []
+    for _ in range(rounds):
+        view = Viewport(rect, virt_w, virt_h, fit)
+        layers = [PathLayer(p, (255, 200, 0, 200)) for p in paths]
+        trail = TrailLayer((255, 255, 255, 220))
+
+        def frame(k, zoom):
+            t0 = time.perf_counter()
+            if zoom:
+                # a view change re-strokes every layer
+                view.zoom_at(1.1 if k % 2 == 0 else 1 / 1.1, (cx, cy))
+            x, y = paths[0][k % 500]
+            trail.add(x, y + 5)
+            for layer in layers:
+                layer.draw(screen, view)
+            trail.draw(screen, view)
+            pygame.display.flip()
+            return time.perf_counter() - t0
+
+        still = [frame(k, False) for k in range(frames)]
+        changed = [frame(k, True) for k in range(frames)]
+        steady.append(still)
+        moving.append(changed)
+    frame_stats(results, "overlay_frame_time", steady)
+    frame_stats(results, "overlay_restroke_time", moving)
+
+
+def bench_render(results, frames, rounds=5):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    try:
+        import pygame
+    except Exception as e:
+        print("pygame not available, skipping render benchmark:", e)
+        return
+    from spike_to_pygame import draw_panel, draw_robot
+
+    pygame.display.init()
+    pygame.font.init()
+    w, h, bw, pad = 1200, 600, 180, 4
+    screen = pygame.display.set_mode((w, h))
+    font = pygame.font.SysFont(None, 18)
+    board = pygame.Surface((w - bw - pad, h))
+    board.fill((60, 120, 60))
+    x0 = board.get_width()
+    buttons = [(pygame.Rect(x0, pad + i * 36, bw, 30), f"Run_{i}") for i in range(8)]
+    stop_rect = pygame.Rect(x0, h - 50, bw, 34)
+
+    per_round = max(1, frames // rounds)
+    times = []
+    for _ in range(rounds):
+        round_times = []
+        for k in range(per_round):
+            t0 = time.perf_counter()
+            screen.fill((200, 200, 200))
+            screen.blit(board, (0, 0))
+            draw_robot(screen, (100 + k % 800, 300), (k * 3) % 360, 0.5)
+            draw_panel(screen, font, buttons, stop_rect, "Running", (x0, bw, w, h, pad))
+            pygame.display.flip()
+            round_times.append(time.perf_counter() - t0)
+        times.append(round_times)
+    frame_stats(results, "frame_time", times)
+
+    board_rect = pygame.Rect(0, 0, x0, h)
+    bench_tiles(results, pygame, screen, board_rect, rounds, per_round)
+    bench_overlays(results, pygame, screen, board_rect, rounds, per_round)
+    pygame.quit()
+
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks that regressed by more than *threshold* plus the
+    round-to-round spread measured for them now and in the baseline."""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("value"):
+            print(
+                f"  {name:32s} {cur['value']:12.6g} {cur['unit']:8s} new, no baseline"
+            )
+            continue
+        if cur.get("higher_is_better"):
+            change = base["value"] / cur["value"] - 1.0 if cur["value"] else 1.0
+        else:
+            change = cur["value"] / base["value"] - 1.0
+        allowed = threshold + cur.get("spread", 0.0) + base.get("spread", 0.0)
+        samples = min(cur.get("samples", MIN_SAMPLES), base.get("samples", MIN_SAMPLES))
+        flag = change > allowed and samples >= MIN_SAMPLES
+        if flag:
+            regressions.append(name)
+        note = "  REGRESSION" if flag else ""
+        if samples < MIN_SAMPLES:
+            note = f"  ({samples} samples, not checked)"
+        print(
+            f"  {name:32s} {cur['value']:12.6g} {cur['unit']:8s}"
+            f" {100.0 * -change:+7.1f}% (allowed -{100.0 * allowed:.0f}%){note}"
+        )
+    return regressions
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("--baseline", default="bench_baseline.json")
+    p.add_argument("--save", action="store_true", help="write results as baseline")
+    p.add_argument("--threshold", type=float, default=0.15)
+    p.add_argument("--quick", action="store_true")
+    args = p.parse_args(argv[1:])
+
+    sizes = SIZES[:3] if args.quick else SIZES
+    repeat = 5  # rounds per metric; fewer make the spread meaningless
+    results = {}
+    with tempfile.TemporaryDirectory() as d:
+        tmp = Path(d)
+        bench_parse(results, sizes, repeat, tmp)
+        bench_sim(results, sizes, repeat, tmp)
+    bench_render(results, 200 if args.quick else 600)
+
+    basep = Path(args.baseline)
+    if args.save or not basep.exists():
+        basep.write_text(json.dumps(results, indent=2))
+        for name, cur in results.items():
+            print(f"  {name:32s} {cur['value']:12.6g} {cur['unit']}")
+        print(f"Wrote baseline {basep.resolve()}")
+        return 0
+
+    print(f"Comparing against {basep} (threshold {100 * args.threshold:.0f}%)")
+    regressions = compare(results, json.loads(basep.read_text()), args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
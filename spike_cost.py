@@ -0,0 +1,594 @@
+"""
+Static per-iteration cost of the hub's control loops.
+
+Walks the `while` loops of gyro_follow, gyro_turn and line_follow (or
+--func) in a mission file and counts what one iteration does: sensor
+reads, other hub API calls, tick reads, arithmetic and comparisons, calls
+into Python functions, allocations (tuples returned by tilt_angles() and
+friends, f-strings, lambdas, list/dict/tuple displays) and calls to the
+loop's condition. Helpers defined in the file (yaw_deg, clamp,
+HeadingEstimator.read, Condition.__call__, ...) are followed and their
+work added in. The predicate behind a condition argument is found from the
+function's call sites (a lambda, a function, or a factory such as color_is()
+that wraps one in a Condition), and the most expensive one is counted as
+part of each check, so its sensor reads show up. Branches on module flags (DEBUG, PREDICT, MEM_LOG) are
+resolved from the file, or from --assume; other branches count their more
+expensive side, so the estimate is a per-iteration worst case. Loops
+nested inside an iteration are counted once.
+
+Each count is weighted by a cost model in microseconds (COSTS below,
+override with --cost NAME=US or --model costs.json). A loop is flagged
+when its estimated work plus its sleep exceeds the intended period (the
+sleep, or --period FUNC=MS) by more than --tolerance. Exit status is 1 if
+any loop is flagged.
+
+The default costs are rough figures for MicroPython on the SPIKE Prime hub;
+time a few loops on the robot (DEBUG prints with ticks_us) and put the
+measured numbers in a --model file before trusting the margins.
+
+Usage:
+    python spike_cost.py working_spike.py
+    python spike_cost.py working_spike.py --assume PREDICT=True --period gyro_follow=5
+"""
+
+import argparse
+import ast
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+from spike_to_pygame import const_value, literal_env, node_name
+
+LOOP_FUNCS = ("gyro_follow", "gyro_turn", "line_follow")
+
+# microseconds per counted operation
+COSTS = {
+    "sensor_read": 80.0,
+    "hub_call": 120.0,  # motor commands
+    "ticks": 4.0,
+    "sleep_call": 10.0,  # call overhead only; the sleep itself is the period
+    "py_call": 20.0,
+    "builtin": 6.0,
+    "math_call": 10.0,
+    "arith": 5.0,  # floats are boxed on the hub, so most results allocate
+    "compare": 3.0,
+    "alloc": 15.0,
+    "condition": 0.0,  # extra per call; the inlined __call__ is counted too
+    "print": 2000.0,
+}
+
+SENSOR_CALLS = {
+    "motion_sensor.tilt_angles",
+    "motion_sensor.angular_velocity",
+    "motion_sensor.acceleration",
+    "motion_sensor.quaternion",
+    "color_sensor.reflection",
+    "color_sensor.color",
+    "color_sensor.rgbi",
+    "distance_sensor.distance",
+    "force_sensor.force",
+    "force_sensor.pressed",
+    "motor.relative_position",
+    "motor.absolute_position",
+    "motor.velocity",
+    "button.pressed",
+}
+# hub calls that return a fresh tuple every time
+TUPLE_RESULTS = {
+    "motion_sensor.tilt_angles",
+    "motion_sensor.angular_velocity",
+    "motion_sensor.acceleration",
+    "motion_sensor.quaternion",
+    "color_sensor.rgbi",
+}
+TICKS_CALLS = {"ticks_ms", "ticks_us", "ticks_diff", "ticks_add"}
+SLEEP_CALLS = {"utime.sleep_ms": 1.0, "utime.sleep": 1000.0, "time.sleep_ms": 1.0}
+BUILTINS = {"float", "int", "abs", "bool", "min", "max", "len", "range", "round"}
+MAX_DEPTH = 6  # helper-call inlining depth
+CONDITION_CLASS = "Condition"
+
+
+def parse_assign(spec):
+    """Split "NAME=VALUE" into (name, value), VALUE as a Python literal."""
+    try:
+        name, value = spec.split("=", 1)
+        return name.strip(), ast.literal_eval(value.strip())
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {spec!r}")
+
+
+class LoopCost:
+    """Operation counts of one loop iteration, with the names behind them."""
+
+    __slots__ = ("counts", "names", "sleep_ms")
+
+    def __init__(self):
+        self.counts = Counter()
+        self.names = {}  # category -> Counter of call names
+        self.sleep_ms = 0.0
+
+    def add(self, category, name=None, n=1):
+        self.counts[category] += n
+        if name is not None:
+            self.names.setdefault(category, Counter())[name] += n
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        for cat, names in other.names.items():
+            self.names.setdefault(cat, Counter()).update(names)
+        self.sleep_ms += other.sleep_ms
+
+    def work_us(self, costs):
+        return sum(costs.get(cat, 0.0) * n for cat, n in self.counts.items())
+
+
+class Analyzer:
+    """Counts loop bodies of one parsed source file."""
+
+    def __init__(self, tree, assume=None):
+        assume = dict(assume or {})
+        self.env = literal_env(tree.body, overrides=assume)
+        # literal_env skips booleans; branch flags need them
+        self.flags = dict(assume)
+        for stmt in tree.body:
+            if (
+                isinstance(stmt, ast.Assign)
+                and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Name)
+                and isinstance(stmt.value, ast.Constant)
+                and stmt.targets[0].id not in assume
+            ):
+                self.flags[stmt.targets[0].id] = stmt.value.value
+        self.funcs = {}
+        self.classes = {}
+        self.instances = {}  # module-level name -> class name
+        self.imported = set()
+        self.math = set()  # names imported from math
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
+                self.funcs[node.name] = node
+            elif isinstance(node, ast.ClassDef):
+                self.classes[node.name] = {
+                    n.name: n for n in node.body if isinstance(n, ast.FunctionDef)
+                }
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for a in node.names:
+                    self.imported.add(a.asname or a.name)
+                if isinstance(node, ast.ImportFrom) and node.module == "math":
+                    self.math.update(a.asname or a.name for a in node.names)
+            elif (
+                isinstance(node, ast.Assign)
+                and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Call)
+                and node_name(node.value.func) in self.classes
+            ):
+                self.instances[node.targets[0].id] = node_name(node.value.func)
+
+        # attributes of the condition class holding its predicate
+        # (`self.pred = pred` in __init__)
+        self.pred_attrs = set()
+        init = self.classes.get(CONDITION_CLASS, {}).get("__init__")
+        if init is not None and len(init.args.args) > 1:
+            first = init.args.args[1].arg
+            for stmt in init.body:
+                if (
+                    isinstance(stmt, ast.Assign)
+                    and isinstance(stmt.value, ast.Name)
+                    and stmt.value.id == first
+                ):
+                    for t in stmt.targets:
+                        if (
+                            isinstance(t, ast.Attribute)
+                            and node_name(t.value) == "self"
+                        ):
+                            self.pred_attrs.add(t.attr)
+        self.call_sites = {}  # function name -> its Call nodes in the file
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                name = node_name(node.func)
+                if name in self.funcs:
+                    self.call_sites.setdefault(name, []).append(node)
+        self._predicates = {}
+
+    def predicates(self, func_name, param):
+        """Predicates passed as *param* of *func_name* anywhere in the file:
+        lambdas (ast.Lambda) and names of functions defined in the file."""
+        key = (func_name, param)
+        if key not in self._predicates:
+            found = []
+            for call in self.call_sites.get(func_name, ()):
+                arg = self._argument(self.funcs[func_name], call, param)
+                if arg is not None:
+                    self._resolve(arg, found, 0)
+            self._predicates[key] = found
+        return self._predicates[key]
+
+    @staticmethod
+    def _argument(func, call, param):
+        # expression bound to parameter *param* by *call*, or None
+        for k in call.keywords:
+            if k.arg == param:
+                return k.value
+        names = [a.arg for a in func.args.args]
+        if param in names and names.index(param) < len(call.args):
+            return call.args[names.index(param)]
+        return None
+
+    def _resolve(self, node, found, depth):
+        if depth > MAX_DEPTH:
+            return
+        if isinstance(node, ast.Lambda):
+            found.append(node)
+        elif isinstance(node, ast.Name) and node.id in self.funcs:
+            found.append(node.id)
+        elif isinstance(node, ast.Call):
+            name = node_name(node.func)
+            if name == CONDITION_CLASS and node.args:
+                self._resolve(node.args[0], found, depth + 1)
+            elif name in self.funcs:
+                # a factory: follow what it returns
+                func = self.funcs[name]
+                for ret in ast.walk(func):
+                    if not isinstance(ret, ast.Return) or ret.value is None:
+                        continue
+                    value = ret.value
+                    if isinstance(value, ast.Name):
+                        value = self._argument(func, node, value.id) or value
+                    self._resolve(value, found, depth + 1)
+
+    def _predicate_cost(self, ctx, cost, costs):
+        # the most expensive predicate this loop's condition may call
+        best = None
+        for pred in ctx.get("preds") or ():
+            c = LoopCost()
+            inner = dict(ctx, params=set(), cls=None, depth=ctx["depth"] + 1)
+            if isinstance(pred, ast.Lambda):
+                self.expr(pred.body, c, dict(inner, env=self.env), costs)
+            else:
+                c.add("py_call", pred)
+                self._inline((None, pred), c, inner, costs)
+            if best is None or c.work_us(costs) > best.work_us(costs):
+                best = c
+        if best is not None:
+            cost.merge(best)
+        return best is not None
+
+    def truth(self, test, env):
+        # truth value of a branch test on constants/flags, or None if unknown
+        if isinstance(test, ast.Constant):
+            return bool(test.value)
+        if isinstance(test, ast.Name):
+            if test.id in self.flags:
+                return bool(self.flags[test.id])
+            v = env.get(test.id)
+            return None if v is None else bool(v)
+        if isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not):
+            inner = self.truth(test.operand, env)
+            return None if inner is None else not inner
+        if isinstance(test, ast.BoolOp):
+            decides = isinstance(test.op, ast.Or)
+            for value in test.values:
+                t = self.truth(value, env)
+                if t is None:
+                    return None
+                if t == decides:
+                    return decides
+            return not decides
+        return None
+
+    def loops(self, func_name):
+        """Outermost `while` loops of function *func_name*."""
+        func = self.funcs.get(func_name)
+        if func is None:
+            return []
+        found = []
+
+        def visit(node):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, ast.While):
+                    found.append(child)
+                elif not isinstance(child, (ast.FunctionDef, ast.Lambda)):
+                    visit(child)
+
+        visit(func)
+        return found
+
+    def iteration(self, func_name, loop, costs):
+        """LoopCost of one pass through *loop* (test + body)."""
+        func = self.funcs[func_name]
+        ctx = {
+            "env": literal_env(func.body, self.env),
+            "params": {a.arg for a in func.args.args},
+            "cls": None,
+            "depth": 0,
+            "stack": (func_name,),
+            "preds": None,
+        }
+        cost = LoopCost()
+        if self.truth(loop.test, ctx["env"]) is None:
+            self.expr(loop.test, cost, ctx, costs)
+        self.block(loop.body, cost, ctx, costs)
+        return cost
+
+    def block(self, body, cost, ctx, costs):
+        """Count *body*; True if it always leaves the block (return, break,
+        ...), so statements after it in the enclosing block never run."""
+        for stmt in body:
+            if self.stmt(stmt, cost, ctx, costs):
+                return True
+        return False
+
+    def _branch(self, bodies, ctx, costs):
+        # the more expensive of alternative statement lists
+        best = None
+        for body in bodies:
+            c = LoopCost()
+            self.block(body, c, ctx, costs)
+            if best is None or c.work_us(costs) > best.work_us(costs):
+                best = c
+        return best
+
+    def stmt(self, node, cost, ctx, costs):
+        if isinstance(node, ast.If):
+            t = self.truth(node.test, ctx["env"])
+            if t is not None:
+                return self.block(node.body if t else node.orelse, cost, ctx, costs)
+            self.expr(node.test, cost, ctx, costs)
+            cost.merge(self._branch((node.body, node.orelse), ctx, costs))
+        elif isinstance(node, (ast.While, ast.For)):
+            # nested loops: one pass
+            if self.truth(getattr(node, "test", None), ctx["env"]) is False:
+                return
+            self.expr(getattr(node, "test", None) or node.iter, cost, ctx, costs)
+            self.block(node.body, cost, ctx, costs)
+        elif isinstance(node, ast.Try):
+            self.block(node.finalbody, cost, ctx, costs)
+            return self.block(node.body, cost, ctx, costs)
+        elif isinstance(node, ast.AugAssign):
+            cost.add("arith")
+            self.expr(node.value, cost, ctx, costs)
+        elif isinstance(node, ast.FunctionDef):
+            cost.add("alloc", "closure")
+        elif isinstance(node, (ast.Expr, ast.Assign, ast.Return, ast.AnnAssign)):
+            if node.value is not None:
+                self.expr(node.value, cost, ctx, costs)
+            return isinstance(node, ast.Return)
+        elif isinstance(node, ast.Raise):
+            return True
+        return isinstance(node, (ast.Break, ast.Continue))
+
+    def expr(self, node, cost, ctx, costs):
+        if node is None:
+            return
+        for n in self._walk(node, ctx["env"]):
+            if isinstance(n, ast.Call):
+                self.call(n, cost, ctx, costs)
+            elif isinstance(n, (ast.BinOp, ast.UnaryOp)) and not isinstance(
+                getattr(n, "op", None), ast.Not
+            ):
+                cost.add("arith")
+            elif isinstance(n, ast.Compare):
+                cost.add("compare", n=len(n.ops))
+            elif isinstance(n, ast.JoinedStr):
+                cost.add("alloc", "f-string")
+            elif isinstance(n, ast.Lambda):
+                cost.add("alloc", "lambda")
+            elif isinstance(n, (ast.Tuple, ast.List, ast.Dict, ast.Set)) and (
+                not isinstance(getattr(n, "ctx", None), ast.Store)
+            ):
+                cost.add("alloc", type(n).__name__.lower())
+
+    def _walk(self, node, env):
+        # like ast.walk, but stops at lambdas (their body runs elsewhere) and
+        # follows only the taken arm of a conditional expression on a flag
+        todo = [node]
+        while todo:
+            n = todo.pop()
+            if isinstance(n, ast.IfExp):
+                t = self.truth(n.test, env)
+                if t is not None:
+                    todo.append(n.body if t else n.orelse)
+                    continue
+            yield n
+            if isinstance(n, ast.FormattedValue):
+                todo.append(n.value)  # format_spec is part of the same string
+            elif not isinstance(n, ast.Lambda):
+                todo.extend(ast.iter_child_nodes(n))
+
+    def call(self, node, cost, ctx, costs):
+        name = node_name(node.func)
+        if name is None:
+            cost.add("py_call", "<expr>")
+            return
+        if name in SLEEP_CALLS:
+            cost.add("sleep_call", name)
+            if node.args:
+                v = const_value(node.args[0], ctx["env"])
+                if isinstance(v, (int, float)):
+                    cost.sleep_ms += v * SLEEP_CALLS[name]
+            return
+        if name in SENSOR_CALLS:
+            cost.add("sensor_read", name)
+            if name in TUPLE_RESULTS:
+                cost.add("alloc", name)
+            return
+        root, _, attr = name.rpartition(".")
+        if root in ("utime", "time") and attr in TICKS_CALLS:
+            cost.add("ticks", name)
+            return
+        if name == "print":
+            cost.add("print", name)
+            return
+        if name in BUILTINS:
+            cost.add("builtin", name)
+            return
+        if name in self.math or root == "math":
+            cost.add("math_call", name)
+            return
+        if name in ctx["params"]:
+            # a callable argument, e.g. condition(): a Condition unless the
+            # file has no such class
+            cost.add("condition", name)
+            cost.add("py_call", name)
+            preds = self.predicates(ctx["stack"][0], name)
+            self._inline(
+                (CONDITION_CLASS, "__call__"), cost, dict(ctx, preds=preds), costs
+            )
+            return
+        if (
+            root == "self"
+            and ctx["cls"] == CONDITION_CLASS
+            and attr in self.pred_attrs
+            and ctx.get("preds")
+        ):
+            cost.add("py_call", name)
+            self._predicate_cost(ctx, cost, costs)
+            return
+        target = None
+        if name in self.funcs:
+            target = (None, name)
+        elif root == "self" and ctx["cls"] and attr in self.classes[ctx["cls"]]:
+            target = (ctx["cls"], attr)
+        elif root in self.instances and "." not in root:
+            cls = self.instances[root]
+            if attr in self.classes[cls]:
+                target = (cls, attr)
+        elif name in self.classes:
+            cost.add("alloc", name)
+            target = (name, "__init__")
+        if target is not None:
+            cost.add("py_call", name)
+            self._inline(target, cost, ctx, costs)
+        elif root.split(".")[0] in self.imported:
+            cost.add("hub_call", name)
+        else:
+            cost.add("py_call", name)
+
+    def _inline(self, target, cost, ctx, costs):
+        cls, name = target
+        if cls is None:
+            func = self.funcs.get(name)
+        else:
+            func = self.classes.get(cls, {}).get(name)
+        key = f"{cls}.{name}" if cls else name
+        if func is None or key in ctx["stack"] or ctx["depth"] >= MAX_DEPTH:
+            return
+        inner = {
+            "env": literal_env(func.body, self.env),
+            "params": set(),  # a helper's arguments are values, not loop callables
+            "cls": cls,
+            "depth": ctx["depth"] + 1,
+            "stack": ctx["stack"] + (key,),
+            "preds": ctx.get("preds"),
+        }
+        self.block(func.body, cost, inner, costs)
+
+
+def analyze(path, funcs=LOOP_FUNCS, assume=None, costs=None):
+    """(function, line, LoopCost) for every loop in *funcs*."""
+    src = Path(path).read_text()
+    tree = ast.parse(src, filename=str(path))
+    an = Analyzer(tree, assume)
+    costs = costs or COSTS
+    out = []
+    for name in funcs:
+        for loop in an.loops(name):
+            out.append((name, loop.lineno, an.iteration(name, loop, costs)))
+    return out
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("spike_file", help="mission source, e.g. working_spike.py")
+    p.add_argument(
+        "--func",
+        action="append",
+        default=None,
+        help="function whose loops to analyze (repeatable; default: %s)"
+        % ", ".join(LOOP_FUNCS),
+    )
+    p.add_argument(
+        "--assume",
+        action="append",
+        type=parse_assign,
+        default=[],
+        help="module constant for branch folding, e.g. DEBUG=True",
+    )
+    p.add_argument("--model", default=None, help="JSON file of costs (us)")
+    p.add_argument(
+        "--cost",
+        action="append",
+        type=parse_assign,
+        default=[],
+        help="override one cost, e.g. hub_call=150",
+    )
+    p.add_argument(
+        "--period",
+        action="append",
+        type=parse_assign,
+        default=[],
+        help="intended loop period FUNC=MS (default: the loop's sleep)",
+    )
+    p.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed overrun as a fraction of the period",
+    )
+    args = p.parse_args(argv[1:])
+
+    costs = dict(COSTS)
+    if args.model:
+        costs.update(json.loads(Path(args.model).read_text()))
+    for name, value in args.cost:
+        if name not in costs:
+            print(f"unknown cost {name!r}; one of {', '.join(costs)}")
+            return 1
+        costs[name] = float(value)
+    periods = dict(args.period)
+
+    flagged = 0
+    results = analyze(args.spike_file, args.func or LOOP_FUNCS, args.assume, costs)
+    if not results:
+        print("no loops found")
+        return 1
+    for func, line, cost in results:
+        work_ms = cost.work_us(costs) / 1000.0
+        period = float(periods.get(func, cost.sleep_ms))
+        total = work_ms + cost.sleep_ms
+        over = period <= 0 or total > period * (1.0 + args.tolerance)
+        flagged += over
+        verdict = "OVER" if over else "ok"
+        print(
+            f"{func} (line {line}): work {work_ms:.2f} ms + sleep {cost.sleep_ms:g} ms"
+            f" = {total:.2f} ms per iteration, period {period:g} ms -> {verdict}"
+        )
+        rows = sorted(
+            cost.counts.items(), key=lambda kv: -costs.get(kv[0], 0.0) * kv[1]
+        )
+        for cat, n in rows:
+            names = cost.names.get(cat)
+            detail = ""
+            if names:
+                detail = "  " + ", ".join(
+                    f"{k} x{v}" if v > 1 else k for k, v in names.most_common()
+                )
+            us = costs.get(cat, 0.0) * n
+            print(
+                f"    {cat:<12} {n:>3} x {costs.get(cat, 0.0):g} us = {us:7.0f} us{detail}"
+            )
+        if over and period > 0:
+            print(
+                f"    needs {total - period:.2f} ms less work or sleep to hold"
+                f" {period:g} ms"
+            )
+    if flagged:
+        print(f"{flagged} loop(s) over their period")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,486 @@
+"""
+Resident simulation daemon, so editor tasks get answers in milliseconds.
+
+`serve` keeps the parsed missions (by file, modification time and constant
+overrides), the route planner's dilated obstacle grids and the simulator
+imported and warm, and answers JSON-line requests on a local Unix socket.
+The other subcommands are a thin client for scripts and editor tasks:
+
+    python spike_daemon.py serve &
+    python spike_daemon.py simulate working_spike.py Run_5_Crane --set GAIN=2.5
+    python spike_daemon.py plan 200,200,0 1900,800 --obstacles obstacles.json
+    python spike_daemon.py stats
+    python spike_daemon.py stop
+
+Protocol: one JSON object per line each way; a connection may send any
+number of requests, and connections are served concurrently (requests
+still run one at a time). Every reply has "ok" and "ms" (time spent in the
+daemon); failed requests give "error".
+
+    {"op": "ping"}
+    {"op": "missions", "file": "working_spike.py"}
+    {"op": "simulate", "file": "working_spike.py", "mission": "Run_5_Crane",
+     "overrides": {"GAIN": 2.5}, "params": {"lag_ms": 40}, "step": 0.1}
+    {"op": "plan", "start": [200, 200, 0], "goal": [1900, 800],
+     "obstacles": "obstacles.json", "cell": 20, "headings": 16}
+    {"op": "stats"}
+    {"op": "shutdown"}
+
+simulate takes "source" (the editor buffer's text) instead of reading
+"file" from disk, "mission" may be omitted for all missions, "params" are
+spike_sim DEFAULTS keys, and "step" adds trajectory samples [t, x, y, h]
+every step seconds. plan takes the spike_plan.py options as keys.
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# the simulator modules are imported by the daemon only, so the client
+# stays a bare socket round trip
+
+CACHE_SIZE = 32  # parsed programs kept (per file, version and overrides)
+PLANNER_CACHE_SIZE = 4
+
+
+def default_socket():
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"spike_daemon-{uid}.sock")
+
+
+class LRU:
+    """Small least-recently-used map with hit/miss counters."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, make):
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = self.items[key] = make()
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+        return value
+
+
+class State:
+    """Everything kept warm between requests."""
+
+    def __init__(self):
+        self.programs = LRU(CACHE_SIZE)
+        self.planners = LRU(PLANNER_CACHE_SIZE)
+        self.started = time.time()
+        self.requests = 0
+
+    def program(self, path, source, overrides, wheel_radius_mm):
+        """Program for *path* as saved now (or for *source*), with *overrides*
+        applied to the constants assigned in it."""
+        from spike_ir import Program, is_program_file
+        from spike_to_pygame import parse_spike_source
+
+        if source is not None:
+            stamp = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        else:
+            st = os.stat(path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        key = (path, stamp, wheel_radius_mm, tuple(sorted(overrides.items())))
+
+        def load():
+            if source is None and is_program_file(path):
+                if overrides:
+                    raise ValueError(".spir files have no constants to override")
+                return Program.load(path)
+            src = source if source is not None else Path(path).read_text()
+            return Program.from_instructions(
+                parse_spike_source(
+                    src,
+                    str(path),
+                    wheel_radius_mm=wheel_radius_mm,
+                    overrides=overrides or None,
+                )
+            )
+
+        return self.programs.get(key, load)
+
+    def planner(self, req, sim):
+        """spike_plan Planner for the request's board, robot and speeds."""
+        import spike_plan
+
+        obstacles = req.get("obstacles")
+        mask = req.get("mask")
+        stamps = tuple(os.stat(p).st_mtime_ns if p else None for p in (obstacles, mask))
+        opts = (
+            float(req.get("cell", 20.0)),
+            int(req.get("headings", 16)),
+            float(req.get("robot_length", 200.0)),
+            float(req.get("robot_width", 160.0)),
+            float(req.get("clearance", 10.0)),
+            int(req.get("speed", 50)),
+            int(req.get("turn_speed", 20)),
+            float(req.get("gain", 0.2)),
+        )
+        key = (obstacles, mask, stamps, opts, tuple(sorted(sim.items())))
+
+        def make():
+            cell, headings, length, width, clearance, speed, turn_speed, gain = opts
+            grid = spike_plan.Grid(sim["board_w_mm"], sim["board_h_mm"], cell)
+            if obstacles:
+                for rect in spike_plan.load_rects(obstacles):
+                    grid.add_rect(*rect)
+            if mask:
+                grid.add_mask(mask)
+            timing = spike_plan.calibrate(speed, turn_speed, gain, sim)
+            return spike_plan.Planner(
+                grid,
+                headings,
+                length + 2 * clearance,
+                width + 2 * clearance,
+                timing,
+            )
+
+        return self.planners.get(key, make), opts
+
+
+def sim_params(req):
+    from spike_sim import DEFAULTS
+
+    params = dict(req.get("params") or {})
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown params: {', '.join(sorted(unknown))}")
+    return params
+
+
+def overrides_of(req):
+    overrides = req.get("overrides") or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("overrides must be an object of NAME: value")
+    for name, value in overrides.items():
+        if not isinstance(value, (int, float, str)):
+            raise ValueError(
+                f"override {name} must be a number or string,"
+                f" got {type(value).__name__}"
+            )
+    return overrides
+
+
+def op_simulate(state, req):
+    from spike_sim import DEFAULTS, simulate
+
+    params = sim_params(req)
+    radius = params.get("wheel_radius_mm", DEFAULTS["wheel_radius_mm"])
+    path = req.get("file") or "<buffer>"
+    program = state.program(path, req.get("source"), overrides_of(req), radius)
+    missions = program.missions()
+    names = [req["mission"]] if req.get("mission") else list(missions)
+    step = req.get("step")
+    results = []
+    for name in names:
+        if name not in missions:
+            raise ValueError(f"{name}: no such mission")
+        traj = simulate(program, missions[name], **params)
+        x, y, h = traj.final_pose()
+        res = {
+            "mission": name,
+            "duration_s": round(traj.duration, 3),
+            "final_pose": {
+                "x_mm": round(x, 1),
+                "y_mm": round(y, 1),
+                "heading": round(h, 2),
+            },
+            "warnings": traj.warnings,
+        }
+        if step:
+            n = int(traj.duration / step) + 1
+            res["samples"] = [
+                [round(t, 3)] + [round(v, 1) for v in traj.pose_at(t)[:3]]
+                for t in (min(k * step, traj.duration) for k in range(n + 1))
+            ]
+        results.append(res)
+    return {"results": results}
+
+
+def op_missions(state, req):
+    from spike_sim import DEFAULTS
+
+    params = sim_params(req)
+    radius = params.get("wheel_radius_mm", DEFAULTS["wheel_radius_mm"])
+    program = state.program(
+        req.get("file") or "<buffer>", req.get("source"), {}, radius
+    )
+    return {"missions": list(program.missions())}
+
+
+def op_plan(state, req):
+    import spike_plan
+    from spike_sim import DEFAULTS
+
+    sim = {
+        k: float(req.get(k, DEFAULTS[k]))
+        for k in ("wheel_radius_mm", "wheel_base_mm", "board_w_mm", "board_h_mm")
+    }
+    planner, opts = state.planner(req, sim)
+    start = tuple(float(v) for v in req["start"])
+    if len(start) == 2:
+        start += (0.0,)
+    goal = tuple(float(v) for v in req["goal"])
+    result = planner.plan(start, goal)
+    if result is None:
+        raise ValueError("no route: goal unreachable, or start/goal blocked")
+    route, est = result
+    _, _, _, _, _, speed, turn_speed, gain = opts
+    lines = spike_plan.route_code(
+        route, start[2], speed, turn_speed, gain, sim["wheel_radius_mm"]
+    )
+    return {"estimated_s": round(est, 3), "code": lines}
+
+
+def op_stats(state, req):
+    return {
+        "uptime_s": round(time.time() - state.started, 1),
+        "requests": state.requests,
+        "programs": {
+            "cached": len(state.programs.items),
+            "hits": state.programs.hits,
+            "misses": state.programs.misses,
+        },
+        "planners": {
+            "cached": len(state.planners.items),
+            "hits": state.planners.hits,
+            "misses": state.planners.misses,
+        },
+    }
+
+
+OPS = {
+    "ping": lambda state, req: {},
+    "missions": op_missions,
+    "simulate": op_simulate,
+    "plan": op_plan,
+    "stats": op_stats,
+}
+
+
+def handle(state, req):
+    """Reply dict for one request dict."""
+    t0 = time.perf_counter()
+    state.requests += 1
+    try:
+        op = OPS.get(req.get("op"))
+        if op is None:
+            raise ValueError(f"unknown op {req.get('op')!r}")
+        reply = dict(op(state, req), ok=True)
+    except Exception as e:
+        reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    reply["ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+    return reply
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                reply = {"ok": False, "error": f"bad JSON: {e}"}
+            else:
+                if req.get("op") == "shutdown":
+                    self._send({"ok": True, "ms": 0.0})
+                    # shutdown() waits for serve_forever(), so not from here
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+                with self.server.lock:
+                    reply = handle(self.server.state, req)
+            self._send(reply)
+
+    def _send(self, reply):
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # a thread per connection, so an editor holding its connection open
+    # doesn't block other clients; the lock runs one request at a time,
+    # as the caches aren't thread-safe and every reply takes milliseconds
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, _Handler)
+        self.state = State()
+        self.lock = threading.Lock()
+
+
+def serve(path):
+    if not hasattr(socket, "AF_UNIX"):
+        print("Unix sockets are not available on this platform")
+        return 1
+    if os.path.exists(path):
+        try:
+            request(path, {"op": "ping"})
+        except OSError:
+            os.unlink(path)  # left behind by a daemon that died
+        else:
+            print(f"a daemon is already listening on {path}")
+            return 1
+    for name in ("spike_sim", "spike_to_pygame"):
+        importlib.import_module(name)  # warm up before the first request
+
+    server = Server(path)
+    os.chmod(path, 0o600)
+    print(f"spike daemon listening on {path}", flush=True)
+    try:
+        server.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+
+def request(path, req):
+    """Send one request to the daemon at *path*; returns the reply dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps(req).encode("utf-8") + b"\n")
+        with s.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def parse_override(spec):
+    """Split "NAME=VALUE" into (name, value), VALUE as a Python literal."""
+    try:
+        name, value = spec.split("=", 1)
+        return name.strip(), ast.literal_eval(value.strip())
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {spec!r}")
+
+
+def print_reply(reply):
+    # human-readable output in the style of spike_sim.py
+    for res in reply.get("results", ()):
+        pose = res["final_pose"]
+        print(
+            f"{res['mission']}: {res['duration_s']:.2f}s, end ({pose['x_mm']:.0f},"
+            f" {pose['y_mm']:.0f}) mm @ {pose['heading']:.1f} deg"
+        )
+        for w in res["warnings"]:
+            print(f"    {w}")
+    if "code" in reply:
+        print(f"    # planned route, est. {reply['estimated_s']:.2f}s")
+        for line in reply["code"]:
+            print(f"    {line}")
+    if "missions" in reply:
+        print("\n".join(reply["missions"]))
+    for key in ("uptime_s", "requests", "programs", "planners"):
+        if key in reply:
+            print(f"{key}: {reply[key]}")
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("--socket", default=default_socket(), help="Unix socket path")
+    p.add_argument("--json", action="store_true", help="print raw JSON replies")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve", help="run the daemon in the foreground")
+    sub.add_parser("ping")
+    sub.add_parser("stats")
+    sub.add_parser("stop")
+    m = sub.add_parser("missions", help="list missions of a file")
+    m.add_argument("spike_file")
+    s = sub.add_parser("simulate", help="simulate missions of a file as saved")
+    s.add_argument("spike_file")
+    s.add_argument("mission", nargs="?", default=None)
+    s.add_argument(
+        "--set",
+        action="append",
+        type=parse_override,
+        default=[],
+        help="override a constant, e.g. GAIN=2.5",
+    )
+    s.add_argument(
+        "--param",
+        action="append",
+        type=parse_override,
+        default=[],
+        help="simulator parameter, e.g. lag_ms=40",
+    )
+    s.add_argument("--step", type=float, default=None, help="include samples (s)")
+    pl = sub.add_parser("plan", help="plan a route (see spike_plan.py)")
+    pl.add_argument("start", help="x,y[,heading]")
+    pl.add_argument("goal", help="x,y[,heading]")
+    pl.add_argument("--obstacles", default=None)
+    pl.add_argument("--mask", default=None)
+    pl.add_argument("--cell", type=float, default=20.0)
+    pl.add_argument("--headings", type=int, choices=(8, 16), default=16)
+    args = p.parse_args(argv[1:])
+
+    if args.cmd == "serve":
+        return serve(args.socket)
+    if args.cmd == "stop":
+        req = {"op": "shutdown"}
+    elif args.cmd in ("ping", "stats"):
+        req = {"op": args.cmd}
+    elif args.cmd == "missions":
+        req = {"op": "missions", "file": str(Path(args.spike_file).resolve())}
+    elif args.cmd == "simulate":
+        req = {
+            "op": "simulate",
+            "file": str(Path(args.spike_file).resolve()),
+            "mission": args.mission,
+            "overrides": dict(args.set),
+            "params": dict(args.param),
+            "step": args.step,
+        }
+    else:
+        req = {
+            "op": "plan",
+            "start": [float(v) for v in args.start.split(",")],
+            "goal": [float(v) for v in args.goal.split(",")],
+            "obstacles": args.obstacles and str(Path(args.obstacles).resolve()),
+            "mask": args.mask and str(Path(args.mask).resolve()),
+            "cell": args.cell,
+            "headings": args.headings,
+        }
+    try:
+        reply = request(args.socket, req)
+    except OSError as e:
+        print(
+            f"no daemon on {args.socket} ({e}); start one with: spike_daemon.py serve"
+        )
+        return 2
+    if args.json:
+        print(json.dumps(reply))
+    elif not reply.get("ok"):
+        print(reply.get("error"))
+    else:
+        print_reply(reply)
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
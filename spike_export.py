@@ -0,0 +1,290 @@
+"""
+Export a mission's simulated run as a PNG sequence or an animated GIF.
+
+The mission is simulated headlessly (spike_sim.py), then every frame of
+its timeline is drawn offscreen with SDL's dummy video driver: board,
+planned path, trail, robot and a time caption. Rendering runs in this
+process while a worker pool compresses the finished frames (PNG files, or
+palette quantisation and LZW for the GIF), so drawing and encoding overlap
+and the export runs much faster than real time. GIF frames are appended
+to the file in order as they come back, so only the frames in flight are
+held in memory, however long the run.
+
+GIF output needs Pillow (pip install Pillow), an optional dependency checked
+at startup; PNG frames are written with zlib directly, so they only need
+pygame for rendering.
+
+Usage:
+    python spike_export.py working_spike.py Run_3_Travel --out frames/
+    python spike_export.py working_spike.py Run_3_Travel --out travel.gif --fps 15
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from board_view import PathLayer, TrailLayer, Viewport, cached_scaled_board, image_size
+from spike_sim import DEFAULTS, load_program, simulate
+from spike_to_pygame import draw_robot
+
+GIF_COLORS = 256
+PNG_LEVEL = 1  # zlib level; frames are mostly flat colour, so 1 is nearly as small
+
+
+def _png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    )
+
+
+def encode_png(path, raw, size, level=PNG_LEVEL):
+    # RGB PNG written directly: unfiltered rows, fast zlib level
+    w, h = size
+    stride = 3 * w
+    rows = b"".join(b"\x00" + raw[y * stride : (y + 1) * stride] for y in range(h))
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(_png_chunk(b"IDAT", zlib.compress(rows, level)))
+        f.write(_png_chunk(b"IEND", b""))
+    return path
+
+
+def _skip_blocks(data, off):
+    # GIF data sub-blocks: length byte, bytes, ... up to a zero length
+    while data[off]:
+        off += data[off] + 1
+    return off + 1
+
+
+def split_gif(data):
+    """(colour table, interlace flag, LZW data) of the first image in GIF
+    *data*, so it can be written as one frame of an animation."""
+    if data[:6] not in (b"GIF87a", b"GIF89a"):
+        raise ValueError("not GIF data")
+    flags = data[10]
+    off = 13
+    table = b""
+    if flags & 0x80:
+        table = data[off : off + (3 << ((flags & 7) + 1))]
+        off += len(table)
+    while data[off] == 0x21:  # extensions: introducer, label, sub-blocks
+        off = _skip_blocks(data, off + 2)
+    if data[off] != 0x2C:
+        raise ValueError("no image in GIF data")
+    flags = data[off + 9]
+    off += 10
+    if flags & 0x80:
+        table = data[off : off + (3 << ((flags & 7) + 1))]
+        off += len(table)
+    if not table:
+        raise ValueError("GIF image has no colour table")
+    start = off
+    off = _skip_blocks(data, off + 1)  # LZW minimum code size, then sub-blocks
+    return table, flags & 0x40, data[start:off]
+
+
+def encode_gif_frame(raw, size):
+    # quantise and LZW-compress one frame in the pool: Pillow writes it as
+    # a one-frame GIF, and the parent appends its image to the animation
+    import io
+
+    from PIL import Image
+
+    img = Image.frombytes("RGB", size, raw).quantize(GIF_COLORS)
+    buf = io.BytesIO()
+    img.save(buf, "GIF", interlace=False)
+    return split_gif(buf.getvalue())
+
+
+def write_gif_header(f, size):
+    # logical screen without a global colour table; loop forever
+    f.write(b"GIF89a" + struct.pack("<HHBBB", size[0], size[1], 0, 0, 0))
+    f.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+
+def write_gif_frame(f, size, delay_cs, table, interlace, data):
+    """Append one frame from split_gif(), shown for *delay_cs* 1/100 s."""
+    bits = (len(table) // 3).bit_length() - 2  # table holds 2 ** (bits + 1)
+    f.write(struct.pack("<BBBBHBB", 0x21, 0xF9, 4, 0, delay_cs, 0, 0))
+    f.write(
+        struct.pack("<BHHHHB", 0x2C, 0, 0, size[0], size[1], 0x80 | interlace | bits)
+    )
+    f.write(table)
+    f.write(data)
+
+
+def render_frames(traj, fps, speed, size, board, board_mm, font):
+    """Yield (time, frame Surface) for the whole timeline."""
+    import pygame
+
+    w, h = size
+    screen = pygame.Surface(size)
+    view = Viewport(screen.get_rect(), board_mm[0], board_mm[1], w / board_mm[0])
+    planned = PathLayer(zip(traj.x, traj.y), (0, 130, 200, 160), width=2)
+    trail = TrailLayer((255, 255, 255, 230), width=3)
+    n = math.ceil(traj.duration * fps / speed)
+    for k in range(n + 1):
+        t = min(k * speed / fps, traj.duration)
+        x, y, heading, _ = traj.pose_at(t)
+        if board is not None:
+            screen.blit(board, (0, 0))
+        else:
+            screen.fill((200, 200, 200))
+        planned.draw(screen, view)
+        trail.add(x, y)
+        trail.draw(screen, view)
+        sx, sy = view.to_screen(x, y)
+        draw_robot(screen, (int(sx), int(sy)), heading, view.scale)
+        caption = font.render(f"{t:5.1f} s", True, (0, 0, 0), (255, 255, 255))
+        screen.blit(caption, (6, h - caption.get_height() - 6))
+        yield t, screen
+
+
+def export(traj, out, fps, speed, size, board, board_mm, workers=None):
+    """Render and encode; returns the number of frames written."""
+    import pygame
+
+    pygame.font.init()
+    font = pygame.font.SysFont(None, max(14, size[1] // 24))
+    gif = out.suffix.lower() == ".gif"
+    if not gif:
+        out.mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 3  # frames in flight, bounds memory
+    pending = {}  # future -> frame number
+    done = {}  # frame number -> encoded frame, until the GIF reaches it
+    count = written = 0
+    gif_file = None
+    if gif:
+        gif_file = open(out, "wb")
+        write_gif_header(gif_file, size)
+    delay_cs = int(round(100.0 / fps))
+
+    def collect(futures):
+        # GIF frames are appended in order as soon as they are encoded
+        nonlocal written
+        for f in futures:
+            done[pending.pop(f)] = f.result()
+        while written in done:
+            frame = done.pop(written)
+            if gif:
+                write_gif_frame(gif_file, size, delay_cs, *frame)
+            written += 1
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for k, (_t, frame) in enumerate(
+                render_frames(traj, fps, speed, size, board, board_mm, font)
+            ):
+                raw = pygame.image.tobytes(frame, "RGB")
+                if gif:
+                    fut = pool.submit(encode_gif_frame, raw, size)
+                else:
+                    fut = pool.submit(
+                        encode_png, str(out / f"frame_{k:05d}.png"), raw, size
+                    )
+                pending[fut] = k
+                count += 1
+                if len(pending) >= max_pending:
+                    collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+            collect(list(pending))
+        if gif:
+            gif_file.write(b"\x3b")  # trailer
+    finally:
+        if gif_file is not None:
+            gif_file.close()
+    return count
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("spike_file", help="mission source or .spir file")
+    p.add_argument("mission", help="mission to export, e.g. Run_3_Travel")
+    p.add_argument("--out", required=True, help="directory for PNGs, or a .gif file")
+    p.add_argument("--fps", type=float, default=20.0)
+    p.add_argument("--speed", type=float, default=1.0, help="playback speed-up")
+    p.add_argument("--width", type=int, default=960, help="frame width (pixels)")
+    p.add_argument(
+        "--board-image",
+        default="FLL 2025-2026 Board.png",
+        help="board background (1 px = 1 mm, as in the pygame window)",
+    )
+    p.add_argument(
+        "--board-cache",
+        default=str(Path(__file__).resolve().parent / ".board_cache"),
+        help="directory for cached scaled board images",
+    )
+    p.add_argument("--workers", type=int, default=None, help="encoder processes")
+    p.add_argument("--wheel-radius", type=float, default=DEFAULTS["wheel_radius_mm"])
+    p.add_argument("--wheel-base", type=float, default=DEFAULTS["wheel_base_mm"])
+    args = p.parse_args(argv[1:])
+
+    out = Path(args.out)
+    if out.suffix.lower() == ".gif":
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print(
+                "GIF export needs Pillow (pip install Pillow);"
+                " pass a directory as --out for a PNG sequence instead"
+            )
+            return 1
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    try:
+        import pygame
+    except Exception as e:
+        print("pygame not available:", e)
+        return 1
+
+    program = load_program(args.spike_file, wheel_radius_mm=args.wheel_radius)
+    missions = program.missions()
+    if args.mission not in missions:
+        print(f"{args.mission}: no such mission")
+        return 1
+
+    board_path = Path(args.board_image) if args.board_image else None
+    if board_path is not None and board_path.exists():
+        board_mm = image_size(board_path)
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))  # needed to convert() the board
+        if board_mm is None:
+            board_mm = pygame.image.load(board_path).get_size()
+    else:
+        board_path = None
+        board_mm = (DEFAULTS["board_w_mm"], DEFAULTS["board_h_mm"])
+        pygame.display.init()
+    size = (args.width, max(1, int(round(args.width * board_mm[1] / board_mm[0]))))
+    board = None
+    if board_path is not None:
+        board, _hit = cached_scaled_board(board_path, size, args.board_cache)
+
+    traj = simulate(
+        program,
+        missions[args.mission],
+        wheel_radius_mm=args.wheel_radius,
+        wheel_base_mm=args.wheel_base,
+        board_w_mm=board_mm[0],
+        board_h_mm=board_mm[1],
+    )
+    n = export(traj, out, args.fps, args.speed, size, board, board_mm, args.workers)
+    pygame.quit()
+    print(
+        f"Wrote {n} frames ({traj.duration:.1f} s of {args.mission} at"
+        f" {args.fps:g} fps) to {out.resolve()}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,313 @@
+"""
+Compact typed instruction IR for parsed missions, with a binary file format.
+
+parse_spike_file() yields one dict per instruction with many None fields.
+Program stores the same instructions column-wise: an opcode, string-table
+indices (mission, call name, symbol such as a port or condition source), a
+line number and a fixed block of NFIELDS float64 fields per instruction
+(NaN = not set). Which field means what depends on the opcode (see FIELDS).
+Calls the parser doesn't model ("call") keep their raw arguments in the symbol
+column as JSON text, [args_pos, args_kw]. There is no mission table: a
+mission is the run of instructions with the same function, so missions
+without instructions are not stored.
+
+Binary layout (.spir, little endian, every section 8-byte aligned so the
+columns can be viewed straight out of an mmap without copying):
+
+    header   b"SPIR", u16 version, u16 nfields, u32 count, u32 nstrings
+    strings  nstrings x (u16 length, utf-8 bytes); longer strings are
+             rejected when the Program is built
+    op       count x u8
+    func     count x u16   string index of the mission function
+    call     count x u16   string index of the dotted call name
+    sym      count x u16   string index of the symbol, NO_SYM if none
+    lineno   count x u32
+    fields   count x nfields x f64
+
+Usage:
+    python spike_to_pygame.py working_spike.py --out-bin missions.spir
+    python spike_to_pygame.py missions.spir
+"""
+
+import json
+import mmap
+import struct
+from array import array
+from pathlib import Path
+
+MAGIC = b"SPIR"
+VERSION = 1
+NFIELDS = 5
+NO_SYM = 0xFFFF
+MAX_STRING = 0xFFFF  # string table lengths are u16
+HEADER = struct.Struct("<4sHHII")
+
+# opcode -> (instruction type, numeric fields in order, symbol field)
+OPS = (
+    ("call", (), None),
+    (
+        "gyro_follow",
+        ("heading", "gain", "speed", "distance_deg", "distance_mm"),
+        "condition",
+    ),
+    ("gyro_turn", ("heading", "speed"), None),
+    ("line_follow", ("speed", "gain", "distance_deg", "distance_mm"), "condition"),
+    ("motor_run_for_degrees", ("degrees", "mm", "speed"), "port"),
+    ("motor_run_for_time", ("duration_ms", "speed"), "port"),
+    ("motor_run_to_rel", ("position_deg", "position_mm", "speed"), "port"),
+    ("motor_run_to_abs", ("position_deg", "speed"), "port"),
+    ("motor_pair_move_for_degrees", ("steering", "degrees", "mm", "speed"), None),
+    ("motor_pair_move_for_time", ("steering", "duration_ms", "speed"), None),
+    (
+        "motor_pair_move_tank_for_degrees",
+        ("degrees", "mm", "left_speed", "right_speed"),
+        None,
+    ),
+    ("sleep", ("duration_ms",), None),
+    ("reset_yaw", ("heading",), None),
+)
+
+OPCODES = {name: i for i, (name, _, _) in enumerate(OPS)}
+CALL = OPCODES["call"]
+FIELDS = {name: fields for name, fields, _ in OPS}
+# per-opcode field name -> column offset, for O(1) lookups
+FIELD_INDEX = tuple({f: k for k, f in enumerate(fields)} for _, fields, _ in OPS)
+SYM_FIELD = tuple(sym for _, _, sym in OPS)
+
+for _name, _fields, _ in OPS:
+    assert len(_fields) <= NFIELDS, _name
+
+NAN = float("nan")
+
+
+def _call_args_text(e):
+    # raw arguments of an unmodelled call as JSON, None when it has none recorded
+    if "args_pos" not in e and "args_kw" not in e:
+        return None
+    args = [e.get("args_pos") or [], e.get("args_kw") or {}]
+    return json.dumps(args, separators=(",", ":"), default=str)
+
+
+def _pad8(n):
+    return (8 - n % 8) % 8
+
+
+class Program:
+    """Column store of instructions; see module docstring for the layout."""
+
+    __slots__ = ("op", "func", "call", "sym", "lineno", "fields", "strings", "_buf")
+
+    def __init__(self, op, func, call, sym, lineno, fields, strings, buf=None):
+        self.op = op
+        self.func = func
+        self.call = call
+        self.sym = sym
+        self.lineno = lineno
+        self.fields = fields
+        self.strings = strings
+        self._buf = buf  # keeps an mmap alive while column views exist
+
+    def __len__(self):
+        return len(self.op)
+
+    @classmethod
+    def from_instructions(cls, instructions):
+        """Build from parse_spike_file() dicts."""
+        strings = []
+        index = {}
+
+        def intern(s, e, field):
+            if s is None:
+                return NO_SYM
+            s = str(s)
+            i = index.get(s)
+            if i is None:
+                n = len(s.encode("utf-8"))
+                if n > MAX_STRING:
+                    raise ValueError(
+                        f"{e.get('source_func')} line {e.get('lineno')}: {field}"
+                        f" is {n} bytes, too long for the .spir format"
+                        f" (max {MAX_STRING})"
+                    )
+                i = index[s] = len(strings)
+                strings.append(s)
+            return i
+
+        op = array("B")
+        func = array("H")
+        call = array("H")
+        sym = array("H")
+        lineno = array("I")
+        fields = array("d")
+        for e in instructions:
+            code = OPCODES.get(e.get("type"), 0)
+            _, names, sym_name = OPS[code]
+            op.append(code)
+            func.append(intern(e.get("source_func"), e, "source_func"))
+            call.append(intern(e.get("call"), e, "call"))
+            if code == CALL:
+                sym.append(intern(_call_args_text(e), e, "args"))
+            elif sym_name:
+                sym.append(intern(e.get(sym_name), e, sym_name))
+            else:
+                sym.append(NO_SYM)
+            lineno.append(int(e.get("lineno") or 0))
+            row = [NAN] * NFIELDS
+            for k, name in enumerate(names):
+                v = e.get(name)
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    row[k] = float(v)
+            fields.extend(row)
+        if len(strings) >= NO_SYM:
+            raise ValueError("too many distinct strings for the .spir format")
+        return cls(op, func, call, sym, lineno, fields, strings)
+
+    # ---------------- access ----------------
+
+    def type(self, i):
+        return OPS[self.op[i]][0]
+
+    def source_func(self, i):
+        return self.strings[self.func[i]]
+
+    def call_name(self, i):
+        return self.strings[self.call[i]]
+
+    def symbol(self, i):
+        s = self.sym[i]
+        return None if s == NO_SYM else self.strings[s]
+
+    def call_args(self, i):
+        """(args_pos, args_kw) of an unmodelled call, or None if not recorded."""
+        if self.op[i] != CALL:
+            return None
+        text = self.symbol(i)
+        return None if text is None else tuple(json.loads(text))
+
+    def get(self, i, name, default=None):
+        """Field *name* of instruction *i* (None/default when unset)."""
+        k = FIELD_INDEX[self.op[i]].get(name)
+        if k is None:
+            if name == SYM_FIELD[self.op[i]]:
+                return self.symbol(i)
+            return default
+        v = self.fields[i * NFIELDS + k]
+        return default if v != v else v
+
+    def missions(self):
+        """Mission name -> range of instruction indices, in file order.
+
+        Missions are the runs of instructions sharing a function, so a
+        mission the parser found no calls in is not listed (the parser
+        yields nothing for it either).
+        """
+        out = {}
+        start = 0
+        n = len(self.op)
+        for i in range(1, n + 1):
+            if i == n or self.func[i] != self.func[start]:
+                if n:
+                    out.setdefault(self.strings[self.func[start]], range(start, i))
+                start = i
+        return out
+
+    def to_instructions(self, pixel_scale=None):
+        """Back to parse_spike_file()-style dicts (for JSON export)."""
+        out = []
+        for i in range(len(self.op)):
+            typ, names, sym_name = OPS[self.op[i]]
+            e = {
+                "source_func": self.source_func(i),
+                "lineno": self.lineno[i],
+                "call": self.call_name(i),
+                "type": typ,
+            }
+            for name in names:
+                e[name] = self.get(i, name)
+            if sym_name:
+                e[sym_name] = self.symbol(i)
+            args = self.call_args(i)
+            if args is not None:
+                e["args_pos"], e["args_kw"] = args
+            if typ == "gyro_follow" and pixel_scale is not None:
+                mm = e["distance_mm"]
+                e["distance_px"] = None if mm is None else mm * float(pixel_scale)
+            out.append(e)
+        return out
+
+    # ---------------- binary format ----------------
+
+    def to_bytes(self):
+        parts = [HEADER.pack(MAGIC, VERSION, NFIELDS, len(self.op), len(self.strings))]
+        strtab = bytearray()
+        for s in self.strings:
+            b = s.encode("utf-8")
+            strtab += struct.pack("<H", len(b)) + b
+        strtab += b"\0" * _pad8(HEADER.size + len(strtab))
+        parts.append(bytes(strtab))
+        for col in (self.op, self.func, self.call, self.sym, self.lineno, self.fields):
+            b = col.tobytes()
+            parts.append(b + b"\0" * _pad8(len(b)))
+        return b"".join(parts)
+
+    def save(self, path):
+        Path(path).write_bytes(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buf):
+        """Columns become memoryviews into *buf* (no per-instruction objects)."""
+        mv = memoryview(buf)
+        if len(mv) < HEADER.size:
+            raise ValueError("not a .spir file")
+        magic, version, nfields, count, nstrings = HEADER.unpack_from(mv, 0)
+        if magic != MAGIC:
+            raise ValueError("not a .spir file")
+        if version != VERSION or nfields != NFIELDS:
+            raise ValueError(f"unsupported .spir version {version}/{nfields}")
+        off = HEADER.size
+        strings = []
+        for _ in range(nstrings):
+            if off + 2 > len(mv):
+                raise ValueError("not a .spir file (truncated)")
+            (n,) = struct.unpack_from("<H", mv, off)
+            if off + 2 + n > len(mv):
+                raise ValueError("not a .spir file (truncated)")
+            strings.append(bytes(mv[off + 2 : off + 2 + n]).decode("utf-8"))
+            off += 2 + n
+        off += _pad8(off)
+
+        def column(fmt, n):
+            nonlocal off
+            size = struct.calcsize(fmt) * n
+            if off + size > len(mv):
+                raise ValueError("not a .spir file (truncated)")
+            col = mv[off : off + size].cast(fmt)
+            off += size + _pad8(size)
+            return col
+
+        op = column("B", count)
+        func = column("H", count)
+        call = column("H", count)
+        sym = column("H", count)
+        lineno = column("I", count)
+        fields = column("d", count * NFIELDS)
+        return cls(op, func, call, sym, lineno, fields, strings, buf)
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        with open(path, "rb") as f:
+            if not use_mmap:
+                return cls.from_buffer(f.read())
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return cls.from_buffer(f.read())
+        return cls.from_buffer(buf)
+
+
+def is_program_file(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == MAGIC
+    except OSError:
+        return False
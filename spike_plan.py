@@ -0,0 +1,495 @@
+"""
+Plan a time-optimal drive across the board and print it as mission code.
+
+The board is a grid of --cell mm squares with obstacles from a JSON file of
+rectangles (board mm) and/or a mask image (dark pixels = obstacle, scaled
+to the board; needs pygame). The robot is a --robot-length x --robot-width
+rectangle centred on its wheel axle, so whether a cell is reachable depends
+on the heading: for each lattice heading the obstacles (and the board edge)
+are dilated by the rotated footprint once, up front. Turning in place must
+clear every lattice heading it sweeps through.
+
+The search is A* over (cell, heading) with 8 or 16 headings. Moving one
+cell costs its length at cruise speed; changing heading costs a gyro_turn
+plus the fixed start/stop overhead of the next gyro_follow. Both are
+calibrated against the headless simulator (spike_sim.py), so costs are the
+same timing model the missions are checked with. The heuristic is the
+obstacle-aware distance to the goal at cruise speed, from one Dijkstra pass
+out of the goal cell before the search starts; it never overestimates, so
+the route is time-optimal on the lattice, and it keeps the search narrow
+enough for a cross-board query to run in well under a second.
+
+The route is printed as gyro_turn / gyro_follow calls with distances in
+wheel degrees, headings relative to yaw 0 at the start pose. --check
+simulates the printed code and reports where it actually ends.
+
+Obstacle file:
+
+    [[x, y, w, h], ...]   or   {"obstacles": [{"x": .., "y": .., "w": .., "h": ..}]}
+
+Usage:
+    python spike_plan.py 200,200,0 1900,800 --obstacles board_obstacles.json
+    python spike_plan.py 200,200,0 1900,800,90 --mask board_mask.png --check
+"""
+
+import argparse
+import heapq
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+from spike_ir import Program
+from spike_sim import DEFAULTS, normalize_angle, pct_to_dps, simulate
+from spike_to_pygame import deg_to_mm, parse_spike_source
+
+# lattice moves (dx, dy) in cells; heading = atan2(dy, dx), y down as on the board
+MOVES_8 = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+MOVES_16 = (
+    (1, 0),
+    (2, 1),
+    (1, 1),
+    (1, 2),
+    (0, 1),
+    (-1, 2),
+    (-1, 1),
+    (-2, 1),
+    (-1, 0),
+    (-2, -1),
+    (-1, -1),
+    (-1, -2),
+    (0, -1),
+    (1, -2),
+    (1, -1),
+    (2, -1),
+)
+TURN_TABLE_STEP = 15  # degrees between calibrated turn angles
+NO_TURN_DEG = 0.5  # start/goal headings this close need no gyro_turn
+
+
+def parse_pose(spec):
+    """Split "x,y" or "x,y,heading" (mm, mm, degrees) into a tuple."""
+    try:
+        vals = tuple(float(v) for v in spec.split(","))
+    except ValueError:
+        vals = ()
+    if len(vals) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"expected x,y[,heading], got {spec!r}")
+    return vals
+
+
+def load_rects(path):
+    """Obstacle rectangles (x, y, w, h) in board mm from a JSON file."""
+    data = json.loads(Path(path).read_text())
+    if isinstance(data, dict):
+        data = data.get("obstacles", [])
+    rects = []
+    for item in data:
+        if isinstance(item, dict):
+            item = (item["x"], item["y"], item["w"], item["h"])
+        x, y, w, h = (float(v) for v in item)
+        rects.append((x, y, w, h))
+    return rects
+
+
+class Grid:
+    """Obstacle cells of the board, one bytearray row-major (1 = blocked)."""
+
+    def __init__(self, board_w_mm, board_h_mm, cell_mm):
+        self.cell = float(cell_mm)
+        self.w = max(1, int(math.ceil(board_w_mm / self.cell)))
+        self.h = max(1, int(math.ceil(board_h_mm / self.cell)))
+        self.board = (board_w_mm, board_h_mm)
+        self.blocked = bytearray(self.w * self.h)
+
+    def add_rect(self, x, y, w, h):
+        c = self.cell
+        x0 = max(0, int(x // c))
+        y0 = max(0, int(y // c))
+        x1 = min(self.w, int(math.ceil((x + w) / c)))
+        y1 = min(self.h, int(math.ceil((y + h) / c)))
+        for cy in range(y0, y1):
+            row = cy * self.w
+            self.blocked[row + x0 : row + x1] = b"\x01" * max(0, x1 - x0)
+
+    def add_mask(self, path):
+        # sample the image at each cell centre; dark, opaque pixels block
+        import pygame
+
+        img = pygame.image.load(str(path))
+        iw, ih = img.get_size()
+        sx = iw / self.board[0]
+        sy = ih / self.board[1]
+        for cy in range(self.h):
+            py = min(ih - 1, int((cy + 0.5) * self.cell * sy))
+            for cx in range(self.w):
+                px = min(iw - 1, int((cx + 0.5) * self.cell * sx))
+                r, g, b, a = img.get_at((px, py))
+                if a >= 128 and (r * 299 + g * 587 + b * 114) < 128000:
+                    self.blocked[cy * self.w + cx] = 1
+
+    def cell_of(self, x, y):
+        cx = min(self.w - 1, max(0, int(x // self.cell)))
+        cy = min(self.h - 1, max(0, int(y // self.cell)))
+        return cx, cy
+
+
+def footprint(length_mm, width_mm, heading, cell_mm):
+    """Cell offsets covered by the robot rectangle at *heading*, centred on
+    the axle; conservative by half a cell on every side."""
+    hl = 0.5 * length_mm + 0.5 * cell_mm
+    hw = 0.5 * width_mm + 0.5 * cell_mm
+    c, s = math.cos(math.radians(heading)), math.sin(math.radians(heading))
+    reach = int(math.ceil(math.hypot(hl, hw) / cell_mm))
+    cells = []
+    for dy in range(-reach, reach + 1):
+        for dx in range(-reach, reach + 1):
+            px, py = dx * cell_mm, dy * cell_mm
+            if abs(px * c + py * s) <= hl and abs(-px * s + py * c) <= hw:
+                cells.append((dx, dy))
+    return cells
+
+
+def dilate(grid, offsets):
+    """Cells where the footprint *offsets* hit an obstacle or leave the
+    board; rows are bit masks so each offset is one shift per row."""
+    w, h = grid.w, grid.h
+    pad = max(max(abs(dx), abs(dy)) for dx, dy in offsets)
+    full = (1 << (w + 2 * pad)) - 1
+    rows = [full] * pad
+    for cy in range(h):
+        bits = 0
+        row = grid.blocked[cy * w : (cy + 1) * w]
+        for cx in range(w):
+            if row[cx]:
+                bits |= 1 << cx
+        # outside the board counts as blocked
+        bits = (bits << pad) | ((1 << pad) - 1) | (((1 << pad) - 1) << (w + pad))
+        rows.append(bits)
+    rows += [full] * pad
+    out = bytearray(w * h)
+    for cy in range(h):
+        acc = 0
+        for dx, dy in offsets:
+            bits = rows[cy + pad + dy]
+            acc |= bits >> dx if dx >= 0 else bits << -dx
+        acc >>= pad
+        base = cy * w
+        for cx in range(w):
+            if (acc >> cx) & 1:
+                out[base + cx] = 1
+    return out
+
+
+def calibrate(speed, turn_speed, gain, sim):
+    """Timing model from the simulator: gyro_follow time = overhead +
+    mm / cruise, and gyro_turn time by angle (every TURN_TABLE_STEP deg)."""
+    r = sim["wheel_radius_mm"]
+
+    def run(instr):
+        instr.update({"source_func": "Run_Plan", "lineno": 0, "call": instr["type"]})
+        return simulate(Program.from_instructions([instr]), **sim).duration
+
+    cruise = deg_to_mm(pct_to_dps(speed, sim.get("max_dps", DEFAULTS["max_dps"])), r)
+    long_deg = 2000.0
+    t_long = run(
+        {
+            "type": "gyro_follow",
+            "heading": 0,
+            "gain": gain,
+            "speed": speed,
+            "distance_deg": long_deg,
+        }
+    )
+    overhead = max(0.0, t_long - deg_to_mm(long_deg, r) / cruise)
+    turns = [
+        run({"type": "gyro_turn", "heading": a, "speed": turn_speed})
+        for a in range(0, 181, TURN_TABLE_STEP)
+    ]
+    return cruise, overhead, turns
+
+
+class Planner:
+    """Heading lattice over a Grid, with per-goal heuristics cached."""
+
+    def __init__(self, grid, headings, robot_length, robot_width, timing):
+        self.grid = grid
+        self.moves = MOVES_16 if headings == 16 else MOVES_8
+        self.angles = [math.degrees(math.atan2(dy, dx)) for dx, dy in self.moves]
+        self.steps = [math.hypot(dx, dy) * grid.cell for dx, dy in self.moves]
+        self.cruise, self.overhead, self.turn_times = timing
+        blocked = [
+            dilate(grid, footprint(robot_length, robot_width, a, grid.cell))
+            for a in self.angles
+        ]
+        # per cell, bit hi set if the robot fits there at heading hi
+        self.fit_mask = [
+            sum(1 << hi for hi, b in enumerate(col) if not b) for col in zip(*blocked)
+        ]
+        n = len(self.moves)
+        # turning hi -> hj (the short way) must clear every heading it passes
+        self.sweep = [[0] * n for _ in range(n)]
+        self.turn_cost = [[0.0] * n for _ in range(n)]
+        for a in range(n):
+            for b in range(n):
+                step = 1 if (b - a) % n <= n // 2 else -1
+                i, mask = a, 1 << a
+                while i != b:
+                    i = (i + step) % n
+                    mask |= 1 << i
+                self.sweep[a][b] = mask
+                delta = self.angles[b] - self.angles[a]
+                self.turn_cost[a][b] = self.turn_time(delta) + self.overhead
+        self._heuristics = {}
+
+    def turn_time(self, delta):
+        a = min(180.0, abs(normalize_angle(delta)))
+        k = min(len(self.turn_times) - 2, int(a // TURN_TABLE_STEP))
+        f = (a - k * TURN_TABLE_STEP) / TURN_TABLE_STEP
+        return self.turn_times[k] + f * (self.turn_times[k + 1] - self.turn_times[k])
+
+    def fits(self, cell, hi):
+        return (self.fit_mask[cell] >> hi) & 1 == 1
+
+    def heuristic(self, goal):
+        """Lower bound on drive time (s) to *goal* from every cell."""
+        h = self._heuristics.get(goal)
+        if h is not None:
+            return h
+        w, hgt = self.grid.w, self.grid.h
+        dist = [math.inf] * (w * hgt)
+        dist[goal] = 0.0
+        queue = [(0.0, goal)]
+        free = self.fit_mask
+        moves = list(zip(self.moves, self.steps))
+        while queue:
+            d, c = heapq.heappop(queue)
+            if d > dist[c]:
+                continue
+            cy, cx = divmod(c, w)
+            for (dx, dy), step in moves:
+                nx, ny = cx - dx, cy - dy  # reversed edges: we search from the goal
+                if 0 <= nx < w and 0 <= ny < hgt:
+                    n = ny * w + nx
+                    nd = d + step
+                    if free[n] and nd < dist[n]:
+                        dist[n] = nd
+                        heapq.heappush(queue, (nd, n))
+        h = [d / self.cruise for d in dist]
+        self._heuristics[goal] = h
+        return h
+
+    def plan(self, start, goal):
+        """Route from *start* (x, y, heading) to *goal* (x, y[, heading]).
+
+        Returns (segments, estimated seconds) with segments a list of
+        ("turn", heading) and ("follow", heading, mm), headings in board
+        degrees; None if the goal cannot be reached.
+        """
+        grid = self.grid
+        w = grid.w
+        sx, sy = grid.cell_of(start[0], start[1])
+        gx, gy = grid.cell_of(goal[0], goal[1])
+        s_cell, g_cell = sy * w + sx, gy * w + gx
+        goal_heading = goal[2] if len(goal) > 2 else None
+        hmap = self.heuristic(g_cell)
+        if math.isinf(hmap[s_cell]):
+            return None
+
+        n = len(self.moves)
+        fit = self.fit_mask
+        sweep, turn_cost = self.sweep, self.turn_cost
+        forward = [
+            (dx, dy, dy * w + dx, step / self.cruise)
+            for (dx, dy), step in zip(self.moves, self.steps)
+        ]
+        # states are cell * n + heading, plus one before the first and one
+        # after the last move
+        START, DONE = len(fit) * n, len(fit) * n + 1
+        g = [math.inf] * (DONE + 1)
+        parent = {START: None}
+        g[START] = 0.0
+        queue = [(hmap[s_cell], 0.0, START)]
+        while queue:
+            _, cost, state = heapq.heappop(queue)
+            if cost > g[state]:
+                continue
+            if state == DONE:
+                break
+            succ = []
+            if state == START:
+                for hi in range(n):
+                    if self.fits(s_cell, hi):
+                        delta = normalize_angle(self.angles[hi] - start[2])
+                        t = self.turn_time(delta) if abs(delta) > NO_TURN_DEG else 0.0
+                        succ.append((s_cell * n + hi, t + self.overhead))
+            else:
+                cell, hi = divmod(state, n)
+                if cell == g_cell:
+                    t = 0.0
+                    if goal_heading is not None:
+                        delta = normalize_angle(goal_heading - self.angles[hi])
+                        if abs(delta) > NO_TURN_DEG:
+                            t = self.turn_time(delta)
+                    succ.append((DONE, t))
+                dx, dy, dc, t = forward[hi]
+                cy, cx = divmod(cell, w)
+                if 0 <= cx + dx < w and 0 <= cy + dy < grid.h:
+                    if (fit[cell + dc] >> hi) & 1:
+                        succ.append(((cell + dc) * n + hi, t))
+                mask = fit[cell]
+                row, costs = sweep[hi], turn_cost[hi]
+                for hj in range(n):
+                    if hj != hi and mask & row[hj] == row[hj]:
+                        succ.append((cell * n + hj, costs[hj]))
+            for nxt, step_cost in succ:
+                nc = cost + step_cost
+                if nc < g[nxt]:
+                    g[nxt] = nc
+                    parent[nxt] = state
+                    est = 0.0 if nxt == DONE else hmap[nxt // n]
+                    heapq.heappush(queue, (nc + est, nc, nxt))
+        if math.isinf(g[DONE]):
+            return None
+
+        states = []
+        state = parent[DONE]
+        while state != START:
+            states.append(state)
+            state = parent[state]
+        states.reverse()
+        # straight runs; turns in place show up as heading changes between them
+        runs = []
+        prev = s_cell
+        for state in states:
+            cell, hi = divmod(state, n)
+            if cell != prev:
+                if runs and runs[-1][0] == hi:
+                    runs[-1][1] += self.steps[hi]
+                else:
+                    runs.append([hi, self.steps[hi]])
+            prev = cell
+        route = []
+        heading = start[2]
+        for hi, mm in runs:
+            if abs(normalize_angle(self.angles[hi] - heading)) > NO_TURN_DEG:
+                route.append(("turn", self.angles[hi]))
+            heading = self.angles[hi]
+            route.append(("follow", heading, mm))
+        if goal_heading is not None:
+            if abs(normalize_angle(goal_heading - heading)) > NO_TURN_DEG:
+                route.append(("turn", goal_heading))
+        return route, g[DONE]
+
+
+def route_code(route, start_heading, speed, turn_speed, gain, wheel_radius_mm):
+    """Mission code lines for *route*; headings relative to *start_heading*."""
+    lines = []
+    for seg in route:
+        heading = round(normalize_angle(seg[1] - start_heading), 1)
+        heading = int(heading) if heading == int(heading) else heading
+        if seg[0] == "turn":
+            lines.append(f"gyro_turn(heading={heading}, speed={turn_speed})")
+        else:
+            deg = int(round(seg[2] / deg_to_mm(1.0, wheel_radius_mm)))
+            lines.append(
+                f"gyro_follow(heading={heading}, gain={gain}, speed={speed},"
+                f" distance={deg})  # {seg[2]:.0f} mm"
+            )
+    return lines
+
+
+def check_route(lines, start, sim):
+    """Simulate the printed lines from *start*; returns the Trajectory."""
+    src = "def Run_Plan():\n    motion_sensor.reset_yaw(0)\n" + "".join(
+        f"    {line}\n" for line in lines
+    )
+    program = Program.from_instructions(
+        parse_spike_source(src, "<plan>", wheel_radius_mm=sim["wheel_radius_mm"])
+    )
+    params = dict(sim, start_x_mm=start[0], start_y_mm=start[1], start_heading=start[2])
+    return simulate(program, **params)
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("start", type=parse_pose, help="x,y[,heading] in board mm / deg")
+    p.add_argument("goal", type=parse_pose, help="x,y[,heading]; heading optional")
+    p.add_argument("--obstacles", default=None, help="JSON file of rectangles")
+    p.add_argument("--mask", default=None, help="obstacle image (needs pygame)")
+    p.add_argument("--cell", type=float, default=20.0, help="grid cell size (mm)")
+    p.add_argument("--headings", type=int, choices=(8, 16), default=16)
+    p.add_argument("--robot-length", type=float, default=200.0, help="mm")
+    p.add_argument("--robot-width", type=float, default=160.0, help="mm")
+    p.add_argument("--clearance", type=float, default=10.0, help="extra mm all round")
+    p.add_argument("--speed", type=int, default=50, help="gyro_follow speed (%%)")
+    p.add_argument("--turn-speed", type=int, default=20, help="gyro_turn speed (%%)")
+    p.add_argument("--gain", type=float, default=0.2)
+    p.add_argument("--board-w", type=float, default=DEFAULTS["board_w_mm"])
+    p.add_argument("--board-h", type=float, default=DEFAULTS["board_h_mm"])
+    p.add_argument("--wheel-radius", type=float, default=DEFAULTS["wheel_radius_mm"])
+    p.add_argument("--wheel-base", type=float, default=DEFAULTS["wheel_base_mm"])
+    p.add_argument("--check", action="store_true", help="simulate the printed route")
+    args = p.parse_args(argv[1:])
+    start = args.start if len(args.start) == 3 else args.start + (0.0,)
+    sim = {
+        "wheel_radius_mm": args.wheel_radius,
+        "wheel_base_mm": args.wheel_base,
+        "board_w_mm": args.board_w,
+        "board_h_mm": args.board_h,
+    }
+
+    t0 = time.perf_counter()
+    grid = Grid(args.board_w, args.board_h, args.cell)
+    if args.obstacles:
+        for rect in load_rects(args.obstacles):
+            grid.add_rect(*rect)
+    if args.mask:
+        try:
+            grid.add_mask(args.mask)
+        except ImportError:
+            print("--mask needs pygame (pip install pygame)")
+            return 1
+    timing = calibrate(args.speed, args.turn_speed, args.gain, sim)
+    planner = Planner(
+        grid,
+        args.headings,
+        args.robot_length + 2 * args.clearance,
+        args.robot_width + 2 * args.clearance,
+        timing,
+    )
+    t1 = time.perf_counter()
+    result = planner.plan(start, args.goal)
+    t2 = time.perf_counter()
+    if result is None:
+        print("No route: goal unreachable, or start/goal blocked for this footprint")
+        return 1
+    route, est = result
+    lines = route_code(
+        route, start[2], args.speed, args.turn_speed, args.gain, args.wheel_radius
+    )
+    print(f"    # planned route, est. {est:.2f}s (headings relative to start yaw 0)")
+    for line in lines:
+        print(f"    {line}")
+    print(
+        f"# {grid.w}x{grid.h} cells x {args.headings} headings;"
+        f" setup {t1 - t0:.2f}s, search {t2 - t1:.2f}s",
+        file=sys.stderr,
+    )
+    if args.check:
+        traj = check_route(lines, start, sim)
+        x, y, h = traj.final_pose()
+        err = math.hypot(x - args.goal[0], y - args.goal[1])
+        print(
+            f"# simulated: {traj.duration:.2f}s, end ({x:.0f}, {y:.0f}) mm"
+            f" @ {h:.1f} deg, {err:.0f} mm from goal",
+            file=sys.stderr,
+        )
+        for warning in traj.warnings:
+            print(f"#     {warning}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,147 @@
+"""
+Lightweight frame profiler for the pygame simulator.
+
+Named spans time the parts of a frame (event handling, simulation step,
+drawing, flip). The profiler keeps a rolling window of frame
+times and per-span durations for the on-screen overlay, and can record
+every span as a Chrome trace event ("Trace Event Format" JSON) that
+chrome://tracing or https://ui.perfetto.dev open offline.
+
+When disabled, span() returns a shared no-op context manager, so an
+instrumented frame only pays for a method call per span.
+"""
+
+import json
+import time
+from collections import deque
+
+_clock = time.perf_counter
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("prof", "name", "t0")
+
+    def __init__(self, prof, name):
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof._record(self.name, self.t0, _clock())
+        return False
+
+
+class Profiler:
+    def __init__(self, window=240, trace=False):
+        self.window = window
+        self.enabled = False
+        self.trace = trace
+        self.events = []
+        self.frames = deque(maxlen=window)
+        self.spans = {}  # name -> deque of per-frame totals (seconds)
+        self._current = {}
+        self._frame_t0 = None
+        self._epoch = _clock()
+        if trace:
+            self.enabled = True
+
+    def set_enabled(self, on):
+        # tracing keeps the profiler on regardless of the overlay
+        self.enabled = bool(on) or self.trace
+        self._frame_t0 = None
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def _record(self, name, t0, t1):
+        self._current[name] = self._current.get(name, 0.0) + (t1 - t0)
+        if self.trace:
+            self.events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (t0 - self._epoch) * 1e6,
+                    "dur": (t1 - t0) * 1e6,
+                    "pid": 1,
+                    "tid": 1,
+                }
+            )
+
+    def frame_end(self):
+        """Close the current frame: fold span totals into the rolling window."""
+        if not self.enabled:
+            return
+        now = _clock()
+        if self._frame_t0 is not None:
+            self.frames.append(now - self._frame_t0)
+            for name, secs in self._current.items():
+                d = self.spans.get(name)
+                if d is None:
+                    d = self.spans[name] = deque(maxlen=self.window)
+                d.append(secs)
+        self._current = {}
+        self._frame_t0 = now
+
+    def percentiles(self, ps=(50, 95, 99)):
+        """Frame-time percentiles in milliseconds over the rolling window."""
+        if not self.frames:
+            return {p: 0.0 for p in ps}
+        ordered = sorted(self.frames)
+        n = len(ordered) - 1
+        return {p: 1000.0 * ordered[int(round(p / 100.0 * n))] for p in ps}
+
+    def breakdown(self):
+        """(span name, mean ms per frame) sorted by cost."""
+        rows = [(name, 1000.0 * sum(d) / len(d)) for name, d in self.spans.items() if d]
+        rows.sort(key=lambda r: -r[1])
+        return rows
+
+    def overlay_lines(self):
+        pct = self.percentiles()
+        mean = 1000.0 * sum(self.frames) / len(self.frames) if self.frames else 0.0
+        fps = 1000.0 / mean if mean else 0.0
+        lines = [
+            f"frame p50 {pct[50]:.1f}  p95 {pct[95]:.1f}  p99 {pct[99]:.1f} ms",
+            f"{fps:.0f} fps over {len(self.frames)} frames",
+        ]
+        lines += [f"  {name:10s} {ms:6.2f} ms" for name, ms in self.breakdown()]
+        return lines
+
+    def write_trace(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def draw_overlay(screen, font, prof, topleft=(8, 8)):
+    """Semi-transparent box with the profiler's overlay lines."""
+    import pygame
+
+    lines = prof.overlay_lines()
+    surfs = [font.render(line, True, (255, 255, 255)) for line in lines]
+    w = max(s.get_width() for s in surfs) + 12
+    h = sum(s.get_height() for s in surfs) + 12
+    box = pygame.Surface((w, h), pygame.SRCALPHA)
+    box.fill((0, 0, 0, 170))
+    screen.blit(box, topleft)
+    y = topleft[1] + 6
+    for s in surfs:
+        screen.blit(s, (topleft[0] + 6, y))
+        y += s.get_height()
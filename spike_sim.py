@@ -0,0 +1,563 @@
+"""
+Headless closed-loop simulation of parsed missions (no pygame needed).
+
+Replays a Program (see spike_ir.py) the way working_spike.py drives the hub:
+gyro_follow and gyro_turn run their control loops at the hub's loop rates
+(10 ms / 20 ms) against a differential-drive model, sleeps take their time,
+and non-blocking actuator commands take none. Poses are in board millimetres
+(x right, y down) and heading in degrees, using the same convention as the
+pygame window.
+
+Usage:
+    python spike_sim.py working_spike.py Run_3_Travel
+    python spike_sim.py working_spike.py --compare @HEAD~1
+    python spike_sim.py working_spike.py --lag-ms 40 --predict-report --turn-speed-scale 2
+"""
+
+import argparse
+import math
+import subprocess
+import sys
+from array import array
+from bisect import bisect_right
+from collections import deque
+from pathlib import Path
+
+from spike_ir import MAGIC, Program, is_program_file
+
+DEFAULTS = {
+    "wheel_radius_mm": 24.0,
+    "wheel_base_mm": 120.0,
+    "max_dps": 1100.0,  # MAX_DPS in working_spike.py
+    "accel_dps2": 1000.0,  # motor_pair.move default acceleration
+    "start_x_mm": 200.0,
+    "start_y_mm": 200.0,
+    "start_heading": 0.0,
+    "board_w_mm": 2362.0,
+    "board_h_mm": 1143.0,
+    "sample_ms": 20.0,  # trajectory sample period
+    "max_motion_s": 15.0,  # cap for motions that never reach their distance
+    "lag_ms": 0.0,  # sensor-to-motor latency: commands take effect this much later
+    "predict": False,  # steer on predicted yaw (HeadingEstimator, PREDICT on the hub)
+    "turn_speed_scale": 1.0,  # multiplies every gyro_turn speed (what-if runs)
+}
+
+DRIVE_PORTS = ("LEFT", "RIGHT", "port.A", "port.B")
+
+
+def clamp(v, lo, hi):
+    return lo if v < lo else hi if v > hi else v
+
+
+def normalize_angle(a):
+    return (float(a) + 180.0) % 360.0 - 180.0
+
+
+def pct_to_dps(pct, max_dps):
+    return int(clamp(pct, -100, 100) * max_dps / 100.0)
+
+
+def steering_split(steering, dps):
+    # SPIKE motor_pair steering -> (left, right) wheel speeds in deg/sec
+    s = clamp(steering, -100, 100)
+    if s >= 0:
+        return dps, dps * (1.0 - 2.0 * s / 100.0)
+    return dps * (1.0 + 2.0 * s / 100.0), dps
+
+
+class Trajectory:
+    """Sampled poses of one simulated run, with the instruction index active
+    at each sample; pose_at() interpolates between samples."""
+
+    __slots__ = ("t", "x", "y", "h", "idx", "warnings", "turn_errors")
+
+    def __init__(self):
+        self.t = array("d")
+        self.x = array("d")
+        self.y = array("d")
+        self.h = array("d")
+        self.idx = array("i")
+        self.warnings = []
+        self.turn_errors = []  # settled heading error (deg) after each gyro_turn
+
+    def __len__(self):
+        return len(self.t)
+
+    def add(self, t, x, y, h, idx):
+        self.t.append(t)
+        self.x.append(x)
+        self.y.append(y)
+        self.h.append(h)
+        self.idx.append(idx)
+
+    @property
+    def duration(self):
+        return self.t[-1] if self.t else 0.0
+
+    def final_pose(self):
+        if not self.t:
+            return None
+        return self.x[-1], self.y[-1], normalize_angle(self.h[-1])
+
+    def pose_at(self, t):
+        """(x, y, heading, instruction index) at time t seconds."""
+        n = len(self.t)
+        if n == 0:
+            return None
+        k = bisect_right(self.t, t)
+        if k <= 0:
+            return self.x[0], self.y[0], self.h[0], self.idx[0]
+        if k >= n:
+            return self.x[-1], self.y[-1], self.h[-1], self.idx[-1]
+        t0 = self.t[k - 1]
+        t1 = self.t[k]
+        f = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+        return (
+            self.x[k - 1] + (self.x[k] - self.x[k - 1]) * f,
+            self.y[k - 1] + (self.y[k] - self.y[k - 1]) * f,
+            self.h[k - 1] + (self.h[k] - self.h[k - 1]) * f,
+            self.idx[k - 1],
+        )
+
+
+class _Robot:
+    # differential-drive state advanced in fixed control-loop steps
+    __slots__ = (
+        "p",
+        "x",
+        "y",
+        "h",
+        "t",
+        "vl",
+        "vr",
+        "right_deg",
+        "yaw_zero",
+        "traj",
+        "next_sample",
+        "idx",
+        "out",
+        "lag",
+        "pending",
+        "cmd",
+    )
+
+    def __init__(self, p, traj):
+        self.p = p
+        self.x = float(p["start_x_mm"])
+        self.y = float(p["start_y_mm"])
+        self.h = float(p["start_heading"])
+        self.t = 0.0
+        self.vl = 0.0  # wheel speeds, deg/sec
+        self.vr = 0.0
+        self.right_deg = 0.0
+        self.yaw_zero = 0.0
+        self.traj = traj
+        self.next_sample = 0.0
+        self.idx = -1
+        self.out = False
+        self.lag = p["lag_ms"] / 1000.0
+        self.pending = deque()  # (time effective, cmd_l, cmd_r); None = brake
+        self.cmd = (0.0, 0.0)
+
+    def yaw(self):
+        return normalize_angle(self.h - self.yaw_zero)
+
+    def yaw_rate(self):
+        # deg/sec, what motion_sensor.angular_velocity() reports on the hub
+        k = 2.0 * math.pi * self.p["wheel_radius_mm"] / 360.0
+        return math.degrees((self.vr - self.vl) * k / self.p["wheel_base_mm"])
+
+    def heading(self):
+        """Yaw as the control loops see it: measured, or with predict on,
+        extrapolated to when the next command takes effect."""
+        if not self.p["predict"]:
+            return self.yaw()
+        return normalize_angle(self.yaw() + self.yaw_rate() * self.lag)
+
+    def _active(self):
+        # commands issued lag seconds ago take effect now
+        while self.pending and self.pending[0][0] <= self.t + 1e-9:
+            _, cmd_l, cmd_r = self.pending.popleft()
+            if cmd_l is None:
+                self.vl = self.vr = 0.0
+                cmd_l = cmd_r = 0.0
+            self.cmd = (cmd_l, cmd_r)
+        return self.cmd
+
+    def sample(self, force=False):
+        if force or self.t >= self.next_sample:
+            self.traj.add(self.t, self.x, self.y, self.h, self.idx)
+            self.next_sample = self.t + self.p["sample_ms"] / 1000.0
+
+    def step(self, cmd_l, cmd_r, dt):
+        # ramp wheel speeds toward the command, then integrate the pose
+        if self.lag:
+            self.pending.append((self.t + self.lag, cmd_l, cmd_r))
+            cmd_l, cmd_r = self._active()
+        dv = self.p["accel_dps2"] * dt
+        self.vl += clamp(cmd_l - self.vl, -dv, dv)
+        self.vr += clamp(cmd_r - self.vr, -dv, dv)
+        k = 2.0 * math.pi * self.p["wheel_radius_mm"] / 360.0
+        sl = self.vl * k * dt
+        sr = self.vr * k * dt
+        ds = 0.5 * (sl + sr)
+        dh = math.degrees((sr - sl) / self.p["wheel_base_mm"])
+        rad = math.radians(self.h + 0.5 * dh)
+        self.x += ds * math.cos(rad)
+        self.y += ds * math.sin(rad)
+        self.h += dh
+        self.right_deg += self.vr * dt
+        self.t += dt
+        if not self.out and (
+            self.x < 0
+            or self.y < 0
+            or self.x > self.p["board_w_mm"]
+            or self.y > self.p["board_h_mm"]
+        ):
+            self.out = True
+        self.sample()
+
+    def stop(self):
+        if self.lag:
+            self.pending.append((self.t + self.lag, None, None))
+        else:
+            self.vl = self.vr = 0.0
+
+    def wait(self, secs):
+        end = self.t + max(0.0, secs)
+        while self.t < end:
+            self.step(0.0, 0.0, min(0.01, end - self.t))
+
+
+def _gyro_follow(r, heading, gain, speed, distance, cond_to_edge):
+    p = r.p
+    target = normalize_angle(heading)
+    dps = pct_to_dps(speed, p["max_dps"])
+    r.right_deg = 0.0
+    limit = r.t + p["max_motion_s"]
+    while True:
+        err = normalize_angle(target - r.heading())
+        steering = int(clamp(-err * gain, -100, 100))
+        cmd_l, cmd_r = steering_split(steering, dps)
+        done = False
+        if distance is not None:
+            if distance > 0:
+                done = abs(r.right_deg) >= distance
+            else:
+                done = r.right_deg <= distance
+        if cond_to_edge and r.out:
+            done = True
+        if done or r.t >= limit:
+            break
+        r.step(cmd_l, cmd_r, 0.01)
+    hit_limit = r.t >= limit
+    r.stop()
+    r.wait(0.1)
+    return hit_limit
+
+
+def _gyro_turn(r, heading, speed):
+    target = normalize_angle(heading)
+    MIN_SPD = 10
+    MAX_SPD = abs(speed) * r.p["turn_speed_scale"]
+    DECAY = 35
+    limit = r.t + r.p["max_motion_s"]
+    while r.t < limit:
+        err = normalize_angle(target - r.heading())
+        if abs(err) <= 1.0:
+            break
+        turn_dir = -math.copysign(1, err)
+        base = MIN_SPD + (MAX_SPD - MIN_SPD) * (1 - math.exp(-abs(err) / DECAY))
+        dps = pct_to_dps(clamp(base, MIN_SPD, MAX_SPD), r.p["max_dps"])
+        cmd_l, cmd_r = steering_split(int(turn_dir * 100), dps)
+        r.step(cmd_l, cmd_r, 0.02)
+    hit_limit = r.t >= limit
+    r.stop()
+    r.wait(0.1)
+    r.traj.turn_errors.append(normalize_angle(target - r.yaw()))
+    return hit_limit
+
+
+def _drive_for_degrees(r, cmd_l, cmd_r, degrees):
+    # blocking motor_pair move until the faster wheel has turned |degrees|
+    travelled = 0.0
+    limit = r.t + r.p["max_motion_s"]
+    while travelled < abs(degrees) and r.t < limit and (cmd_l or cmd_r):
+        travelled += max(abs(r.vl), abs(r.vr)) * 0.01
+        r.step(cmd_l, cmd_r, 0.01)
+    r.stop()
+
+
+def simulate(program, indices=None, **params):
+    """Simulate instructions *indices* (default: all) of *program*."""
+    p = dict(DEFAULTS)
+    p.update(params)
+    traj = Trajectory()
+    r = _Robot(p, traj)
+    r.sample(force=True)
+    warn = traj.warnings.append
+    get = program.get
+    if indices is None:
+        indices = range(len(program))
+
+    for i in indices:
+        r.idx = i
+        typ = program.type(i)
+        where = f"line {program.lineno[i]}"
+        was_out = r.out
+        if typ == "gyro_follow":
+            heading = get(i, "heading")
+            if heading is None:
+                warn(f"{where}: gyro_follow heading unknown; skipped")
+                continue
+            distance = get(i, "distance_deg")
+            cond = get(i, "condition")
+            if distance is None and cond is None:
+                warn(f"{where}: gyro_follow without distance or condition; skipped")
+                continue
+            if distance is None:
+                warn(f"{where}: condition '{cond}' simulated as drive to board edge")
+            hit = _gyro_follow(
+                r,
+                heading,
+                get(i, "gain", 0.2),
+                get(i, "speed", 30),
+                distance,
+                distance is None,
+            )
+            if hit:
+                warn(f"{where}: gyro_follow did not finish within {p['max_motion_s']}s")
+        elif typ == "gyro_turn":
+            heading = get(i, "heading")
+            if heading is None:
+                warn(f"{where}: gyro_turn heading unknown; skipped")
+                continue
+            if _gyro_turn(r, heading, get(i, "speed", 20)):
+                warn(f"{where}: gyro_turn did not settle within {p['max_motion_s']}s")
+        elif typ == "line_follow":
+            distance = get(i, "distance_deg")
+            if distance is None:
+                warn(f"{where}: line_follow without distance; skipped")
+                continue
+            warn(f"{where}: line_follow simulated as a straight drive")
+            _gyro_follow(r, r.yaw(), 0.0, get(i, "speed", 30), distance, False)
+        elif typ == "motor_pair_move_for_degrees":
+            degrees = get(i, "degrees")
+            if degrees is not None:
+                dps = abs(get(i, "speed", 360)) * math.copysign(1, degrees)
+                cmd_l, cmd_r = steering_split(get(i, "steering", 0), dps)
+                _drive_for_degrees(r, cmd_l, cmd_r, degrees)
+        elif typ == "motor_pair_move_tank_for_degrees":
+            degrees = get(i, "degrees")
+            if degrees is not None:
+                cmd_l = get(i, "left_speed", 0.0)
+                cmd_r = get(i, "right_speed", 0.0)
+                _drive_for_degrees(r, cmd_l, cmd_r, degrees)
+        elif typ == "motor_pair_move_for_time":
+            dur = get(i, "duration_ms")
+            if dur is not None:
+                cmd_l, cmd_r = steering_split(
+                    get(i, "steering", 0), get(i, "speed", 360)
+                )
+                end = r.t + dur / 1000.0
+                while r.t < end:
+                    r.step(cmd_l, cmd_r, min(0.01, end - r.t))
+                r.stop()
+        elif typ == "sleep":
+            dur = get(i, "duration_ms")
+            if dur is None:
+                warn(f"{where}: sleep duration unknown; skipped")
+            else:
+                r.wait(dur / 1000.0)
+        elif typ == "reset_yaw":
+            r.yaw_zero = r.h - float(get(i, "heading", 0.0))
+        elif typ in ("motor_run_for_degrees", "motor_run_for_time", "motor_run_to_rel"):
+            if get(i, "port") in DRIVE_PORTS:
+                warn(f"{where}: single drive-motor move not simulated")
+            # other ports: actuators, non-blocking on the hub
+        if r.out and not was_out:
+            warn(f"{where}: robot left the board")
+    r.sample(force=True)
+    return traj
+
+
+def split_revision(spec):
+    """Split "file@rev" into ("file", "rev"); a plain existing path gives (path, None)."""
+    if "@" in spec and not Path(spec).exists():
+        path, rev = spec.rsplit("@", 1)
+        if path and rev:
+            return path, rev
+    return spec, None
+
+
+def git_show(path, rev):
+    """Contents of *path* at git revision *rev* (bytes)."""
+    p = Path(path)
+    try:
+        return subprocess.run(
+            ["git", "-C", str(p.parent), "show", f"{rev}:./{p.name}"],
+            check=True,
+            capture_output=True,
+        ).stdout
+    except FileNotFoundError:
+        raise RuntimeError("git is not installed") from None
+    except subprocess.CalledProcessError as e:
+        msg = e.stderr.decode("utf-8", "replace").strip()
+        raise RuntimeError(f"git show {rev}:{path}: {msg}") from None
+
+
+def load_program(path, **parse_kw):
+    """Program from a .spir file or by parsing a mission source file.
+
+    *path* may name a git revision of the file as "file@rev"
+    (e.g. working_spike.py@HEAD~1).
+    """
+    path, rev = split_revision(str(path))
+    if rev is None:
+        if is_program_file(path):
+            return Program.load(path)
+        from spike_to_pygame import parse_spike_file
+
+        return Program.from_instructions(parse_spike_file(path, **parse_kw))
+    data = git_show(path, rev)
+    if data[: len(MAGIC)] == MAGIC:
+        return Program.from_buffer(data)
+    from spike_to_pygame import parse_spike_source
+
+    src = data.decode("utf-8")
+    return Program.from_instructions(
+        parse_spike_source(src, f"{path}@{rev}", **parse_kw)
+    )
+
+
+def first_divergence(a, b, tol_mm, step=None):
+    """First time (s) at which trajectories *a* and *b* are more than
+    *tol_mm* apart, or None if they stay within it."""
+    if not len(a) or not len(b):
+        return None
+    step = step or DEFAULTS["sample_ms"] / 1000.0
+    end = max(a.duration, b.duration)
+    tol2 = tol_mm * tol_mm
+    n = int(end / step) + 1
+    for k in range(n + 1):
+        t = min(k * step, end)
+        ax, ay, _, _ = a.pose_at(t)
+        bx, by, _, _ = b.pose_at(t)
+        if (ax - bx) ** 2 + (ay - by) ** 2 > tol2:
+            return t
+    return None
+
+
+def predict_report(program, names, sim):
+    """Print run time and worst settled turn error per mission, as written
+    versus with predicted yaw and faster turns."""
+    base = dict(sim, predict=False, turn_speed_scale=1.0)
+    fast = dict(sim, predict=True)
+    missions = program.missions()
+    total = [0.0, 0.0]
+    print(
+        f"lag {sim['lag_ms']:g} ms; as written -> predict,"
+        f" turns x{sim['turn_speed_scale']:g}"
+    )
+    for name in names:
+        runs = [simulate(program, missions[name], **p) for p in (base, fast)]
+        worst = [max((abs(e) for e in tr.turn_errors), default=0.0) for tr in runs]
+        total[0] += runs[0].duration
+        total[1] += runs[1].duration
+        print(
+            f"{name}: {runs[0].duration:.2f}s -> {runs[1].duration:.2f}s"
+            f" ({runs[1].duration - runs[0].duration:+.2f}s),"
+            f" worst turn error {worst[0]:.1f} -> {worst[1]:.1f} deg"
+        )
+    print(f"total: {total[0]:.2f}s -> {total[1]:.2f}s ({total[1] - total[0]:+.2f}s)")
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("spike_file", help="mission source or .spir file")
+    p.add_argument("mission", nargs="?", default=None, help="mission (default: all)")
+    p.add_argument("--wheel-radius", type=float, default=DEFAULTS["wheel_radius_mm"])
+    p.add_argument("--wheel-base", type=float, default=DEFAULTS["wheel_base_mm"])
+    p.add_argument(
+        "--compare",
+        default=None,
+        help="second source to compare against, e.g. other.py or @HEAD (same file)",
+    )
+    p.add_argument(
+        "--tolerance", type=float, default=20.0, help="divergence tolerance in mm"
+    )
+    p.add_argument(
+        "--lag-ms",
+        type=float,
+        default=DEFAULTS["lag_ms"],
+        help="sensor-to-motor latency to model",
+    )
+    p.add_argument(
+        "--predict", action="store_true", help="steer on predicted yaw (PREDICT)"
+    )
+    p.add_argument(
+        "--turn-speed-scale",
+        type=float,
+        default=DEFAULTS["turn_speed_scale"],
+        help="multiply every gyro_turn speed",
+    )
+    p.add_argument(
+        "--predict-report",
+        action="store_true",
+        help="compare each mission as written against predicted yaw with"
+        " --turn-speed-scale, both at --lag-ms",
+    )
+    args = p.parse_args(argv[1:])
+    sim = {
+        "wheel_radius_mm": args.wheel_radius,
+        "wheel_base_mm": args.wheel_base,
+        "lag_ms": args.lag_ms,
+        "predict": args.predict,
+        "turn_speed_scale": args.turn_speed_scale,
+    }
+
+    program = load_program(args.spike_file, wheel_radius_mm=args.wheel_radius)
+    other = None
+    if args.compare:
+        spec = args.compare
+        if spec.startswith("@"):
+            spec = args.spike_file + spec
+        try:
+            other = load_program(spec, wheel_radius_mm=args.wheel_radius)
+        except RuntimeError as e:
+            print(e)
+            return 1
+    missions = program.missions()
+    names = [args.mission] if args.mission else list(missions)
+    for name in names:
+        if name not in missions:
+            print(f"{name}: no such mission")
+            return 1
+    if args.predict_report:
+        predict_report(program, names, sim)
+        return 0
+    for name in names:
+        traj = simulate(program, missions[name], **sim)
+        x, y, h = traj.final_pose()
+        print(f"{name}: {traj.duration:.2f}s, end ({x:.0f}, {y:.0f}) mm @ {h:.1f} deg")
+        for w in traj.warnings:
+            print(f"    {w}")
+        if other is not None:
+            other_range = other.missions().get(name)
+            if other_range is None:
+                print(f"    {args.compare}: no {name}")
+                continue
+            traj2 = simulate(other, other_range, **sim)
+            t = first_divergence(traj, traj2, args.tolerance)
+            if t is None:
+                print(f"    {args.compare}: within {args.tolerance:g} mm throughout")
+            else:
+                print(
+                    f"    {args.compare}: diverges by > {args.tolerance:g} mm"
+                    f" at {t:.2f}s (line {program.lineno[traj.pose_at(t)[3]]})"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,229 @@
+"""
+Golden-trajectory snapshots: catch missions that quietly moved.
+
+`--update` simulates every mission headlessly (spike_sim.py) and stores a
+reference trajectory per mission, resampled every --step seconds, in a
+compact binary file. A plain run simulates again and compares each mission
+against its reference at the same times, reporting the missions whose path
+moved by more than --tol-mm / --tol-deg, the instruction that was running
+when it first moved, and how the end pose and duration changed. Exit
+status is 1 when anything moved, so it can run from a save hook or CI.
+
+File layout (.snap, little endian):
+
+    header   b"SPSN", u16 version, u16 nmissions, f32 step seconds
+    mission  u16 name length, utf-8 name, u32 nsamples, f32 duration,
+             f32 x[n], f32 y[n], f32 heading[n], u16 instruction[n]
+
+Headings are unwrapped degrees; instruction is the position of the active
+instruction within the mission (0 = first call).
+
+Usage:
+    python spike_snapshot.py working_spike.py --update
+    python spike_snapshot.py working_spike.py
+"""
+
+import argparse
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from spike_sim import DEFAULTS, load_program, simulate
+
+MAGIC = b"SPSN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHf")
+MISSION = struct.Struct("<If")
+
+
+def _le(arr):
+    # arrays are written little endian regardless of the host
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+class Snapshot:
+    """Resampled trajectory of one mission."""
+
+    __slots__ = ("name", "duration", "x", "y", "h", "ins")
+
+    def __init__(self, name, duration, x, y, h, ins):
+        self.name = name
+        self.duration = duration
+        self.x = x
+        self.y = y
+        self.h = h
+        self.ins = ins
+
+    @classmethod
+    def from_trajectory(cls, name, traj, start, step):
+        x, y, h, ins = array("f"), array("f"), array("f"), array("H")
+        n = int(traj.duration / step) + 1
+        for k in range(n + 1):
+            px, py, ph, idx = traj.pose_at(min(k * step, traj.duration))
+            x.append(px)
+            y.append(py)
+            h.append(ph)
+            ins.append(max(0, idx - start))
+        return cls(name, traj.duration, x, y, h, ins)
+
+
+def simulate_all(program, params):
+    """(name, Snapshot) per mission, in program order."""
+    step = params["step"]
+    sim = {k: v for k, v in params.items() if k != "step"}
+    for name, indices in program.missions().items():
+        traj = simulate(program, indices, **sim)
+        yield name, Snapshot.from_trajectory(name, traj, indices.start, step)
+
+
+def save(path, snaps, step):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(snaps), step))
+        for s in snaps:
+            name = s.name.encode("utf-8")
+            f.write(struct.pack("<H", len(name)) + name)
+            f.write(MISSION.pack(len(s.x), s.duration))
+            for col in (s.x, s.y, s.h, s.ins):
+                f.write(_le(col).tobytes())
+
+
+def load(path):
+    """(step, {name: Snapshot})."""
+    data = Path(path).read_bytes()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: not a snapshot file")
+    magic, version, count, step = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a snapshot file")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported snapshot version {version}")
+    off = HEADER.size
+
+    def take(size):
+        nonlocal off
+        if off + size > len(data):
+            raise ValueError(f"{path}: truncated snapshot")
+        chunk = data[off : off + size]
+        off += size
+        return chunk
+
+    snaps = {}
+    for _ in range(count):
+        (n,) = struct.unpack("<H", take(2))
+        name = take(n).decode("utf-8")
+        nsamples, duration = MISSION.unpack(take(MISSION.size))
+        cols = []
+        for typecode in "fffH":
+            col = array(typecode)
+            col.frombytes(take(col.itemsize * nsamples))
+            cols.append(_le(col))
+        snaps[name] = Snapshot(name, duration, *cols)
+    return step, snaps
+
+
+def compare(ref, cur, tol_mm, tol_deg):
+    """None if *cur* stays within tolerance of *ref*, else a dict describing
+    the first sample that moved and the end-pose change."""
+    n = min(len(ref.x), len(cur.x))
+    tol2 = tol_mm * tol_mm
+    first = None
+    worst = 0.0
+    for k in range(n):
+        d2 = (cur.x[k] - ref.x[k]) ** 2 + (cur.y[k] - ref.y[k]) ** 2
+        dh = abs(cur.h[k] - ref.h[k])
+        if d2 > worst:
+            worst = d2
+        if first is None and (d2 > tol2 or dh > tol_deg):
+            first = k
+    end_mm = ((cur.x[-1] - ref.x[-1]) ** 2 + (cur.y[-1] - ref.y[-1]) ** 2) ** 0.5
+    end_deg = cur.h[-1] - ref.h[-1]
+    if first is None and (end_mm > tol_mm or abs(end_deg) > tol_deg):
+        # same path as far as both go, but one run continues elsewhere
+        first = n - 1
+    if first is None:
+        return None
+    return {
+        "sample": first,
+        "ref_instruction": ref.ins[first],
+        "cur_instruction": cur.ins[first],
+        "max_mm": worst**0.5,
+        "end_mm": end_mm,
+        "end_deg": end_deg,
+        "duration_s": cur.duration - ref.duration,
+    }
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("spike_file", help="mission source or .spir file")
+    p.add_argument(
+        "--snapshot",
+        default=None,
+        help="snapshot file (default: <spike_file stem>.snap next to it)",
+    )
+    p.add_argument("--update", action="store_true", help="(re)write the snapshot")
+    p.add_argument("--step", type=float, default=0.1, help="sample period (s)")
+    p.add_argument("--tol-mm", type=float, default=5.0)
+    p.add_argument("--tol-deg", type=float, default=2.0)
+    p.add_argument("--wheel-radius", type=float, default=DEFAULTS["wheel_radius_mm"])
+    p.add_argument("--wheel-base", type=float, default=DEFAULTS["wheel_base_mm"])
+    args = p.parse_args(argv[1:])
+
+    src = Path(args.spike_file)
+    snap_path = Path(args.snapshot) if args.snapshot else src.with_suffix(".snap")
+    program = load_program(src, wheel_radius_mm=args.wheel_radius)
+    params = {
+        "wheel_radius_mm": args.wheel_radius,
+        "wheel_base_mm": args.wheel_base,
+    }
+
+    if args.update or not snap_path.exists():
+        params["step"] = args.step
+        snaps = [s for _, s in simulate_all(program, params)]
+        save(snap_path, snaps, args.step)
+        print(f"Wrote {len(snaps)} mission snapshots to {snap_path.resolve()}")
+        return 0
+
+    step, ref = load(snap_path)
+    params["step"] = step
+    missions = program.missions()
+    moved = 0
+    seen = set()
+    for name, cur in simulate_all(program, params):
+        seen.add(name)
+        old = ref.get(name)
+        if old is None:
+            print(f"{name}: new mission (not in snapshot)")
+            moved += 1
+            continue
+        diff = compare(old, cur, args.tol_mm, args.tol_deg)
+        if diff is None:
+            continue
+        moved += 1
+        i = missions[name].start + diff["cur_instruction"]
+        print(
+            f"{name}: moved from {diff['sample'] * step:.1f}s, during instruction"
+            f" {diff['cur_instruction']} (line {program.lineno[i]},"
+            f" {program.call_name(i)}); was instruction {diff['ref_instruction']}"
+        )
+        print(
+            f"    end pose off by {diff['end_mm']:.1f} mm / {diff['end_deg']:+.1f} deg,"
+            f" max {diff['max_mm']:.1f} mm, duration {diff['duration_s']:+.2f}s"
+        )
+    for name in ref:
+        if name not in seen:
+            print(f"{name}: missing (in snapshot only)")
+            moved += 1
+    if moved:
+        print(f"{moved} of {len(ref)} mission(s) changed; --update to accept")
+        return 1
+    print(f"All {len(ref)} missions within {args.tol_mm:g} mm / {args.tol_deg:g} deg")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
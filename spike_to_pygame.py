@@ -3,6 +3,9 @@ Parse a working_spike.py file and emit a simple instruction list for a pygame si
 
 Usage:
     python spike_to_pygame.py path/to/working_spike.py --out instructions.json
+    python spike_to_pygame.py path/to/working_spike.py --out-bin missions.spir
+    python spike_to_pygame.py path/to/working_spike.py --out x.json --no-window
+    python spike_to_pygame.py missions.spir
 Options:
     --wheel-radius   wheel radius in mm (default 24)
     --wheel-base     wheel base in mm (default 120)
@@ -10,19 +13,41 @@ Options:
 """
 
 import ast
+import functools
 import json
 import math
+import re
 import sys
 from pathlib import Path
 import argparse
-import threading
-
-KNOWN_FUNCS = {
-    "gyro_follow": "gyro_follow",
-    "gyro_turn": "gyro_turn",
-    "motor.run_for_degrees": "motor_run_for_degrees",
-    "motor.run_to_relative_position": "motor_run_to_rel",
-    "motor_pair.move_for_degrees": "motor_pair_move_for_degrees",
+import time
+
+from board_view import (
+    PathLayer,
+    TilePyramid,
+    TrailLayer,
+    Viewport,
+    cached_scaled_board,
+    image_size,
+)
+from spike_ir import Program, is_program_file
+from spike_profile import Profiler, draw_overlay
+from spike_sim import first_divergence, load_program, simulate
+
+STUBS_DIR = Path(__file__).resolve().parent / "spike_stubs"
+STUB_DOC_ELLIPSIS = re.compile(r"(\"{3}|'{3})[ \t]*\.\.\.[ \t]*$", re.M)
+
+# fallback signatures for the mission helpers when a file doesn't define them
+LOCAL_SIGNATURES = {
+    "gyro_follow": (
+        ("heading", "gain", "speed", "distance", "condition"),
+        (),
+    ),
+    "gyro_turn": (("heading", "speed"), ()),
+    "line_follow": (
+        ("speed", "gain", "target", "lineside", "distance", "condition"),
+        (),
+    ),
 }
 
 
@@ -54,140 +79,505 @@ def eval_node(n):
         return None
 
 
-def extract_calls_from_func(func_node):
-    calls = []
-    for node in ast.walk(func_node):
-        if isinstance(node, ast.Call):
-            name = node_name(node.func)
-            if name is None:
-                continue
-            # collect keywords and positional literals
-            kw = {}
-            for k in node.keywords:
-                kw[k.arg] = eval_node(k.value)
-            # also collect simple positional args (by index)
-            pos = [eval_node(a) for a in node.args]
-            calls.append((name, pos, kw, node.lineno))
-    return calls
-
-
-def parse_spike_file(path, wheel_radius_mm=24.0, wheel_base_mm=120.0, pixel_scale=2):
-    src = Path(path).read_text()
-    tree = ast.parse(src, filename=str(path))
+def const_value(n, env):
+    # literal value of n, resolving names bound to literals in env; otherwise None
+    if isinstance(n, ast.Constant):
+        return n.value
+    if isinstance(n, ast.Name):
+        return env.get(n.id)
+    if isinstance(n, ast.UnaryOp) and isinstance(n.op, (ast.USub, ast.UAdd)):
+        v = const_value(n.operand, env)
+        if isinstance(v, (int, float)):
+            return -v if isinstance(n.op, ast.USub) else v
+        return None
+    if isinstance(n, ast.BinOp) and isinstance(
+        n.op, (ast.Add, ast.Sub, ast.Mult, ast.Div)
+    ):
+        a = const_value(n.left, env)
+        b = const_value(n.right, env)
+        if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+            return None
+        try:
+            if isinstance(n.op, ast.Add):
+                return a + b
+            if isinstance(n.op, ast.Sub):
+                return a - b
+            if isinstance(n.op, ast.Mult):
+                return a * b
+            return a / b
+        except ZeroDivisionError:
+            return None
+    return eval_node(n)
+
+
+def literal_env(body, env=None, overrides=None):
+    # names assigned a literal (or literal expression) in a list of statements;
+    # names in overrides take the override value wherever they are assigned
+    env = dict(env or {})
+    for stmt in body:
+        if (
+            isinstance(stmt, ast.Assign)
+            and len(stmt.targets) == 1
+            and isinstance(stmt.targets[0], ast.Name)
+        ):
+            name = stmt.targets[0].id
+            v = const_value(stmt.value, env)
+            if overrides and name in overrides:
+                env[name] = overrides[name]
+            elif isinstance(v, (int, float, str)) and not isinstance(v, bool):
+                env[name] = v
+            else:
+                env.pop(name, None)
+    return env
+
+
+def signature_of(func):
+    # (positional parameter names, keyword-only names) of a FunctionDef
+    a = func.args
+    pos = [x.arg for x in a.posonlyargs + a.args]
+    if pos and pos[0] == "self":
+        pos = pos[1:]
+    return tuple(pos), tuple(x.arg for x in a.kwonlyargs)
+
+
+@functools.lru_cache(maxsize=None)
+def load_stub_signatures(stubs_dir=STUBS_DIR):
+    """Map dotted SPIKE API names (e.g. 'motor.run_for_time',
+    'motion_sensor.reset_yaw') to signatures read from spike_stubs/*.pyi."""
+    sigs = {}
+    for pyi in sorted(Path(stubs_dir).glob("*.pyi")):
+        mod = pyi.stem
+        try:
+            # the stubs end docstrings with a trailing `...`, which Pylance
+            # accepts but ast does not
+            text = STUB_DOC_ELLIPSIS.sub(r"\1", pyi.read_text())
+            tree = ast.parse(text, filename=str(pyi))
+        except (OSError, SyntaxError):
+            continue
+        classes = {}
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
+                sigs[f"{mod}.{node.name}"] = signature_of(node)
+            elif isinstance(node, ast.ClassDef):
+                classes[node.name] = {
+                    m.name: signature_of(m)
+                    for m in node.body
+                    if isinstance(m, ast.FunctionDef)
+                }
+        # module-level instances: `button = _button()` / `sound: _Sound`
+        for node in tree.body:
+            inst = cls = None
+            if (
+                isinstance(node, ast.Assign)
+                and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Call)
+            ):
+                inst, cls = node.targets[0].id, node_name(node.value.func)
+            elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+                inst, cls = node.target.id, node_name(node.annotation)
+            if inst and cls in classes:
+                for meth, sig in classes[cls].items():
+                    # both `from hub import motion_sensor` and `hub.motion_sensor`
+                    sigs[f"{inst}.{meth}"] = sig
+                    sigs[f"{mod}.{inst}.{meth}"] = sig
+    return sigs
+
+
+def bind_args(sig, call):
+    # map a call's positional and keyword arguments onto parameter names
+    bound = {}
+    pos_names = sig[0] if sig else ()
+    extra = []
+    for i, a in enumerate(call.args):
+        if isinstance(a, ast.Starred):
+            break
+        if i < len(pos_names):
+            bound[pos_names[i]] = a
+        else:
+            extra.append(a)
+    for k in call.keywords:
+        if k.arg is not None:
+            bound[k.arg] = k.value
+    return bound, extra
+
+
+def range_count(n):
+    # literal iteration count of `range(N)`, else None
+    if (
+        isinstance(n, ast.Call)
+        and node_name(n.func) == "range"
+        and len(n.args) == 1
+        and not n.keywords
+    ):
+        v = eval_node(n.args[0])
+        if isinstance(v, int) and v >= 0:
+            return v
+    return None
+
+
+class CallCollector(ast.NodeVisitor):
+    """Call statements of a mission body in execution order. Bodies of
+    `for _ in range(N)` are unrolled; calls nested in expressions (argument
+    helpers, lambdas used as conditions) are not separate steps.
+
+    Only one arm of an `if` is followed: the one a constant test selects, else
+    the `if` arm. That guess, and loops whose trip count is unknown (walked
+    once), are recorded in `warnings` as (lineno, message)."""
+
+    def __init__(self, env=None):
+        self.env = env or {}
+        self.calls = []
+        self.warnings = []
+
+    def visit_FunctionDef(self, node):
+        for stmt in node.body:
+            self.visit(stmt)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Expr(self, node):
+        value = node.value
+        if isinstance(value, ast.Await):
+            value = value.value
+        if isinstance(value, ast.Call):
+            self.calls.append(value)
+
+    def visit_If(self, node):
+        truth = const_value(node.test, self.env)
+        if truth is None:
+            if node.orelse:
+                self.warnings.append(
+                    (node.lineno, "if/else with a runtime test: simulating the if arm")
+                )
+            else:
+                self.warnings.append(
+                    (node.lineno, "if with a runtime test: assuming it is taken")
+                )
+            truth = True
+        for stmt in node.body if truth else node.orelse:
+            self.visit(stmt)
+
+    def visit_For(self, node):
+        n = range_count(node.iter)
+        if n is None:
+            self.warnings.append(
+                (node.lineno, "for-loop with an unknown trip count: walked once")
+            )
+            n = 1
+        for _ in range(n):
+            for stmt in node.body:
+                self.visit(stmt)
+
+    def visit_While(self, node):
+        self.warnings.append((node.lineno, "while-loop: walked once"))
+        for stmt in node.body:
+            self.visit(stmt)
+
+    def generic_visit(self, node):
+        # descend through compound statements only
+        for field in ("body", "orelse", "handlers", "finalbody"):
+            for stmt in getattr(node, field, None) or ():
+                self.visit(stmt)
+
+
+def extract_calls_from_func(func_node, env=None, warnings=None):
+    collector = CallCollector(env)
+    collector.visit(func_node)
+    if warnings is not None:
+        warnings.extend(collector.warnings)
+    return collector.calls
+
+
+FUNC_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def is_mission(name):
+    return name.endswith("_main") or name.startswith("Run_")
+
+
+def _mm(deg, ctx):
+    return None if deg is None else deg_to_mm(float(deg), ctx["wheel_radius_mm"])
+
+
+def _src(raw, key):
+    n = raw.get(key)
+    return None if n is None else ast.unparse(n)
+
+
+# ---------------- call handlers ----------------
+# each handler gets the bound argument values (literal or None), the raw
+# argument nodes and the parse context, and returns the instruction fields
+
+
+def handle_gyro_follow(a, raw, ctx):
+    distance_deg = a.get("distance")
+    distance_mm = _mm(distance_deg, ctx)
+    condition = raw.get("condition")
+    if isinstance(condition, ast.Constant) and condition.value is None:
+        condition = None
+    return {
+        "type": "gyro_follow",
+        "heading": a.get("heading"),
+        "gain": a.get("gain"),
+        "speed": a.get("speed"),
+        "distance_deg": distance_deg,
+        "distance_mm": distance_mm,
+        "distance_px": (
+            None if distance_mm is None else distance_mm * float(ctx["pixel_scale"])
+        ),
+        "condition": None if condition is None else ast.unparse(condition),
+    }
+
+
+def handle_gyro_turn(a, raw, ctx):
+    # no "steering": gyro_turn(heading, speed) has none, and the key the old
+    # parser filled from the first positional argument was the heading again
+    return {"type": "gyro_turn", "heading": a.get("heading"), "speed": a.get("speed")}
+
+
+def handle_line_follow(a, raw, ctx):
+    return {
+        "type": "line_follow",
+        "speed": a.get("speed"),
+        "gain": a.get("gain"),
+        "distance_deg": a.get("distance"),
+        "distance_mm": _mm(a.get("distance"), ctx),
+        "condition": _src(raw, "condition"),
+    }
+
+
+def handle_motor_run_for_degrees(a, raw, ctx):
+    return {
+        "type": "motor_run_for_degrees",
+        "port": _src(raw, "port"),
+        "degrees": a.get("degrees"),
+        "mm": _mm(a.get("degrees"), ctx),
+        "speed": a.get("velocity"),
+    }
+
+
+def handle_motor_run_for_time(a, raw, ctx):
+    return {
+        "type": "motor_run_for_time",
+        "port": _src(raw, "port"),
+        "duration_ms": a.get("duration"),
+        "speed": a.get("velocity"),
+    }
+
+
+def handle_motor_run_to_rel(a, raw, ctx):
+    return {
+        "type": "motor_run_to_rel",
+        "port": _src(raw, "port"),
+        "position_deg": a.get("position"),
+        "position_mm": _mm(a.get("position"), ctx),
+        "speed": a.get("velocity"),
+    }
+
+
+def handle_motor_run_to_abs(a, raw, ctx):
+    return {
+        "type": "motor_run_to_abs",
+        "port": _src(raw, "port"),
+        "position_deg": a.get("position"),
+        "speed": a.get("velocity"),
+    }
+
+
+def handle_motor_pair_move_for_degrees(a, raw, ctx):
+    return {
+        "type": "motor_pair_move_for_degrees",
+        "steering": a.get("steering"),
+        "degrees": a.get("degrees"),
+        "mm": _mm(a.get("degrees"), ctx),
+        "speed": a.get("velocity"),
+    }
+
+
+def handle_motor_pair_move_for_time(a, raw, ctx):
+    return {
+        "type": "motor_pair_move_for_time",
+        "steering": a.get("steering"),
+        "duration_ms": a.get("duration"),
+        "speed": a.get("velocity"),
+    }
+
+
+def handle_motor_pair_move_tank_for_degrees(a, raw, ctx):
+    return {
+        "type": "motor_pair_move_tank_for_degrees",
+        "degrees": a.get("degrees"),
+        "mm": _mm(a.get("degrees"), ctx),
+        "left_speed": a.get("left_velocity"),
+        "right_speed": a.get("right_velocity"),
+    }
+
+
+def handle_sleep_ms(a, raw, ctx):
+    return {"type": "sleep", "duration_ms": a.get("ms")}
+
+
+def handle_sleep(a, raw, ctx):
+    secs = a.get("seconds")
+    return {
+        "type": "sleep",
+        "duration_ms": None if secs is None else float(secs) * 1000.0,
+    }
+
+
+def handle_reset_yaw(a, raw, ctx):
+    return {"type": "reset_yaw", "heading": a.get("angle")}
+
+
+HANDLERS = {
+    "gyro_follow": handle_gyro_follow,
+    "gyro_turn": handle_gyro_turn,
+    "line_follow": handle_line_follow,
+    "motor.run_for_degrees": handle_motor_run_for_degrees,
+    "motor.run_for_time": handle_motor_run_for_time,
+    "motor.run_to_relative_position": handle_motor_run_to_rel,
+    "motor.run_to_absolute_position": handle_motor_run_to_abs,
+    "motor_pair.move_for_degrees": handle_motor_pair_move_for_degrees,
+    "motor_pair.move_for_time": handle_motor_pair_move_for_time,
+    "motor_pair.move_tank_for_degrees": handle_motor_pair_move_tank_for_degrees,
+    "utime.sleep_ms": handle_sleep_ms,
+    "utime.sleep": handle_sleep,
+    "time.sleep_ms": handle_sleep_ms,
+    "time.sleep": handle_sleep,
+    "idle_ms": handle_sleep_ms,  # working_spike.py: sleep that collects garbage first
+    "motion_sensor.reset_yaw": handle_reset_yaw,
+    "hub.motion_sensor.reset_yaw": handle_reset_yaw,
+}
+
+
+def parse_spike_file(
+    path, wheel_radius_mm=24.0, wheel_base_mm=120.0, pixel_scale=2, warnings=None
+):
+    return parse_spike_source(
+        Path(path).read_text(),
+        str(path),
+        wheel_radius_mm,
+        wheel_base_mm,
+        pixel_scale,
+        warnings=warnings,
+    )
+
+
+def check_overrides(tree, overrides, filename):
+    """ValueError unless every override names a constant assigned a literal at
+    module level or in a mission body (a misspelt name would change nothing)."""
+    known = set(literal_env(tree.body))
+    module_env = literal_env(tree.body)
+    for node in tree.body:
+        if isinstance(node, FUNC_DEFS) and is_mission(node.name):
+            known |= set(literal_env(node.body, module_env))
+    unknown = sorted(set(overrides) - known)
+    if unknown:
+        raise ValueError(
+            f"{filename}: no literal assignment to override: {', '.join(unknown)}"
+        )
+
+
+def parse_spike_source(
+    src,
+    filename="<string>",
+    wheel_radius_mm=24.0,
+    wheel_base_mm=120.0,
+    pixel_scale=2,
+    overrides=None,
+    warnings=None,
+):
+    # overrides: {name: value} replacing literal constants assigned in the file
+    # warnings: optional list collecting "file:line: message" for guessed control flow
+    tree = ast.parse(src, filename=filename)
+    ctx = {"wheel_radius_mm": wheel_radius_mm, "pixel_scale": pixel_scale}
+    sigs = dict(LOCAL_SIGNATURES)
+    sigs.update(load_stub_signatures())
+    for node in tree.body:
+        if isinstance(node, FUNC_DEFS):
+            sigs[node.name] = signature_of(node)
+    module_env = literal_env(tree.body, overrides=overrides)
+    if overrides:
+        check_overrides(tree, overrides, filename)
+
     instructions = []
     for node in tree.body:
-        if isinstance(node, ast.FunctionDef) and node.name.endswith("_main"):
-            calls = extract_calls_from_func(node)
-            for name, pos, kw, lineno in calls:
-                entry = {"source_func": node.name, "lineno": lineno, "call": name}
-                if name.endswith("gyro_follow") or name == "gyro_follow":
-                    heading = kw.get("heading", pos[0] if len(pos) > 0 else None)
-                    gain = kw.get("gain", None)
-                    speed = kw.get("speed", None)
-                    distance_deg = kw.get("distance", None)
-                    condition = kw.get("condition", None)
-                    distance_mm = None
-                    pix = None
-                    if distance_deg is not None:
-                        distance_mm = deg_to_mm(float(distance_deg), wheel_radius_mm)
-                        pix = distance_mm * float(pixel_scale)
-                    entry.update(
-                        {
-                            "type": "gyro_follow",
-                            "heading": heading,
-                            "gain": gain,
-                            "speed": speed,
-                            "distance_deg": distance_deg,
-                            "distance_mm": distance_mm,
-                            "distance_px": pix,
-                            "condition": None if condition is None else str(condition),
-                        }
-                    )
-                elif name.endswith("gyro_turn") or name == "gyro_turn":
-                    steering = kw.get("steering", pos[0] if len(pos) > 0 else None)
-                    heading = kw.get("heading", None)
-                    speed = kw.get("speed", None)
-                    entry.update(
-                        {
-                            "type": "gyro_turn",
-                            "steering": steering,
-                            "heading": heading,
-                            "speed": speed,
-                        }
-                    )
-                elif name.endswith("run_for_degrees") or name.endswith(
-                    "run_for_degrees"
-                ):
-                    # motor.run_for_degrees(port, degrees, speed)
-                    degrees = None
-                    port = None
-                    speed = None
-                    if len(pos) >= 2:
-                        port = pos[0]
-                        degrees = pos[1]
-                    if len(pos) >= 3:
-                        speed = pos[2]
-                    # also check keywords
-                    degrees = kw.get("degrees", degrees)
-                    speed = kw.get("speed", speed)
-                    entry.update(
-                        {
-                            "type": "motor_run_for_degrees",
-                            "port": port,
-                            "degrees": degrees,
-                            "mm": (
-                                None
-                                if degrees is None
-                                else deg_to_mm(float(degrees), wheel_radius_mm)
-                            ),
-                            "speed": speed,
-                        }
-                    )
-                elif name.endswith("run_to_relative_position"):
-                    port = pos[0] if len(pos) >= 1 else None
-                    position = pos[1] if len(pos) >= 2 else None
-                    if "position" in kw:
-                        position = kw["position"]
-                    entry.update(
-                        {
-                            "type": "motor_run_to_rel",
-                            "port": port,
-                            "position_deg": position,
-                            "position_mm": (
-                                None
-                                if position is None
-                                else deg_to_mm(float(position), wheel_radius_mm)
-                            ),
-                        }
-                    )
-                elif name.endswith("move_for_degrees"):
-                    # motor_pair.move_for_degrees(pair, steering, degrees)
-                    steering = None
-                    degrees = None
-                    if len(pos) >= 2:
-                        steering = pos[0]
-                        degrees = pos[1]
-                    steering = kw.get("steering", steering)
-                    degrees = kw.get("degrees", degrees)
+        if isinstance(node, FUNC_DEFS) and is_mission(node.name):
+            env = literal_env(node.body, module_env, overrides)
+            guessed = []
+            calls = extract_calls_from_func(node, env, guessed)
+            if warnings is not None:
+                warnings.extend(f"{filename}:{ln}: {msg}" for ln, msg in guessed)
+            for call in calls:
+                name = node_name(call.func)
+                if name is None:
+                    continue
+                entry = {"source_func": node.name, "lineno": call.lineno, "call": name}
+                handler = HANDLERS.get(name)
+                if handler is None:
+                    # unknown call -- record name and raw args
                     entry.update(
                         {
-                            "type": "motor_pair_move_for_degrees",
-                            "steering": steering,
-                            "degrees": degrees,
-                            "mm": (
-                                None
-                                if degrees is None
-                                else deg_to_mm(float(degrees), wheel_radius_mm)
-                            ),
+                            "type": "call",
+                            "args_pos": [eval_node(a) for a in call.args],
+                            "args_kw": {
+                                k.arg: eval_node(k.value) for k in call.keywords
+                            },
                         }
                     )
                 else:
-                    # unknown call -- record name and raw args
-                    entry.update({"type": "call", "args_pos": pos, "args_kw": kw})
+                    raw, _extra = bind_args(sigs.get(name), call)
+                    values = {k: const_value(v, env) for k, v in raw.items()}
+                    entry.update(handler(values, raw, ctx))
                 instructions.append(entry)
     return instructions
 
 
+def draw_robot(screen, center, heading, render_scale, color=(173, 216, 230)):
+    """Robot as a rotated rectangle, light blue by default (robot-centric orientation)."""
+    import pygame
+
+    ROBOT_SCALE = 0.75
+    ui_scale = max(1.0, 1.0 / max(render_scale, 0.2))
+    rect_w = max(8, int(32 * ROBOT_SCALE * ui_scale))
+    rect_h = max(6, int(20 * ROBOT_SCALE * ui_scale))
+    robot_surf = pygame.Surface((rect_w, rect_h), pygame.SRCALPHA)
+    robot_surf.fill(color)
+    # draw a darker nose marker
+    pygame.draw.rect(
+        robot_surf,
+        tuple(int(c * 0.7) for c in color),
+        (
+            rect_w - max(4, int(6 * ROBOT_SCALE)),
+            0,
+            max(4, int(6 * ROBOT_SCALE)),
+            rect_h,
+        ),
+    )
+    rot_surf = pygame.transform.rotate(robot_surf, -heading)
+    rs_rect = rot_surf.get_rect(center=center)
+    screen.blit(rot_surf, rs_rect.topleft)
+
+
+def draw_panel(screen, font, button_rects, stop_rect, status_text, layout):
+    """Mission buttons, Stop button and status line right of the board."""
+    import pygame
+
+    x0, bw, width, height, pad = layout
+    # draw buttons panel directly adjacent to the board (no extra gap)
+    pygame.draw.rect(screen, (220, 220, 220), (x0, 0, bw, height))
+    for rect, name in button_rects:
+        pygame.draw.rect(screen, (200, 200, 200), rect)
+        txt = font.render(name, True, (0, 0, 0))
+        screen.blit(txt, (rect.x + 6, rect.y + 6))
+    pygame.draw.rect(screen, (200, 80, 80), stop_rect)
+    stop_txt = font.render("Stop", True, (255, 255, 255))
+    screen.blit(stop_txt, (stop_rect.x + 8, stop_rect.y + 8))
+
+    status_surf = font.render(status_text, True, (0, 0, 0))
+    screen.blit(status_surf, (width - bw - pad + 6, height - 24))
+
+
 def main(argv):
     p = argparse.ArgumentParser()
     p.add_argument(
@@ -227,28 +617,98 @@ def main(argv):
     p.add_argument(
         "--out", default=None, help="optional: write instructions JSON to this file"
     )
+    p.add_argument(
+        "--profile-out",
+        default=None,
+        help="optional: write a Chrome trace (JSON) of frame spans to this file",
+    )
+    p.add_argument(
+        "--compare",
+        action="append",
+        default=[],
+        metavar="SOURCE",
+        help="another mission source to run alongside (repeatable); file.py,"
+        " file.spir, file.py@REV, or @REV for spike_file at a git revision",
+    )
+    p.add_argument(
+        "--diverge-mm",
+        type=float,
+        default=20.0,
+        help="report when a compared robot is further than this from the first",
+    )
+    p.add_argument(
+        "--no-window",
+        action="store_true",
+        help="parse (and write --out/--out-bin) only; don't import pygame or open a window",
+    )
+    p.add_argument(
+        "--board-cache",
+        default=str(Path(__file__).resolve().parent / ".board_cache"),
+        help="directory for the cached fit-to-window board image",
+    )
+    p.add_argument(
+        "--out-bin",
+        default=None,
+        help="optional: write instructions in the binary .spir format to this file",
+    )
     args = p.parse_args(argv[1:])
 
     if args.spike_file == "working_spike.py":
         print("No spike_file provided — defaulting to ./working_spike.py")
 
-    instr = parse_spike_file(
-        args.spike_file,
-        wheel_radius_mm=args.wheel_radius,
-        wheel_base_mm=args.wheel_base,
-        pixel_scale=args.pixel_scale,
-    )
+    if is_program_file(args.spike_file):
+        program = Program.load(args.spike_file)
+        instr = None
+    else:
+        warnings = []
+        instr = parse_spike_file(
+            args.spike_file,
+            wheel_radius_mm=args.wheel_radius,
+            wheel_base_mm=args.wheel_base,
+            pixel_scale=args.pixel_scale,
+            warnings=warnings,
+        )
+        for w in warnings:
+            print(f"warning: {w}")
+        program = Program.from_instructions(instr)
 
     # optional: still write instructions json if requested
     if args.out:
+        if instr is None:
+            instr = program.to_instructions(pixel_scale=args.pixel_scale)
         outp = Path(args.out)
         outp.write_text(json.dumps(instr, indent=2))
         print(f"Wrote {len(instr)} instructions to {outp.resolve()}")
+    if args.out_bin:
+        outp = Path(args.out_bin)
+        program.save(outp)
+        print(f"Wrote {len(program)} instructions to {outp.resolve()}")
 
-    # Group instructions by source function (each *_main)
-    mains = {}
-    for e in instr:
-        mains.setdefault(e["source_func"], []).append(e)
+    # instruction index ranges by source function (each mission)
+    mains = program.missions()
+
+    # extra robots for side-by-side comparison, matched to missions by name
+    programs = [program]
+    labels = [args.spike_file]
+    for spec in args.compare:
+        if spec.startswith("@"):
+            spec = args.spike_file + spec
+        try:
+            programs.append(
+                load_program(
+                    spec,
+                    wheel_radius_mm=args.wheel_radius,
+                    wheel_base_mm=args.wheel_base,
+                    pixel_scale=args.pixel_scale,
+                )
+            )
+        except (OSError, SyntaxError, RuntimeError, ValueError) as e:
+            print(f"Cannot load {spec}: {e}")
+            return 1
+        labels.append(spec)
+
+    if args.no_window:
+        return 0
 
     # Try to import pygame
     try:
@@ -257,7 +717,9 @@ def main(argv):
         print("pygame not available:", e)
         return 1
 
-    pygame.init()
+    # only what the window needs (pygame.init() would also start audio, joystick, ...)
+    pygame.display.init()
+    pygame.font.init()
     font = pygame.font.SysFont(None, 18)
     clock = pygame.time.Clock()
 
@@ -270,11 +732,16 @@ def main(argv):
     board_img = None
     board_rect_virtual = None
     board_rect_display = None
-    board_img_display = None
+    pyramid = None
     if args.board_image:
         try:
-            img = pygame.image.load(args.board_image)
-            iw, ih = img.get_size()
+            board_path = args.board_image
+            # PNG sizes come from the header; the full image is decoded only on a
+            # board cache miss or when zooming in
+            size = image_size(board_path)
+            if size is None:
+                size = pygame.image.load(board_path).get_size()
+            iw, ih = size
             if iw == 0 or ih == 0:
                 raise Exception("invalid image size")
 
@@ -308,9 +775,14 @@ def main(argv):
             screen = pygame.display.set_mode((window_w, window_h))
             pygame.display.set_caption("Spike -> Pygame FLL Sim")
 
-            # prepare images/rects
-            board_img_display = pygame.transform.smoothscale(
-                img, (display_w, display_h)
+            board_fit, _hit = cached_scaled_board(
+                board_path, (display_w, display_h), args.board_cache
+            )
+            # tiles are cut from (downscaled copies of) the source image on demand
+            pyramid = TilePyramid(
+                lambda: pygame.image.load(board_path).convert(),
+                (iw, ih),
+                image_scale=virt_scale,
             )
             board_rect_display = pygame.Rect(0, 0, display_w, display_h)
             board_rect_virtual = pygame.Rect(0, 0, virt_w, virt_h)
@@ -328,7 +800,6 @@ def main(argv):
                 0, 0, args.width - panel_width - pad, args.height
             )
             board_rect_display = board_rect_virtual.copy()
-            board_img_display = None
             render_scale = 1.0
     else:
         screen = pygame.display.set_mode((args.width, args.height))
@@ -337,10 +808,18 @@ def main(argv):
             0, 0, args.width - panel_width - pad, args.height
         )
         board_rect_display = board_rect_virtual.copy()
-        board_img_display = None
         render_scale = 1.0
 
-    # simulation state (include status so run thread and UI share it)
+    # mouse wheel zooms about the cursor, right/middle drag pans, Home resets
+    view = Viewport(
+        board_rect_display,
+        board_rect_virtual.width,
+        board_rect_virtual.height,
+        render_scale,
+    )
+    panning = False
+
+    # simulation state of the primary robot (manual control moves it too)
     robot = {
         "x": float(args.robot_x),
         "y": float(args.robot_y),
@@ -354,131 +833,55 @@ def main(argv):
     # keyboard/manual control state
     control = {"forward": False, "back": False, "left": False, "right": False}
 
-    sim_lock = threading.Lock()
-    running_instr_thread = None
-    stop_flag = threading.Event()
-
-    # helper: convert deg/sec wheel speed to mm/sec linear speed (approx)
-    def wheel_deg_s_to_linear_mm_s(deg_s):
-        return deg_to_mm(deg_s, args.wheel_radius)
-
-    # animator for a list of instructions
-    def run_instructions(instr_list):
-        stop_flag.clear()
-        for e in instr_list:
-            if stop_flag.is_set():
-                break
-            typ = e.get("type")
-            if typ == "gyro_turn":
-                target = e.get("heading")
-                if target is None:
-                    continue
-                # animate rotation
-                speed_deg_s = e.get("speed") or 90.0  # default rotation speed deg/s
-                # if negative speed used in code, take magnitude; apply global & run multipliers
-                rot_speed = (
-                    abs(float(speed_deg_s))
-                    * float(args.speed_scale)
-                    * float(args.run_speed_mult)
-                )
-                while True:
-                    if stop_flag.is_set():
-                        break
-                    with sim_lock:
-                        cur = robot["heading"]
-                    err = (float(target) - float(cur) + 180) % 360 - 180
-                    if abs(err) <= 1.0:
-                        with sim_lock:
-                            robot["heading"] = float(target)
-                        break
-                    step = math.copysign(min(abs(err), rot_speed / 30.0), err)
-                    with sim_lock:
-                        robot["heading"] = (robot["heading"] + step) % 360
-                    clock.tick(60)
-            elif typ == "gyro_follow":
-                dist_mm = e.get("distance_mm") or 0.0
-                if dist_mm == 0.0:
-                    continue
-                speed_deg_s = e.get("speed")
-                if speed_deg_s:
-                    v_mm_s = wheel_deg_s_to_linear_mm_s(float(speed_deg_s))
-                    # apply global speed scaling
-                    v_mm_s *= float(args.speed_scale) * float(args.run_speed_mult)
-                    if v_mm_s <= 0:
-                        v_mm_s = (
-                            50.0 * float(args.speed_scale) * float(args.run_speed_mult)
-                        )
-                else:
-                    v_mm_s = 50.0 * float(args.speed_scale) * float(args.run_speed_mult)
-                duration = abs(float(dist_mm)) / v_mm_s if v_mm_s > 0 else 0.0
-                steps = max(1, int(duration * 60))
-                dx_mm = float(dist_mm) / steps
-                for _ in range(steps):
-                    if stop_flag.is_set():
-                        break
-                    with sim_lock:
-                        rad = math.radians(robot["heading"])
-                        robot["x"] += dx_mm * args.pixel_scale * math.cos(rad)
-                        robot["y"] += dx_mm * args.pixel_scale * math.sin(rad)
-                        # Check bounds and stop if we leave the virtual board area
-                        if (
-                            robot["x"] < board_rect_virtual.left
-                            or robot["x"] > board_rect_virtual.right
-                            or robot["y"] < board_rect_virtual.top
-                            or robot["y"] > board_rect_virtual.bottom
-                        ):
-                            # clamp to virtual board edge, set status and request stop
-                            robot["x"] = max(
-                                board_rect_virtual.left,
-                                min(robot["x"], board_rect_virtual.right),
-                            )
-                            robot["y"] = max(
-                                board_rect_virtual.top,
-                                min(robot["y"], board_rect_virtual.bottom),
-                            )
-                            robot["status"] = "Out of bounds"
-                            stop_flag.set()
-                            break
-                    clock.tick(60)
-            elif typ == "motor_run_for_degrees" or typ == "motor_pair_move_for_degrees":
-                degrees = e.get("degrees") or 0.0
-                mm = e.get("mm") or 0.0
-                # move forward by mm (simple)
-                dist_mm = float(mm)
-                # use default speed
-                v_mm_s = 50.0 * float(args.speed_scale) * float(args.run_speed_mult)
-                duration = abs(dist_mm) / v_mm_s if v_mm_s > 0 else 0.0
-                steps = max(1, int(duration * 60))
-                dx_mm = float(dist_mm) / steps
-                for _ in range(steps):
-                    if stop_flag.is_set():
-                        break
-                    with sim_lock:
-                        rad = math.radians(robot["heading"])
-                        robot["x"] += dx_mm * args.pixel_scale * math.cos(rad)
-                        robot["y"] += dx_mm * args.pixel_scale * math.sin(rad)
-                        if (
-                            robot["x"] < board_rect_virtual.left
-                            or robot["x"] > board_rect_virtual.right
-                            or robot["y"] < board_rect_virtual.top
-                            or robot["y"] > board_rect_virtual.bottom
-                        ):
-                            robot["x"] = max(
-                                board_rect_virtual.left,
-                                min(robot["x"], board_rect_virtual.right),
-                            )
-                            robot["y"] = max(
-                                board_rect_virtual.top,
-                                min(robot["y"], board_rect_virtual.bottom),
-                            )
-                            robot["status"] = "Out of bounds"
-                            stop_flag.set()
-                            break
-                    clock.tick(60)
-            else:
-                # unknown: skip
+    # mission playback: trajectories of every robot are simulated up front and
+    # looked up by time each frame (one pose_at() per robot, no threads)
+    playback = None
+    time_scale = float(args.speed_scale) * float(args.run_speed_mult)
+
+    def simulate_from_robot(prog, indices):
+        ps = float(args.pixel_scale)
+        return simulate(
+            prog,
+            indices,
+            wheel_radius_mm=args.wheel_radius,
+            wheel_base_mm=args.wheel_base,
+            start_x_mm=robot["x"] / ps,
+            start_y_mm=robot["y"] / ps,
+            start_heading=robot["heading"],
+            board_w_mm=board_rect_virtual.width / ps,
+            board_h_mm=board_rect_virtual.height / ps,
+        )
+
+    def start_playback(name):
+        trajs = []
+        for prog in programs:
+            indices = prog.missions().get(name)
+            trajs.append(
+                None if indices is None else simulate_from_robot(prog, indices)
+            )
+        note = None
+        for label, traj in zip(labels[1:], trajs[1:]):
+            if traj is None:
+                print(f"{name}: {label} has no such mission")
                 continue
-        return
+            t = first_divergence(trajs[0], traj, args.diverge_mm)
+            if t is None:
+                print(f"{name}: {label} within {args.diverge_mm:g} mm throughout")
+            else:
+                line = program.lineno[trajs[0].pose_at(t)[3]]
+                print(
+                    f"{name}: {label} diverges by > {args.diverge_mm:g} mm"
+                    f" at {t:.2f}s (line {line})"
+                )
+                note = note or f"{name}: diverges at {t:.1f}s"
+        robot["status"] = f"Running {name}"
+        return {
+            "name": name,
+            "note": note,
+            "trajs": trajs,
+            "end": max(tr.duration for tr in trajs if tr is not None),
+            "t0": time.perf_counter(),
+        }
 
     # build UI buttons for each main
     button_rects = []
@@ -493,154 +896,218 @@ def main(argv):
 
     stop_rect = pygame.Rect(x0, args.height - 50, bw, 34)
 
-    while True:
-        # event handling (mouse/buttons + keyboard)
-        for ev in pygame.event.get():
-            if ev.type == pygame.QUIT:
-                stop_flag.set()
-                if running_instr_thread and running_instr_thread.is_alive():
-                    running_instr_thread.join(timeout=0.5)
-                pygame.quit()
-                return 0
-            elif ev.type == pygame.KEYDOWN:
-                # manual control keys: arrows or WASD
-                if ev.key in (pygame.K_UP, pygame.K_w):
-                    control["forward"] = True
-                elif ev.key in (pygame.K_DOWN, pygame.K_s):
-                    control["back"] = True
-                elif ev.key in (pygame.K_LEFT, pygame.K_a):
-                    control["left"] = True
-                elif ev.key in (pygame.K_RIGHT, pygame.K_d):
-                    control["right"] = True
-                # when starting manual control, stop any playback
+    # F3 toggles the profiling overlay; --profile-out records a trace throughout
+    prof = Profiler(trace=bool(args.profile_out))
+    show_profile = False
+
+    # keys 1-9 toggle the planned path of the n-th mission (simulated from the
+    # robot's current pose), P hides them all; T toggles the trail, C clears it
+    PATH_COLORS = (
+        (230, 25, 75, 200),
+        (60, 180, 75, 200),
+        (0, 130, 200, 200),
+        (245, 130, 48, 200),
+        (145, 30, 180, 200),
+        (70, 240, 240, 200),
+        (240, 50, 230, 200),
+        (210, 245, 60, 200),
+        (128, 128, 0, 200),
+    )
+    planned = {}  # mission name -> PathLayer
+    trail = TrailLayer((255, 255, 255, 220))
+    show_trail = True
+
+    def plan_layer(k, name):
+        ps = float(args.pixel_scale)
+        traj = simulate_from_robot(program, mains[name])
+        points = [(px * ps, py * ps) for px, py in zip(traj.x, traj.y)]
+        return PathLayer(points, PATH_COLORS[k % len(PATH_COLORS)])
+
+    # poses (virtual px, heading) of the compared robots while a run plays
+    others = [None] * (len(programs) - 1)
+
+    try:
+        while True:
+            # event handling (mouse/buttons + keyboard)
+            with prof.span("events"):
+                for ev in pygame.event.get():
+                    if ev.type == pygame.QUIT:
+                        pygame.quit()
+                        return 0
+                    elif ev.type == pygame.KEYDOWN:
+                        if ev.key == pygame.K_F3:
+                            show_profile = not show_profile
+                            prof.set_enabled(show_profile)
+                        elif ev.key == pygame.K_HOME:
+                            view.reset()
+                        elif pygame.K_1 <= ev.key <= pygame.K_9:
+                            k = ev.key - pygame.K_1
+                            if k < len(button_rects):
+                                name = button_rects[k][1]
+                                if planned.pop(name, None) is None:
+                                    planned[name] = plan_layer(k, name)
+                        elif ev.key == pygame.K_p:
+                            planned.clear()
+                        elif ev.key == pygame.K_t:
+                            show_trail = not show_trail
+                        elif ev.key == pygame.K_c:
+                            trail.clear()
+                        # manual control keys: arrows or WASD
+                        if ev.key in (pygame.K_UP, pygame.K_w):
+                            control["forward"] = True
+                        elif ev.key in (pygame.K_DOWN, pygame.K_s):
+                            control["back"] = True
+                        elif ev.key in (pygame.K_LEFT, pygame.K_a):
+                            control["left"] = True
+                        elif ev.key in (pygame.K_RIGHT, pygame.K_d):
+                            control["right"] = True
+                        # when starting manual control, stop any playback
+                        if any(control.values()):
+                            playback = None
+                            robot["status"] = "Manual"
+                    elif ev.type == pygame.KEYUP:
+                        if ev.key in (pygame.K_UP, pygame.K_w):
+                            control["forward"] = False
+                        elif ev.key in (pygame.K_DOWN, pygame.K_s):
+                            control["back"] = False
+                        elif ev.key in (pygame.K_LEFT, pygame.K_a):
+                            control["left"] = False
+                        elif ev.key in (pygame.K_RIGHT, pygame.K_d):
+                            control["right"] = False
+                    if ev.type == pygame.MOUSEWHEEL:
+                        mpos = pygame.mouse.get_pos()
+                        if view.rect.collidepoint(mpos):
+                            view.zoom_at(1.25**ev.y, mpos)
+                    elif ev.type == pygame.MOUSEBUTTONDOWN and ev.button in (2, 3):
+                        panning = view.rect.collidepoint(ev.pos)
+                    elif ev.type == pygame.MOUSEBUTTONUP and ev.button in (2, 3):
+                        panning = False
+                    elif ev.type == pygame.MOUSEMOTION and panning:
+                        view.pan(*ev.rel)
+                    if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
+                        mx, my = ev.pos
+                        for rect, name in button_rects:
+                            if rect.collidepoint(mx, my):
+                                # start instructions for this main
+                                playback = start_playback(name)
+                        if stop_rect.collidepoint(mx, my):
+                            playback = None
+                            robot["status"] = "Stopped"
+
+            # manual control movement (applies every frame if keys held)
+            # use a reasonable default dt (frame time)
+            dt = max(1.0 / 60.0, clock.get_time() / 1000.0)
+            with prof.span("sim"):
+                if playback is not None:
+                    t = (time.perf_counter() - playback["t0"]) * time_scale
+                    ps = float(args.pixel_scale)
+                    poses = [
+                        None if tr is None else tr.pose_at(t)
+                        for tr in playback["trajs"]
+                    ]
+                    if poses[0] is not None:
+                        x, y, h, _ = poses[0]
+                        robot["x"], robot["y"], robot["heading"] = (
+                            x * ps,
+                            y * ps,
+                            h % 360,
+                        )
+                    others = [
+                        None if pose is None else (pose[0] * ps, pose[1] * ps, pose[2])
+                        for pose in poses[1:]
+                    ]
+                    if t >= playback["end"]:
+                        traj = playback["trajs"][0]
+                        if playback["note"]:
+                            robot["status"] = playback["note"]
+                        elif traj is not None and any(
+                            w.endswith("left the board") for w in traj.warnings
+                        ):
+                            robot["status"] = "Out of bounds"
+                        else:
+                            robot["status"] = f"Done {playback['name']}"
+                        playback = None
                 if any(control.values()):
-                    stop_flag.set()
-                    if running_instr_thread and running_instr_thread.is_alive():
-                        running_instr_thread.join(timeout=0.2)
-                    with sim_lock:
-                        robot["status"] = "Manual"
-            elif ev.type == pygame.KEYUP:
-                if ev.key in (pygame.K_UP, pygame.K_w):
-                    control["forward"] = False
-                elif ev.key in (pygame.K_DOWN, pygame.K_s):
-                    control["back"] = False
-                elif ev.key in (pygame.K_LEFT, pygame.K_a):
-                    control["left"] = False
-                elif ev.key in (pygame.K_RIGHT, pygame.K_d):
-                    control["right"] = False
-            if ev.type == pygame.MOUSEBUTTONDOWN and ev.button == 1:
-                mx, my = ev.pos
-                for rect, name in button_rects:
-                    if rect.collidepoint(mx, my):
-                        # start instructions for this main
-                        if running_instr_thread and running_instr_thread.is_alive():
-                            stop_flag.set()
-                            running_instr_thread.join(timeout=0.2)
-                        stop_flag.clear()
-                        instr_list = mains.get(name, [])
-                        with sim_lock:
-                            robot["status"] = f"Running {name}"
-                        running_instr_thread = threading.Thread(
-                            target=run_instructions, args=(instr_list,), daemon=True
+                    # forward/back speed in mm/s (adjust as needed)
+                    move_speed_mm_s = 200.0 * float(args.speed_scale)
+                    rot_speed_deg_s = 120.0 * float(args.speed_scale)
+                    # rotation
+                    if control["left"]:
+                        robot["heading"] = (
+                            robot["heading"] - rot_speed_deg_s * dt
+                        ) % 360.0
+                    if control["right"]:
+                        robot["heading"] = (
+                            robot["heading"] + rot_speed_deg_s * dt
+                        ) % 360.0
+                    # translation
+                    if control["forward"] or control["back"]:
+                        dir_mult = 1.0 if control["forward"] else -1.0
+                        dist_mm = move_speed_mm_s * dt * dir_mult
+                        rad = math.radians(robot["heading"])
+                        robot["x"] += dist_mm * args.pixel_scale * math.cos(rad)
+                        robot["y"] += dist_mm * args.pixel_scale * math.sin(rad)
+                        # clamp to virtual board
+                        robot["x"] = max(
+                            board_rect_virtual.left,
+                            min(robot["x"], board_rect_virtual.right),
+                        )
+                        robot["y"] = max(
+                            board_rect_virtual.top,
+                            min(robot["y"], board_rect_virtual.bottom),
                         )
-                        running_instr_thread.start()
-                if stop_rect.collidepoint(mx, my):
-                    stop_flag.set()
-                    with sim_lock:
-                        robot["status"] = "Stopped"
-
-        # manual control movement (applies every frame if keys held)
-        # use a reasonable default dt (frame time)
-        dt = max(1.0 / 60.0, clock.get_time() / 1000.0)
-        if any(control.values()):
-            # stop running instructions if manual control active
-            stop_flag.set()
-            if running_instr_thread and running_instr_thread.is_alive():
-                running_instr_thread.join(timeout=0.2)
-            # forward/back speed in mm/s (adjust as needed)
-            move_speed_mm_s = 200.0 * float(args.speed_scale)
-            rot_speed_deg_s = 120.0 * float(args.speed_scale)
-            with sim_lock:
-                # rotation
-                if control["left"]:
-                    robot["heading"] = (robot["heading"] - rot_speed_deg_s * dt) % 360.0
-                if control["right"]:
-                    robot["heading"] = (robot["heading"] + rot_speed_deg_s * dt) % 360.0
-                # translation
-                if control["forward"] or control["back"]:
-                    dir_mult = 1.0 if control["forward"] else -1.0
-                    dist_mm = move_speed_mm_s * dt * dir_mult
-                    rad = math.radians(robot["heading"])
-                    robot["x"] += dist_mm * args.pixel_scale * math.cos(rad)
-                    robot["y"] += dist_mm * args.pixel_scale * math.sin(rad)
-                    # clamp to virtual board
-                    robot["x"] = max(
-                        board_rect_virtual.left,
-                        min(robot["x"], board_rect_virtual.right),
-                    )
-                    robot["y"] = max(
-                        board_rect_virtual.top,
-                        min(robot["y"], board_rect_virtual.bottom),
-                    )
 
-        # draw
-        screen.fill((200, 200, 200))
-        if board_img_display:
-            screen.blit(board_img_display, board_rect_display.topleft)
-        else:
-            # fill the board area (no border)
-            screen.fill((200, 200, 200), board_rect_display)
-
-        # compute robot display position from virtual coords
-        with sim_lock:
-            rx_disp = int(
-                board_rect_display.left
-                + (robot["x"] - board_rect_virtual.left) * render_scale
-            )
-            ry_disp = int(
-                board_rect_display.top
-                + (robot["y"] - board_rect_virtual.top) * render_scale
-            )
-            rh = robot["heading"]
-            status_text = robot.get("status", "Idle")
-        # robot is a light blue rotated rectangle (robot-centric orientation)
-        ROBOT_SCALE = 0.75
-        ui_scale = max(1.0, 1.0 / max(render_scale, 0.2))
-        rect_w = max(8, int(32 * ROBOT_SCALE * ui_scale))
-        rect_h = max(6, int(20 * ROBOT_SCALE * ui_scale))
-        robot_surf = pygame.Surface((rect_w, rect_h), pygame.SRCALPHA)
-        robot_color = (173, 216, 230)  # light blue
-        robot_surf.fill(robot_color)
-        # draw a darker nose marker
-        pygame.draw.rect(
-            robot_surf,
-            (120, 160, 180),
-            (
-                rect_w - max(4, int(6 * ROBOT_SCALE)),
-                0,
-                max(4, int(6 * ROBOT_SCALE)),
-                rect_h,
-            ),
-        )
-        rot_surf = pygame.transform.rotate(robot_surf, -rh)
-        rs_rect = rot_surf.get_rect(center=(rx_disp, ry_disp))
-        screen.blit(rot_surf, rs_rect.topleft)
-
-        # draw buttons panel directly adjacent to the board (no extra gap)
-        pygame.draw.rect(screen, (220, 220, 220), (x0, 0, bw, args.height))
-        for rect, name in button_rects:
-            pygame.draw.rect(screen, (200, 200, 200), rect)
-            txt = font.render(name, True, (0, 0, 0))
-            screen.blit(txt, (rect.x + 6, rect.y + 6))
-        pygame.draw.rect(screen, (200, 80, 80), stop_rect)
-        stop_txt = font.render("Stop", True, (255, 255, 255))
-        screen.blit(stop_txt, (stop_rect.x + 8, stop_rect.y + 8))
-
-        status_surf = font.render(status_text, True, (0, 0, 0))
-        screen.blit(status_surf, (args.width - bw - pad + 6, args.height - 24))
-
-        pygame.display.flip()
-        clock.tick(60)
+            # draw
+            with prof.span("draw"):
+                screen.fill((200, 200, 200))
+                if pyramid and view.zoom == 1.0:
+                    screen.blit(board_fit, view.rect.topleft)
+                elif pyramid:
+                    pyramid.draw(screen, view)
+                else:
+                    # fill the board area (no border)
+                    screen.fill((200, 200, 200), board_rect_display)
+
+                # compute robot display position from virtual coords
+                rx, ry = robot["x"], robot["y"]
+                rh = robot["heading"]
+                status_text = robot.get("status", "Idle")
+                rx_disp, ry_disp = view.to_screen(rx, ry)
+                trail.add(rx, ry)
+                for layer in planned.values():
+                    layer.draw(screen, view)
+                if show_trail:
+                    trail.draw(screen, view)
+                screen.set_clip(view.rect)
+                for k, pose in enumerate(others):
+                    if pose is not None:
+                        ox, oy = view.to_screen(pose[0], pose[1])
+                        color = PATH_COLORS[k % len(PATH_COLORS)][:3]
+                        draw_robot(
+                            screen, (int(ox), int(oy)), pose[2], view.scale, color
+                        )
+                draw_robot(screen, (int(rx_disp), int(ry_disp)), rh, view.scale)
+                screen.set_clip(None)
+                draw_panel(
+                    screen,
+                    font,
+                    button_rects,
+                    stop_rect,
+                    status_text,
+                    (x0, bw, args.width, args.height, pad),
+                )
+                if show_profile:
+                    draw_overlay(screen, font, prof)
+
+            with prof.span("flip"):
+                pygame.display.flip()
+            clock.tick(60)
+            prof.frame_end()
+    finally:
+        # also on Ctrl-C or a crash mid-run, when the trace is most wanted
+        if args.profile_out:
+            prof.write_trace(args.profile_out)
+            print(f"Wrote profile trace to {Path(args.profile_out).resolve()}")
 
     # unreachable
     return 0
@@ -0,0 +1,395 @@
+"""
+Tune mission constants (gains, speeds) against the headless simulator.
+
+Named constants assigned in a mission (e.g. GAIN = 0.19) are free
+parameters with bounds. Each candidate re-parses the mission with those
+constants overridden, simulates it closed-loop (spike_sim.py) and scores
+
+    cost = w_pos * end position error (mm) + w_heading * end heading error (deg)
+         + w_time * duration (s) + w_wobble * wobble (deg)
+         + penalties (robot left the board, motion never finished)
+
+against a target end pose (by default where the mission ends today, so the
+tuner looks for faster, steadier parameters that keep the same result).
+Wobble is the heading change within each instruction beyond its net change,
+i.e. oscillation around the held heading.
+
+The search is a bounded Nelder-Mead whose candidate points per iteration
+(reflection, expansion and both contractions, or a whole shrink) are
+evaluated as one batch on a process pool. It stops early when the simplex
+has converged or the best cost stops improving. The result is printed as a
+unified diff that sets the best values in the source.
+
+Usage:
+    python spike_tune.py working_spike.py Run_1_Rock --param GAIN=0.05:3
+    python spike_tune.py working_spike.py Run_2_Silo --param GAIN=0.1:4 \\
+        --target 180,110,14 --w-time 2 --patch-out tune.diff
+"""
+
+import argparse
+import ast
+import difflib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from spike_ir import Program
+from spike_sim import DEFAULTS, normalize_angle, simulate
+from spike_to_pygame import const_value, parse_spike_source
+
+WEIGHTS = {
+    "w_pos": 1.0,  # per mm
+    "w_heading": 2.0,  # per degree
+    "w_time": 1.0,  # per second
+    "w_wobble": 0.1,  # per degree
+}
+LEFT_BOARD_PENALTY = 1000.0
+UNFINISHED_PENALTY = 500.0
+
+
+def parse_param(spec):
+    """Split "NAME=LO:HI" into (name, lo, hi)."""
+    try:
+        name, bounds = spec.split("=", 1)
+        lo, hi = (float(v) for v in bounds.split(":", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=LO:HI, got {spec!r}")
+    if not name.isidentifier() or not lo < hi:
+        raise argparse.ArgumentTypeError(f"bad parameter {spec!r}")
+    return name, lo, hi
+
+
+def find_assignments(tree, mission, names):
+    """{name: Assign node} for literal assignments of *names*, looked up in
+    the mission function first, then at module level."""
+    found = {}
+    scopes = [
+        n.body
+        for n in tree.body
+        if isinstance(n, ast.FunctionDef) and n.name == mission
+    ]
+    scopes.append(tree.body)
+    for body in scopes:
+        for stmt in body:
+            if (
+                isinstance(stmt, ast.Assign)
+                and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Name)
+                and stmt.targets[0].id in names
+                and stmt.targets[0].id not in found
+                and isinstance(const_value(stmt.value, {}), (int, float))
+            ):
+                found[stmt.targets[0].id] = stmt
+    return found
+
+
+def wobble(traj):
+    # heading travelled within each instruction beyond its net change
+    total = 0.0
+    n = len(traj)
+    start = 0
+    for k in range(1, n + 1):
+        if k == n or traj.idx[k] != traj.idx[start]:
+            seg = sum(abs(traj.h[j] - traj.h[j - 1]) for j in range(start + 1, k))
+            total += max(0.0, seg - abs(traj.h[k - 1] - traj.h[start]))
+            start = k
+    return total
+
+
+def score(traj, target, weights):
+    """(cost, breakdown dict) of a simulated run."""
+    x, y, h = traj.final_pose()
+    tx, ty, th = target
+    parts = {
+        "pos_mm": ((x - tx) ** 2 + (y - ty) ** 2) ** 0.5,
+        "heading_deg": abs(normalize_angle(h - th)) if th is not None else 0.0,
+        "time_s": traj.duration,
+        "wobble_deg": wobble(traj),
+    }
+    cost = (
+        weights["w_pos"] * parts["pos_mm"]
+        + weights["w_heading"] * parts["heading_deg"]
+        + weights["w_time"] * parts["time_s"]
+        + weights["w_wobble"] * parts["wobble_deg"]
+    )
+    if any(w.endswith("left the board") for w in traj.warnings):
+        cost += LEFT_BOARD_PENALTY
+    if any("did not" in w for w in traj.warnings):
+        cost += UNFINISHED_PENALTY
+    return cost, parts
+
+
+# per-process evaluation state, set once by the pool initializer
+_job = None
+
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+
+def run_candidate(values, job=None):
+    """Simulate the mission with constants *values*; returns the trajectory."""
+    job = job or _job
+    overrides = dict(zip(job["names"], values))
+    program = Program.from_instructions(
+        parse_spike_source(
+            job["src"],
+            job["filename"],
+            wheel_radius_mm=job["sim"]["wheel_radius_mm"],
+            overrides=overrides,
+        )
+    )
+    indices = program.missions().get(job["mission"], ())
+    return simulate(program, indices, **job["sim"])
+
+
+def evaluate(values, job=None):
+    job = job or _job
+    return score(run_candidate(values, job), job["target"], job["weights"])
+
+
+class BatchedNelderMead:
+    """Nelder-Mead on the unit cube (parameters scaled by their bounds) that
+    hands every iteration's candidate points to *evaluate_batch* at once."""
+
+    ALPHA, GAMMA, RHO, SIGMA = 1.0, 2.0, 0.5, 0.5
+
+    def __init__(self, evaluate_batch, x0, step=0.15):
+        self.evaluate_batch = evaluate_batch
+        n = len(x0)
+        points = [list(x0)]
+        for i in range(n):
+            p = list(x0)
+            # step towards the side of the cube with more room
+            p[i] = p[i] + step if p[i] + step <= 1.0 else p[i] - step
+            points.append(p)
+        costs = evaluate_batch(points)
+        self.simplex = sorted(zip(costs, points))
+        self.evaluations = len(points)
+
+    @staticmethod
+    def _clip(p):
+        return [min(1.0, max(0.0, v)) for v in p]
+
+    def _along(self, centroid, worst, t):
+        return self._clip([c + t * (c - w) for c, w in zip(centroid, worst)])
+
+    def step(self):
+        simplex = self.simplex
+        n = len(simplex) - 1
+        best_cost = simplex[0][0]
+        worst_cost, worst = simplex[-1]
+        second_cost = simplex[-2][0]
+        centroid = [sum(p[i] for _, p in simplex[:-1]) / n for i in range(n)]
+
+        # all single-point moves of this iteration, evaluated together
+        cands = [
+            self._along(centroid, worst, self.ALPHA),  # reflection
+            self._along(centroid, worst, self.ALPHA * self.GAMMA),  # expansion
+            self._along(centroid, worst, self.ALPHA * self.RHO),  # outside contraction
+            self._along(centroid, worst, -self.RHO),  # inside contraction
+        ]
+        fr, fe, foc, fic = self.evaluate_batch(cands)
+        self.evaluations += len(cands)
+
+        if fr < best_cost:
+            new = (fe, cands[1]) if fe < fr else (fr, cands[0])
+        elif fr < second_cost:
+            new = (fr, cands[0])
+        elif fr < worst_cost and foc <= fr:
+            new = (foc, cands[2])
+        elif fr >= worst_cost and fic < worst_cost:
+            new = (fic, cands[3])
+        else:
+            new = None
+
+        if new is not None:
+            simplex[-1] = new
+        else:
+            best = simplex[0][1]
+            shrunk = [
+                [b + self.SIGMA * (v - b) for b, v in zip(best, p)]
+                for _, p in simplex[1:]
+            ]
+            costs = self.evaluate_batch(shrunk)
+            self.evaluations += len(shrunk)
+            simplex[1:] = list(zip(costs, shrunk))
+        simplex.sort(key=lambda e: e[0])
+
+    @property
+    def best(self):
+        return self.simplex[0]
+
+    def spread(self):
+        return self.simplex[-1][0] - self.simplex[0][0]
+
+
+def tune(job, bounds, x0, max_evals=300, ftol=1e-3, patience=8, workers=None):
+    """Best (values, cost, parts) found; the search runs on *workers* processes."""
+    lo = [b[0] for b in bounds]
+    span = [b[1] - b[0] for b in bounds]
+
+    def to_values(u):
+        return tuple(round(l + s * v, 4) for l, s, v in zip(lo, span, u))
+
+    cache = {}
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        initializer=_init_worker,
+        initargs=(job,),
+    ) as pool:
+
+        def evaluate_batch(points):
+            values = [to_values(u) for u in points]
+            todo = [v for v in dict.fromkeys(values) if v not in cache]
+            for v, res in zip(todo, pool.map(evaluate, todo)):
+                cache[v] = res
+            return [cache[v][0] for v in values]
+
+        u0 = [(v - l) / s for v, l, s in zip(x0, lo, span)]
+        nm = BatchedNelderMead(evaluate_batch, u0)
+        best_cost = nm.best[0]
+        stale = 0
+        iteration = 0
+        while nm.evaluations < max_evals:
+            nm.step()
+            iteration += 1
+            if nm.best[0] < best_cost - ftol:
+                best_cost = nm.best[0]
+                stale = 0
+            else:
+                stale += 1
+            if nm.spread() <= ftol or stale >= patience:
+                break
+    values = to_values(nm.best[1])
+    cost, parts = cache[values]
+    print(
+        f"{iteration} iterations, {nm.evaluations} evaluations"
+        f" ({len(cache)} distinct)",
+        file=sys.stderr,
+    )
+    return values, cost, parts
+
+
+def format_value(v):
+    return repr(int(v)) if float(v).is_integer() else f"{v:g}"
+
+
+def make_patch(src, filename, assignments, values):
+    """Unified diff setting each assignment's value to *values[name]*."""
+    lines = src.splitlines(keepends=True)
+    new = list(lines)
+    for name, stmt in assignments.items():
+        node = stmt.value
+        if node.lineno != node.end_lineno:
+            continue
+        i = node.lineno - 1
+        line = new[i]
+        # col offsets are utf-8 byte offsets
+        raw = line.encode("utf-8")
+        text = format_value(values[name]).encode("utf-8")
+        new[i] = (raw[: node.col_offset] + text + raw[node.end_col_offset :]).decode(
+            "utf-8"
+        )
+    filename = filename.lstrip("/")
+    return "".join(difflib.unified_diff(lines, new, f"a/{filename}", f"b/{filename}"))
+
+
+def main(argv):
+    p = argparse.ArgumentParser()
+    p.add_argument("spike_file", help="mission source file")
+    p.add_argument("mission", help="mission function to tune, e.g. Run_1_Rock")
+    p.add_argument(
+        "--param",
+        type=parse_param,
+        action="append",
+        required=True,
+        help="free constant with bounds, NAME=LO:HI (repeatable)",
+    )
+    p.add_argument(
+        "--target",
+        default=None,
+        help="target end pose X,Y[,HEADING] in mm/deg (default: current end pose)",
+    )
+    for key, w in WEIGHTS.items():
+        p.add_argument("--" + key.replace("_", "-"), type=float, default=w)
+    p.add_argument("--max-evals", type=int, default=300)
+    p.add_argument("--patience", type=int, default=8, help="iterations without gain")
+    p.add_argument("--workers", type=int, default=None, help="worker processes")
+    p.add_argument("--wheel-radius", type=float, default=DEFAULTS["wheel_radius_mm"])
+    p.add_argument("--wheel-base", type=float, default=DEFAULTS["wheel_base_mm"])
+    p.add_argument("--patch-out", default=None, help="write the patch here")
+    args = p.parse_args(argv[1:])
+
+    path = Path(args.spike_file)
+    src = path.read_text()
+    tree = ast.parse(src, filename=str(path))
+    if not any(
+        isinstance(n, ast.FunctionDef) and n.name == args.mission for n in tree.body
+    ):
+        print(f"{args.mission}: no such mission in {path}")
+        return 1
+    names = [name for name, _, _ in args.param]
+    assignments = find_assignments(tree, args.mission, names)
+    missing = [n for n in names if n not in assignments]
+    if missing:
+        print(f"No literal assignment of {', '.join(missing)} in {args.mission}")
+        return 1
+    bounds = [(lo, hi) for _, lo, hi in args.param]
+    x0 = [
+        min(hi, max(lo, float(const_value(assignments[n].value, {}))))
+        for n, (lo, hi) in zip(names, bounds)
+    ]
+
+    job = {
+        "src": src,
+        "filename": str(path),
+        "mission": args.mission,
+        "names": names,
+        "sim": {
+            "wheel_radius_mm": args.wheel_radius,
+            "wheel_base_mm": args.wheel_base,
+        },
+        "weights": {key: getattr(args, key) for key in WEIGHTS},
+        "target": None,
+    }
+    baseline = run_candidate(tuple(x0), job)
+    if args.target:
+        parts = [float(v) for v in args.target.split(",")]
+        job["target"] = (parts[0], parts[1], parts[2] if len(parts) > 2 else None)
+    else:
+        job["target"] = baseline.final_pose()
+    base_cost, base_parts = score(baseline, job["target"], job["weights"])
+
+    values, cost, parts = tune(
+        job, bounds, x0, args.max_evals, patience=args.patience, workers=args.workers
+    )
+
+    def show(label, vals, c, pts):
+        settings = ", ".join(f"{n}={format_value(v)}" for n, v in zip(names, vals))
+        print(
+            f"{label:8s} {settings}: cost {c:.1f} (end error {pts['pos_mm']:.1f} mm"
+            f" / {pts['heading_deg']:.1f} deg, {pts['time_s']:.2f} s,"
+            f" wobble {pts['wobble_deg']:.1f} deg)",
+            file=sys.stderr,
+        )
+
+    show("current", x0, base_cost, base_parts)
+    show("best", values, cost, parts)
+    if cost >= base_cost:
+        print("No improvement over the current values.", file=sys.stderr)
+        return 0
+
+    patch = make_patch(src, path.as_posix(), assignments, dict(zip(names, values)))
+    if args.patch_out:
+        Path(args.patch_out).write_text(patch)
+        print(f"Wrote patch to {Path(args.patch_out).resolve()}", file=sys.stderr)
+    else:
+        sys.stdout.write(patch)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv))
@@ -0,0 +1,135 @@
+import ast
+import time
+from pathlib import Path
+
+import pytest
+
+from build_hub import build
+
+WORKING_SPIKE = Path(__file__).resolve().parent.parent / "working_spike.py"
+
+SOURCE = '''\
+"""Module docstring."""
+import motor
+import utime
+from hub import port
+
+DEBUG = False
+FLAG = False
+SPEED = 50
+RIGHT = port.B
+UNUSED = 3
+TABLE = [1, 2]
+log = open_log()
+
+
+class Tracker:
+    """Only its used methods should survive."""
+
+    def __init__(self):
+        self.n = 0
+
+    def tick(self):
+        self.n += 1
+        if FLAG:
+            self._debug()
+
+    def _debug(self):
+        print("tracker", self.n)
+
+    def unused(self):
+        return helper()
+
+
+tracker = Tracker()
+spare = Tracker()
+
+
+def helper():
+    return 1
+
+
+def open_log():
+    return []
+
+
+def Run_a():
+    """Mission docstring."""
+    if DEBUG:
+        print("debug")
+    tracker.tick()
+    motor.run_for_degrees(RIGHT, 2 ** 10, SPEED)
+    utime.sleep_ms(SPEED if FLAG else 20)
+
+
+def Run_b():
+    return 10 ** 10 ** 8
+
+
+if __name__ == "__main__":
+    Run_b()
+'''
+
+
+def defs(out):
+    tree = ast.parse(out)
+    names = set()
+    for n in ast.walk(tree):
+        if isinstance(n, (ast.FunctionDef, ast.ClassDef)):
+            names.add(n.name)
+        elif isinstance(n, ast.Assign):
+            names.update(t.id for t in n.targets if isinstance(t, ast.Name))
+    return names
+
+
+def test_entry_build_is_minimal():
+    out = build(SOURCE, "Run_a")
+    compile(out, "<hub>", "exec")
+    assert '"""' not in out
+    assert "debug" not in out
+    assert "motor.run_for_degrees(port.B, 1024, 50)" in out
+    assert "utime.sleep_ms(20)" in out
+    assert out.rstrip().endswith("Run_a()")
+    names = defs(out)
+    assert "Run_b" not in names
+    assert not {"DEBUG", "FLAG", "SPEED", "RIGHT", "UNUSED", "TABLE"} & names
+
+
+def test_dead_methods_are_pruned():
+    names = defs(build(SOURCE, "Run_a"))
+    assert {"Tracker", "__init__", "tick", "tracker"} <= names
+    assert not {"_debug", "unused", "helper"} & names
+
+
+def test_unused_assignment_with_side_effects_is_kept():
+    names = defs(build(SOURCE, "Run_a"))
+    assert {"log", "open_log"} <= names
+    # constructing a class whose __init__ only stores values has no effects
+    assert "spare" not in names
+
+
+def test_huge_power_is_not_folded():
+    t0 = time.perf_counter()
+    out = build(SOURCE, "Run_b")
+    assert time.perf_counter() - t0 < 5
+    assert "10 ** 100000000" in out
+
+
+def test_keep_debug():
+    out = build(SOURCE, "Run_a", keep_debug=True)
+    assert "if DEBUG:" in out and "DEBUG = False" in out
+
+
+def test_unknown_entry():
+    with pytest.raises(SystemExit):
+        build(SOURCE, "Run_missing")
+
+
+@pytest.mark.parametrize("entry", ["launcher", "Run_1_Rock", "Run_7_GREEN"])
+def test_working_spike_builds(entry):
+    out = build(WORKING_SPIKE.read_text(), entry)
+    compile(out, "<hub>", "exec")
+    names = defs(out)
+    # PREDICT and MEM_LOG are off: their helpers are folded out
+    assert not {"HeadingEstimator", "heading_est", "MemoryMonitor", "mem"} & names
+    assert {"gyro_follow", "idle_ms"} <= names
@@ -0,0 +1,124 @@
+import importlib
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+HUB_MODULES = ("color", "color_sensor", "motor", "motor_pair", "runloop", "hub")
+
+
+class Clock:
+    """Stand-in for utime: time only moves when a test advances it."""
+
+    def __init__(self):
+        self.now = 0
+
+    def ticks_ms(self):
+        return self.now
+
+    def ticks_diff(self, a, b):
+        return a - b
+
+    def sleep_ms(self, ms):
+        self.now += ms
+
+
+@pytest.fixture
+def spike(monkeypatch):
+    """working_spike imported against fake hub modules and a fake clock."""
+    clock = Clock()
+    utime = types.ModuleType("utime")
+    for name in ("ticks_ms", "ticks_diff", "sleep_ms"):
+        setattr(utime, name, getattr(clock, name))
+    monkeypatch.setitem(sys.modules, "utime", utime)
+    for name in HUB_MODULES:
+        monkeypatch.setitem(sys.modules, name, mock.MagicMock(name=name))
+    monkeypatch.delitem(sys.modules, "working_spike", raising=False)
+    module = importlib.import_module("working_spike")
+    module.clock = clock
+    yield module
+    sys.modules.pop("working_spike", None)
+
+
+class Pred:
+    """Predicate replaying a list of readings; counts how often it is read."""
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.reads = 0
+
+    def __call__(self):
+        v = self.values[min(self.reads, len(self.values) - 1)]
+        self.reads += 1
+        return v
+
+
+def run(cond, clock, steps, dt=10):
+    out = []
+    for _ in range(steps):
+        out.append(cond())
+        clock.now += dt
+    return out
+
+
+def test_debounce_needs_consecutive_hits(spike):
+    pred = Pred([True, False, True, True, True])
+    cond = spike.Condition(pred, debounce=3)
+    assert run(cond, spike.clock, 5) == [False, False, False, False, True]
+
+
+def test_fires_and_latches(spike):
+    pred = Pred([False, True, False, False])
+    cond = spike.Condition(pred)
+    assert run(cond, spike.clock, 4) == [False, True, True, True]
+    # latched: the predicate isn't read again once fired
+    assert pred.reads == 2
+    cond.reset()
+    assert cond() is False
+
+
+def test_edge_ignores_a_level_already_true(spike):
+    pred = Pred([True, True, False, True])
+    cond = spike.Condition(pred, edge=True)
+    assert run(cond, spike.clock, 4) == [False, False, False, True]
+
+
+def test_period_throttles_reads(spike):
+    pred = Pred([False] * 5 + [True])
+    cond = spike.Condition(pred, period_ms=30)
+    results = run(cond, spike.clock, 18, dt=10)
+    # read at t=0, 30, 60, ...: one read per three checks
+    assert pred.reads == 6
+    assert results.index(True) == 15
+
+
+def test_zero_period_reads_every_check(spike):
+    pred = Pred([False])
+    cond = spike.Condition(pred)
+    run(cond, spike.clock, 7, dt=1)
+    assert pred.reads == 7
+
+
+def test_predicate_errors_count_as_false(spike):
+    def broken():
+        raise OSError("sensor unplugged")
+
+    cond = spike.Condition(broken)
+    assert run(cond, spike.clock, 3) == [False, False, False]
+    assert cond.errors == 3
+
+
+def test_color_is_reads_sensor_every_check(spike):
+    sensor = sys.modules["color_sensor"]
+    sensor.color.side_effect = [1, 1, 6]
+    cond = spike.color_is("F", 6)
+    assert run(cond, spike.clock, 3, dt=1) == [False, False, True]
+    assert sensor.color.call_count == 3
+
+
+def test_as_condition_wraps_plain_callables(spike):
+    assert spike.as_condition(None) is None
+    cond = spike.Condition(Pred([True]))
+    assert spike.as_condition(cond) is cond
+    assert isinstance(spike.as_condition(lambda: False), spike.Condition)
@@ -0,0 +1,101 @@
+from spike_cost import COSTS, analyze
+
+SOURCE = """\
+import color_sensor
+import motor_pair
+import utime
+from hub import motion_sensor, port
+
+DEBUG = False
+
+
+class Condition:
+    def __init__(self, pred, period_ms=0):
+        self.pred = pred
+        self.period_ms = period_ms
+
+    def __call__(self):
+        return bool(self.pred())
+
+
+def as_condition(pred):
+    if pred is None or isinstance(pred, Condition):
+        return pred
+    return Condition(pred)
+
+
+def color_is(p, c):
+    return Condition(lambda: color_sensor.color(p) == c)
+
+
+def yaw():
+    return motion_sensor.tilt_angles()[0] / 10
+
+
+def follow(speed, condition=None):
+    condition = as_condition(condition)
+    while True:
+        error = yaw()
+        motor_pair.move(0, int(error * 2), velocity=speed)
+        if DEBUG:
+            print("yaw", error)
+        if condition is not None and condition():
+            break
+        utime.sleep_ms(10)
+
+
+def Run_a():
+    follow(50, condition=color_is(port.F, 3))
+    follow(50, lambda: color_sensor.reflection(port.E) < 20)
+"""
+
+
+def loop_cost(tmp_path, source=SOURCE, **kw):
+    path = tmp_path / "m.py"
+    path.write_text(source)
+    [(func, _line, cost)] = analyze(path, funcs=("follow",), **kw)
+    assert func == "follow"
+    return cost
+
+
+def names(cost, category):
+    return dict(cost.names.get(category, {}))
+
+
+def test_condition_predicate_sensor_read_is_counted(tmp_path):
+    cost = loop_cost(tmp_path)
+    sensors = names(cost, "sensor_read")
+    assert sensors["motion_sensor.tilt_angles"] == 1
+    # the two predicates cost the same; either one counts, once
+    assert (
+        sensors.get("color_sensor.color", 0) + sensors.get("color_sensor.reflection", 0)
+        == 1
+    )
+    assert cost.counts["sensor_read"] == 2
+    assert names(cost, "hub_call") == {"motor_pair.move": 1}
+    assert cost.counts["condition"] == 1
+    assert cost.sleep_ms == 10
+
+
+def test_more_expensive_predicate_wins(tmp_path):
+    source = SOURCE.replace(
+        "lambda: color_sensor.reflection(port.E) < 20",
+        "lambda: color_sensor.reflection(port.E) < 20 and color_sensor.rgbi(port.E)",
+    )
+    sensors = names(loop_cost(tmp_path, source), "sensor_read")
+    assert sensors["color_sensor.reflection"] == 1
+    assert sensors["color_sensor.rgbi"] == 1
+    assert "color_sensor.color" not in sensors
+
+
+def test_debug_branch_follows_flag(tmp_path):
+    assert "print" not in loop_cost(tmp_path).counts
+    cost = loop_cost(tmp_path, assume={"DEBUG": True})
+    assert names(cost, "print") == {"print": 1}
+    assert cost.work_us(COSTS) > loop_cost(tmp_path).work_us(COSTS)
+
+
+def test_no_predicate_without_call_sites(tmp_path):
+    source = SOURCE.split("def Run_a")[0]
+    cost = loop_cost(tmp_path, source)
+    assert names(cost, "sensor_read") == {"motion_sensor.tilt_angles": 1}
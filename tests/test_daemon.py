@@ -0,0 +1,97 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from spike_daemon import Server, State, handle, request
+
+SOURCE = (
+    "SPEED = 50\n"
+    "def Run_a():\n"
+    "    gyro_follow(heading=0, gain=0.2, speed=SPEED, distance=500)\n"
+)
+
+
+def test_ping():
+    reply = handle(State(), {"op": "ping"})
+    assert reply["ok"] is True
+    assert "ms" in reply
+
+
+def test_simulate_source():
+    state = State()
+    req = {"op": "simulate", "source": SOURCE, "step": 0.5}
+    reply = handle(state, req)
+    assert reply["ok"] is True, reply
+    (res,) = reply["results"]
+    assert res["mission"] == "Run_a"
+    assert res["duration_s"] > 0
+    assert res["samples"][0][0] == 0
+    # the same buffer again comes from the cache
+    assert handle(state, req)["ok"] is True
+    assert state.programs.hits == 1
+
+
+def test_simulate_override_changes_the_run():
+    state = State()
+    slow = handle(state, {"op": "simulate", "source": SOURCE})
+    fast = handle(
+        state, {"op": "simulate", "source": SOURCE, "overrides": {"SPEED": 100}}
+    )
+    assert fast["results"][0]["duration_s"] < slow["results"][0]["duration_s"]
+
+
+def test_unknown_op():
+    reply = handle(State(), {"op": "frobnicate"})
+    assert reply["ok"] is False
+    assert "unknown op 'frobnicate'" in reply["error"]
+
+
+def test_unknown_param():
+    req = {"op": "simulate", "source": SOURCE, "params": {"warp": 9}}
+    reply = handle(State(), req)
+    assert reply["ok"] is False
+    assert "unknown params: warp" in reply["error"]
+
+
+@pytest.mark.parametrize(
+    "overrides, error",
+    [
+        ({"NOPE": 1}, "no literal assignment to override: NOPE"),
+        ({"SPEED": [1]}, "override SPEED must be a number or string, got list"),
+    ],
+)
+def test_bad_overrides(overrides, error):
+    req = {"op": "simulate", "source": SOURCE, "overrides": overrides}
+    reply = handle(State(), req)
+    assert reply["ok"] is False
+    assert error in reply["error"]
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_open_connection_does_not_block_others():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "d.sock")
+        server = Server(path)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+        thread.start()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as held:
+                held.connect(path)
+                held.sendall(b'{"op": "ping"}\n')
+                with held.makefile("rb") as f:
+                    assert json.loads(f.readline())["ok"] is True
+                # the first client keeps its connection open; a second one
+                # is still answered (a single-threaded server would time out)
+                socket.setdefaulttimeout(5)
+                try:
+                    assert request(path, {"op": "stats"})["requests"] == 2
+                finally:
+                    socket.setdefaulttimeout(None)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
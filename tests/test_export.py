@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from spike_export import split_gif, write_gif_frame, write_gif_header  # noqa: E402
+
+PALETTE = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+
+
+def one_frame_gif(pixels, size):
+    """A 4-colour GIF in the simplest valid LZW form: a clear code before
+    every pixel keeps all codes 3 bits wide."""
+    clear, end = 4, 5
+    codes = []
+    for p in pixels:
+        codes += [clear, p]
+    codes.append(end)
+    bits = sum(c << (3 * i) for i, c in enumerate(codes))
+    lzw = bits.to_bytes((3 * len(codes) + 7) // 8, "little")
+    w, h = size
+    return (
+        b"GIF89a"
+        + w.to_bytes(2, "little")
+        + h.to_bytes(2, "little")
+        + bytes([0x81, 0, 0])  # global table of 4 colours
+        + bytes(c for rgb in PALETTE for c in rgb)
+        + b"\x21\xf9\x04\x00\x00\x00\x00\x00"  # an extension to skip
+        + b"\x2c\x00\x00\x00\x00"
+        + w.to_bytes(2, "little")
+        + h.to_bytes(2, "little")
+        + b"\x00\x02"
+        + bytes([len(lzw)])
+        + lzw
+        + b"\x00\x3b"
+    )
+
+
+def test_split_gif():
+    table, interlace, data = split_gif(one_frame_gif([0, 1, 2, 3], (2, 2)))
+    assert table == bytes(c for rgb in PALETTE for c in rgb)
+    assert interlace == 0
+    assert data[0] == 2  # LZW minimum code size
+    assert data[-1] == 0  # closing sub-block
+
+
+def test_streamed_frames_make_a_gif():
+    size = (2, 2)
+    f = io.BytesIO()
+    write_gif_header(f, size)
+    for pixels in ([0, 1, 2, 3], [3, 3, 3, 3]):
+        write_gif_frame(f, size, 5, *split_gif(one_frame_gif(pixels, size)))
+    f.write(b"\x3b")
+    f.seek(0)
+    img = pygame.image.load(f, "anim.gif")
+    assert img.get_size() == size
+    got = [tuple(img.get_at((x, y)))[:3] for y in range(2) for x in range(2)]
+    assert got == PALETTE
+
+
+def test_split_gif_rejects_other_data():
+    with pytest.raises(ValueError, match="not GIF data"):
+        split_gif(b"\x89PNG\r\n\x1a\n" + bytes(16))
@@ -0,0 +1,125 @@
+import pytest
+
+from spike_to_pygame import HANDLERS, load_stub_signatures, parse_spike_source
+
+HEADER = "import motor_pair, utime\n"
+
+
+def parse(body, **kw):
+    return parse_spike_source(HEADER + body, "<test>", **kw)
+
+
+def calls(instructions):
+    return [(i["call"], i["lineno"]) for i in instructions]
+
+
+def test_await_call_is_collected():
+    out = parse(
+        "async def Run_a():\n"
+        "    await motor_pair.move_for_degrees(motor_pair.PAIR_1, 0, 360, velocity=500)\n"
+    )
+    assert len(out) == 1
+    assert out[0]["type"] == "motor_pair_move_for_degrees"
+    assert out[0]["degrees"] == 360
+    assert out[0]["speed"] == 500
+
+
+def test_if_else_follows_one_arm_and_warns():
+    warnings = []
+    out = parse(
+        "def Run_b(side):\n"
+        "    if side:\n"
+        "        gyro_turn(90, 300)\n"
+        "    else:\n"
+        "        gyro_turn(-90, 300)\n",
+        warnings=warnings,
+    )
+    assert [i["heading"] for i in out] == [90]
+    assert warnings == ["<test>:3: if/else with a runtime test: simulating the if arm"]
+
+
+def test_constant_if_takes_the_selected_arm():
+    warnings = []
+    out = parse(
+        "LEFT = 0\n"
+        "def Run_c():\n"
+        "    if LEFT:\n"
+        "        gyro_turn(90, 300)\n"
+        "    else:\n"
+        "        gyro_turn(-90, 300)\n",
+        warnings=warnings,
+    )
+    assert [i["heading"] for i in out] == [-90]
+    assert warnings == []
+
+
+def test_range_loop_unrolls():
+    out = parse(
+        "def Run_d():\n" "    for _ in range(3):\n" "        utime.sleep_ms(100)\n"
+    )
+    assert [i["duration_ms"] for i in out] == [100, 100, 100]
+
+
+def test_other_loop_walks_once_and_warns():
+    warnings = []
+    out = parse(
+        "def Run_e(headings):\n"
+        "    for h in headings:\n"
+        "        gyro_turn(h, 300)\n",
+        warnings=warnings,
+    )
+    assert calls(out) == [("gyro_turn", 4)]
+    assert warnings == ["<test>:3: for-loop with an unknown trip count: walked once"]
+
+
+def test_keyword_and_positional_binding_agree():
+    out = parse(
+        "def Run_f():\n"
+        "    gyro_turn(90, 300)\n"
+        "    gyro_turn(speed=300, heading=90)\n"
+    )
+    a, b = ({k: v for k, v in i.items() if k != "lineno"} for i in out)
+    assert a == b
+
+
+def test_stub_signature_binds_keyword_only_args():
+    sigs = load_stub_signatures()
+    pos, kwonly = sigs["motor_pair.move_for_degrees"]
+    assert pos == ("pair", "steering", "degrees")
+    assert "velocity" in kwonly
+    out = parse(
+        "def Run_g():\n"
+        "    motor_pair.move_for_degrees(motor_pair.PAIR_1, degrees=180, steering=0)\n"
+    )
+    assert out[0]["degrees"] == 180
+    assert out[0]["steering"] == 0
+
+
+def test_every_handler_call_is_recognised():
+    for name in HANDLERS:
+        out = parse("def Run_h():\n    %s()\n" % name)
+        assert out[0]["call"] == name
+        assert out[0]["type"] != "call"
+
+
+def test_unknown_call_keeps_raw_args():
+    out = parse("def Run_i():\n    foo(1, k='x')\n")
+    assert out[0]["type"] == "call"
+    assert out[0]["args_pos"] == [1]
+    assert out[0]["args_kw"] == {"k": "x"}
+
+
+def test_non_mission_functions_are_skipped():
+    assert parse("def helper():\n    gyro_turn(90, 300)\n") == []
+
+
+def test_overrides_replace_literal_constants():
+    src = "SPEED = 300\ndef Run_j():\n    TURN = 90\n    gyro_turn(TURN, SPEED)\n"
+    out = parse(src, overrides={"SPEED": 150, "TURN": 45})
+    assert (out[0]["heading"], out[0]["speed"]) == (45, 150)
+
+
+def test_unknown_override_is_rejected():
+    src = "SPEED = 300\ndef Run_k():\n    gyro_turn(90, SPEED)\n"
+    with pytest.raises(ValueError, match="no literal assignment to override: SPED"):
+        parse(src, overrides={"SPED": 150})
@@ -0,0 +1,91 @@
+import ast
+import math
+
+import pytest
+
+from spike_plan import Grid, Planner, calibrate, check_route, route_code
+from spike_sim import DEFAULTS
+
+BOARD = (1000.0, 600.0)
+OBSTACLE = (450.0, 0.0, 100.0, 400.0)  # wall from the bottom edge, gap above
+SPEED, TURN_SPEED, GAIN = 50, 20, 0.2
+SIM = {
+    "wheel_radius_mm": DEFAULTS["wheel_radius_mm"],
+    "wheel_base_mm": DEFAULTS["wheel_base_mm"],
+    "board_w_mm": BOARD[0],
+    "board_h_mm": BOARD[1],
+}
+START = (150.0, 150.0, 0.0)
+GOAL = (850.0, 150.0)
+
+
+@pytest.fixture(scope="module")
+def timing():
+    return calibrate(SPEED, TURN_SPEED, GAIN, SIM)
+
+
+def planner(timing, *rects):
+    grid = Grid(BOARD[0], BOARD[1], 20.0)
+    for rect in rects:
+        grid.add_rect(*rect)
+    return Planner(grid, 16, 120.0, 100.0, timing)
+
+
+def points(route, start, step=5.0):
+    """Axle positions every *step* mm along the route's follows."""
+    x, y = start[0], start[1]
+    for seg in route:
+        if seg[0] != "follow":
+            continue
+        _, heading, mm = seg
+        dx, dy = math.cos(math.radians(heading)), math.sin(math.radians(heading))
+        for k in range(int(mm / step) + 1):
+            yield x + dx * k * step, y + dy * k * step
+        x, y = x + dx * mm, y + dy * mm
+    yield x, y
+
+
+def inside(p, rect):
+    x, y, w, h = rect
+    return x <= p[0] <= x + w and y <= p[1] <= y + h
+
+
+def test_route_avoids_obstacle(timing):
+    route, est = planner(timing, OBSTACLE).plan(START, GOAL)
+    pts = list(points(route, START))
+    assert not any(inside(p, OBSTACLE) for p in pts)
+    # it had to go round the top of the wall
+    assert max(p[1] for p in pts) > OBSTACLE[1] + OBSTACLE[3]
+    end = pts[-1]
+    assert math.hypot(end[0] - GOAL[0], end[1] - GOAL[1]) < 40
+    # the detour costs time over the open board
+    _, direct = planner(timing).plan(START, GOAL)
+    assert est > direct
+
+
+def test_unreachable_goal(timing):
+    wall = (450.0, 0.0, 100.0, BOARD[1])
+    assert planner(timing, wall).plan(START, GOAL) is None
+
+
+def test_route_code_is_gyro_calls(timing):
+    route, _ = planner(timing, OBSTACLE).plan(START, GOAL)
+    lines = route_code(route, START[2], SPEED, TURN_SPEED, GAIN, SIM["wheel_radius_mm"])
+    assert len(lines) == len(route)
+    for line, seg in zip(lines, route):
+        call = ast.parse(line).body[0].value
+        kw = {k.arg: ast.literal_eval(k.value) for k in call.keywords}
+        assert not call.args
+        if seg[0] == "turn":
+            assert call.func.id == "gyro_turn"
+            assert set(kw) == {"heading", "speed"}
+        else:
+            assert call.func.id == "gyro_follow"
+            assert set(kw) == {"heading", "gain", "speed", "distance"}
+            assert isinstance(kw["distance"], int) and kw["distance"] > 0
+        assert -180 < kw["heading"] <= 180
+
+    traj = check_route(lines, START, SIM)
+    x, y, _ = traj.final_pose()
+    assert traj.warnings == []
+    assert math.hypot(x - GOAL[0], y - GOAL[1]) < 60
@@ -0,0 +1,97 @@
+import math
+
+import pytest
+
+import spike_batch
+from spike_ir import Program
+from spike_sim import DEFAULTS, first_divergence, simulate
+from spike_to_pygame import deg_to_mm, parse_spike_source
+
+
+def program(body):
+    return Program.from_instructions(parse_spike_source(body, "<test>"))
+
+
+FOLLOW = "    gyro_follow(heading={}, gain=0.2, speed=50, distance=500)\n"
+STRAIGHT = "def Run_a():\n" + FOLLOW.format(0)
+
+
+def test_straight_follow_covers_its_distance():
+    traj = simulate(program(STRAIGHT))
+    x, y, h = traj.final_pose()
+    assert x - DEFAULTS["start_x_mm"] == pytest.approx(
+        deg_to_mm(500, DEFAULTS["wheel_radius_mm"]), abs=5
+    )
+    assert y == pytest.approx(DEFAULTS["start_y_mm"], abs=1)
+    assert h == pytest.approx(0, abs=1)
+    assert traj.warnings == []
+
+
+def test_turn_settles_near_target():
+    traj = simulate(program("def Run_b():\n    gyro_turn(heading=90, speed=30)\n"))
+    assert traj.final_pose()[2] == pytest.approx(90, abs=2)
+
+
+def test_unknown_heading_is_skipped_with_warning():
+    traj = simulate(program("def Run_c(h):\n    gyro_turn(heading=h, speed=30)\n"))
+    assert traj.duration == 0
+    assert traj.warnings and "heading unknown" in traj.warnings[0]
+
+
+def test_identical_runs_never_diverge():
+    prog = program(STRAIGHT)
+    assert first_divergence(simulate(prog), simulate(prog), tol_mm=1) is None
+
+
+def test_divergence_time_reflects_start_offset():
+    prog = program(STRAIGHT)
+    a = simulate(prog)
+    b = simulate(prog, start_y_mm=DEFAULTS["start_y_mm"] + 20)
+    assert first_divergence(a, b, tol_mm=10) == 0
+    assert first_divergence(a, b, tol_mm=30) is None
+
+
+def test_divergence_after_different_turns():
+    turn = "    gyro_turn(heading={}, speed=30)\n"
+    a = simulate(program(STRAIGHT + turn.format(90) + FOLLOW.format(90)))
+    b = simulate(program(STRAIGHT + turn.format(-90) + FOLLOW.format(-90)))
+    t = first_divergence(a, b, tol_mm=10)
+    assert t is not None and t > 1.0
+    assert not math.isclose(a.final_pose()[1], b.final_pose()[1])
+
+
+def test_first_divergence_of_empty_trajectory():
+    assert (
+        first_divergence(simulate(program(STRAIGHT), []), simulate(program("")), 1)
+        is None
+    )
+
+
+def test_batch_reports_failing_mission(tmp_path, monkeypatch):
+    path = tmp_path / "m.py"
+    path.write_text(STRAIGHT + "def Run_z():\n    gyro_turn(heading=90, speed=30)\n")
+
+    def flaky(program, indices, **params):
+        if program.source_func(indices[0]) == "Run_z":
+            raise ZeroDivisionError("boom")
+        return simulate(program, indices, **params)
+
+    monkeypatch.setattr(spike_batch, "simulate", flaky)
+    records = spike_batch.analyze_file(str(path), dict(DEFAULTS))
+    assert records[0]["mission"] == "Run_a" and "final_pose" in records[0]
+    assert records[1] == {
+        "file": str(path),
+        "mission": "Run_z",
+        "error": "ZeroDivisionError: boom",
+    }
+
+
+def test_directory_scan_skips_files_without_missions(tmp_path):
+    (tmp_path / "a.py").write_text(STRAIGHT)
+    (tmp_path / "helpers.py").write_text("def gyro_turn(h):\n    pass\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.py").write_text("async def main_main():\n    pass\n")
+    found = [
+        p[len(str(tmp_path)) + 1 :] for p in spike_batch.expand_sources([str(tmp_path)])
+    ]
+    assert found == ["a.py", "sub/b.py"]
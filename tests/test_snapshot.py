@@ -0,0 +1,76 @@
+import pytest
+
+import spike_snapshot
+from spike_ir import Program
+from spike_snapshot import compare, load, save, simulate_all
+from spike_to_pygame import parse_spike_source
+
+MISSIONS = (
+    "def Run_a():\n"
+    "    gyro_follow(heading=0, gain=0.2, speed=50, distance={})\n"
+    "    gyro_turn(heading=90, speed=30)\n"
+    "def Run_b():\n"
+    "    gyro_follow(heading=0, gain=0.2, speed=50, distance=300)\n"
+)
+
+
+def snapshots(distance):
+    program = Program.from_instructions(
+        parse_spike_source(MISSIONS.format(distance), "<test>")
+    )
+    return dict(simulate_all(program, {"step": 0.1}))
+
+
+def test_round_trip(tmp_path):
+    snaps = snapshots(500)
+    path = tmp_path / "m.snap"
+    save(path, list(snaps.values()), 0.1)
+    step, loaded = load(path)
+    assert step == pytest.approx(0.1)
+    assert list(loaded) == ["Run_a", "Run_b"]
+    for name, snap in snaps.items():
+        assert compare(loaded[name], snap, 0.5, 0.5) is None
+        assert list(loaded[name].ins) == list(snap.ins)
+
+
+def test_changed_distance_is_detected(tmp_path):
+    path = tmp_path / "m.snap"
+    save(path, list(snapshots(500).values()), 0.1)
+    _, ref = load(path)
+    cur = snapshots(600)
+    diff = compare(ref["Run_a"], cur["Run_a"], 5.0, 2.0)
+    assert diff is not None
+    # the follow ran longer, so the path left the reference during it
+    assert diff["cur_instruction"] == 0
+    assert diff["end_mm"] > 5.0
+    assert diff["duration_s"] > 0
+    assert compare(ref["Run_b"], cur["Run_b"], 5.0, 2.0) is None
+
+
+def test_main_reports_moved_mission(tmp_path, capsys):
+    src = tmp_path / "m.py"
+    src.write_text(MISSIONS.format(500))
+    assert spike_snapshot.main(["snap", str(src), "--update"]) == 0
+    assert spike_snapshot.main(["snap", str(src)]) == 0
+    src.write_text(MISSIONS.format(600))
+    assert spike_snapshot.main(["snap", str(src)]) == 1
+    out = capsys.readouterr().out
+    assert "Run_a: moved" in out
+    assert "Run_b" not in out.split("Run_a: moved")[1]
+
+
+@pytest.mark.parametrize("cut", [2, 10, 20, 60])
+def test_truncated_snapshot(tmp_path, cut):
+    path = tmp_path / "m.snap"
+    save(path, list(snapshots(500).values()), 0.1)
+    data = path.read_bytes()
+    path.write_bytes(data[: len(data) - cut])
+    with pytest.raises(ValueError, match="truncated snapshot"):
+        load(path)
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "m.snap"
+    path.write_bytes(b"SP")
+    with pytest.raises(ValueError, match="not a snapshot file"):
+        load(path)
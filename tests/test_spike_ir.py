@@ -0,0 +1,103 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from spike_ir import MAGIC, Program, is_program_file
+from spike_to_pygame import parse_spike_file, parse_spike_source
+
+WORKING_SPIKE = Path(__file__).resolve().parent.parent / "working_spike.py"
+
+SOURCE = """\
+import motor, utime
+from hub import port
+
+def Run_a():
+    gyro_follow(heading=0, gain=0.2, speed=50, distance=500)
+    gyro_turn(heading=-90, speed=30)
+    motor.run_for_degrees(port.D, 180, 360)
+    utime.sleep_ms(250)
+    foo(1, 'x', k=[2, 3])
+    bar()
+
+def Run_b():
+    gyro_follow(heading=90, gain=0.2, speed=50, condition=lambda: done())
+"""
+
+
+def roundtrip(instructions, tmp_path):
+    path = tmp_path / "m.spir"
+    Program.from_instructions(instructions).save(path)
+    return Program.load(path).to_instructions(pixel_scale=2)
+
+
+def test_roundtrip_is_exact(tmp_path):
+    instructions = parse_spike_source(SOURCE, "<test>")
+    assert roundtrip(instructions, tmp_path) == instructions
+
+
+def test_roundtrip_of_working_spike_survives_json(tmp_path):
+    instructions = parse_spike_file(WORKING_SPIKE)
+    back = roundtrip(instructions, tmp_path)
+    assert json.loads(json.dumps(back)) == instructions
+
+
+def test_call_args_are_kept(tmp_path):
+    prog = Program.from_instructions(parse_spike_source(SOURCE, "<test>"))
+    prog.save(tmp_path / "m.spir")
+    loaded = Program.load(tmp_path / "m.spir", use_mmap=False)
+    calls = [i for i in range(len(loaded)) if loaded.type(i) == "call"]
+    assert [loaded.call_args(i) for i in calls] == [
+        ([1, "x"], {"k": [2, 3]}),
+        ([], {}),
+    ]
+    assert loaded.call_args(0) is None
+
+
+def test_missions_and_fields(tmp_path):
+    prog = Program.from_instructions(parse_spike_source(SOURCE, "<test>"))
+    assert {k: len(r) for k, r in prog.missions().items()} == {"Run_a": 6, "Run_b": 1}
+    assert prog.get(1, "heading") == -90
+    assert prog.get(1, "gain") is None
+    assert prog.get(2, "port") == "port.D"
+    assert prog.get(6, "distance_deg") is None
+
+
+@pytest.mark.parametrize("data", [b"", MAGIC, b"SPI", b"hello world, not spir"])
+def test_load_rejects_non_spir(tmp_path, data):
+    path = tmp_path / "bad.spir"
+    path.write_bytes(data)
+    with pytest.raises(ValueError, match="not a .spir file"):
+        Program.load(path)
+
+
+def test_load_rejects_truncated(tmp_path):
+    data = Program.from_instructions(parse_spike_source(SOURCE, "<test>")).to_bytes()
+    path = tmp_path / "cut.spir"
+    for cut in (20, 40, len(data) // 2, len(data) - 8):
+        path.write_bytes(data[:cut])
+        with pytest.raises(ValueError, match="not a .spir file"):
+            Program.load(path)
+
+
+def test_is_program_file(tmp_path):
+    path = tmp_path / "m.spir"
+    Program.from_instructions([]).save(path)
+    assert is_program_file(path)
+    assert not is_program_file(WORKING_SPIKE)
+    assert len(Program.load(path)) == 0
+
+
+def test_overlong_string_is_rejected():
+    big = "x" * 70000
+    instructions = parse_spike_source(f"def Run_a():\n    foo('{big}')\n", "<test>")
+    with pytest.raises(ValueError, match="Run_a line 2: args is 70009 bytes"):
+        Program.from_instructions(instructions)
+
+
+def test_missions_without_instructions_are_not_stored(tmp_path):
+    source = SOURCE + "\ndef Run_empty():\n    x = 1\n"
+    Program.from_instructions(parse_spike_source(source, "<test>")).save(
+        tmp_path / "m.spir"
+    )
+    assert list(Program.load(tmp_path / "m.spir").missions()) == ["Run_a", "Run_b"]
@@ -1,28 +1,117 @@
 # LEGO slot:4 autostart
 import color
 import color_sensor
+import gc
 import motor
 import motor_pair
+import runloop
 import utime
-from hub import port, motion_sensor, button
+from hub import port, motion_sensor, button, light_matrix
 from math import copysign, exp
 
+# ---------------- conditions ----------------
 
-def wait_until(pred, timeout=None, poll_ms=10):
-    """Poll until pred() is True. Optional timeout (sec)."""
-    start_ms = utime.ticks_ms()
-    while True:
+
+class Condition:
+    """
+    Sampled stop condition for control loops and waits.
+    pred() is read at most every period_ms; the condition fires (and latches)
+    after `debounce` consecutive True samples. With edge=True it only fires on
+    a False -> True change. Between samples the last result is returned, so
+    calling it every loop iteration costs a ticks_ms() read, not a sensor read.
+    """
+
+    def __init__(self, pred, period_ms=0, debounce=1, edge=False):
+        self.pred = pred
+        self.period_ms = int(period_ms)
+        self.debounce = max(1, int(debounce))
+        self.edge = edge
+        self.reset()
+
+    def reset(self):
+        self.state = False
+        self.armed = not self.edge
+        self.hits = 0
+        self.last_ms = None
+        self.fired_ms = None
+        self.latency_ms = None
+        self.samples = 0
+        self.errors = 0
+
+    def sample(self):
+        self.samples += 1
         try:
-            if pred():
-                return True
+            v = bool(self.pred())
         except Exception:
-            pass
-        if timeout is not None:
-            if utime.ticks_diff(utime.ticks_ms(), start_ms) >= int(
-                float(timeout) * 1000.0
-            ):
+            self.errors += 1
+            v = False
+        if not v:
+            self.hits = 0
+            self.armed = True
+        elif self.armed:
+            self.hits += 1
+            if self.hits >= self.debounce:
+                self.state = True
+                self.fired_ms = utime.ticks_ms()
+
+    def stopped(self):
+        """Record time from firing to the caller having stopped the motors."""
+        if self.fired_ms is not None:
+            self.latency_ms = utime.ticks_diff(utime.ticks_ms(), self.fired_ms)
+            if DEBUG:
+                print(
+                    f"[COND] stop latency={self.latency_ms}ms samples={self.samples} errors={self.errors}"
+                )
+
+    def __call__(self):
+        if self.state:
+            return True
+        now = utime.ticks_ms()
+        if (
+            self.last_ms is None
+            or utime.ticks_diff(now, self.last_ms) >= self.period_ms
+        ):
+            self.last_ms = now
+            self.sample()
+        return self.state
+
+
+def as_condition(pred):
+    if pred is None or isinstance(pred, Condition):
+        return pred
+    return Condition(pred)
+
+
+def color_is(p, c, debounce=1):
+    """Condition: Color Sensor on port p sees color c (read on every check)."""
+    return Condition(lambda: color_sensor.color(p) == c, 0, debounce)
+
+
+def wait_until(pred, timeout=None, poll_ms=10):
+    """Poll until pred() is True. Optional timeout (sec). pred may be a Condition."""
+    cond = as_condition(pred)
+    cond.reset()
+    start_ms = utime.ticks_ms()
+    timeout_ms = None if timeout is None else int(float(timeout) * 1000.0)
+    while not cond():
+        if timeout_ms is not None:
+            if utime.ticks_diff(utime.ticks_ms(), start_ms) >= timeout_ms:
                 return False
         utime.sleep_ms(int(poll_ms))
+    return True
+
+
+def until(pred, timeout=None):
+    """Awaitable for runloop code: `await until(cond, timeout)`."""
+    cond = as_condition(pred)
+    cond.reset()
+    if timeout is None:
+        return runloop.until(cond)
+    start_ms = utime.ticks_ms()
+    timeout_ms = int(float(timeout) * 1000.0)
+    return runloop.until(
+        lambda: cond() or utime.ticks_diff(utime.ticks_ms(), start_ms) >= timeout_ms
+    )
 
 
 # ---------------- helpers ----------------
@@ -60,6 +149,127 @@ def shortest_error(target, current):
     return normalize_angle(float(target) - float(current))
 
 
+# ---------------- heading estimation ----------------
+
+PREDICT = False  # gyro_turn/gyro_follow steer on predicted yaw (HeadingEstimator)
+ACTUATION_LAG_MS = 25  # motor response after a command, on top of measured latency
+YAW_RATE_SIGN = 1  # flip if angular_velocity()[2] turns the opposite way to yaw
+
+
+class HeadingEstimator:
+    """
+    Yaw predicted to when the next motor command takes effect:
+    yaw + rate * (measured read-to-command latency + ACTUATION_LAG_MS),
+    with rate from motion_sensor.angular_velocity()[2] (decidegrees/sec).
+    Call read() at the top of a control loop and commanded() right after
+    the motor command. The motions only use it under `if PREDICT:`, so a
+    hub build with PREDICT off drops it.
+    """
+
+    def __init__(self, lag_ms=ACTUATION_LAG_MS):
+        self.lag_ms = lag_ms
+        self.latency_ms = 0.0
+        self._t_read = None
+
+    def reset(self):
+        self._t_read = None
+
+    def read(self):
+        yaw = yaw_deg()
+        self._t_read = utime.ticks_ms()
+        try:
+            rate = YAW_RATE_SIGN * motion_sensor.angular_velocity()[2] / 10.0
+        except Exception:
+            return yaw
+        return normalize_angle(yaw + rate * (self.latency_ms + self.lag_ms) / 1000.0)
+
+    def commanded(self):
+        if self._t_read is not None:
+            dt = utime.ticks_diff(utime.ticks_ms(), self._t_read)
+            # smoothed, so one slow loop (e.g. a debug print) doesn't jerk it
+            self.latency_ms += (dt - self.latency_ms) * 0.25
+            self._t_read = None
+
+
+heading_est = HeadingEstimator()
+
+
+# ---------------- memory ----------------
+
+MEM_LOG = False  # print free heap and GC activity after every motion ([MEM] lines)
+IDLE_GC_MS = 30  # idle_ms() waits at least this long start with a gc.collect()
+
+
+class MemoryMonitor:
+    """
+    Heap telemetry per motion. With MEM_LOG on, motions call begin() before
+    their control loop and end() once the motors have stopped; end() prints
+    the motion time, free heap, bytes allocated during the motion and gc=1
+    if an automatic collection ran mid-loop (allocated bytes went down).
+    Every call site is gated on MEM_LOG, so a hub build with it off drops
+    the monitor entirely. Collections are meant to happen at safe points
+    instead: at the start of idle_ms() waits (gyro_turn and gyro_follow end
+    with one), so the heap has room for a whole control loop. Automatic GC stays enabled as the fallback;
+    gc.disable() would turn a full heap into a MemoryError.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.alloc0 = 0
+        self.t0 = 0
+        self.motions = 0
+        self.gc_in_motion = 0
+        self.min_free = None
+
+    def begin(self, name):
+        self.name = name
+        self.t0 = utime.ticks_ms()
+        self.alloc0 = gc.mem_alloc()
+
+    def end(self):
+        if self.name is None:
+            return
+        alloc = gc.mem_alloc()
+        free = gc.mem_free()
+        ms = utime.ticks_diff(utime.ticks_ms(), self.t0)
+        ran = alloc < self.alloc0
+        self.motions += 1
+        if ran:
+            self.gc_in_motion += 1
+        if self.min_free is None or free < self.min_free:
+            self.min_free = free
+        print(
+            f"[MEM] {self.name} ms={ms} free={free} alloc={alloc - self.alloc0} gc={int(ran)}"
+        )
+        self.name = None
+
+    def report(self):
+        """Summary line for the run so far; resets the counters."""
+        if self.motions:
+            print(
+                f"[MEM] motions={self.motions} gc_in_motion={self.gc_in_motion} min_free={self.min_free}"
+            )
+        self.__init__()
+
+
+mem = MemoryMonitor()
+
+
+def idle_ms(ms):
+    """
+    utime.sleep_ms() for waits between motions: waits of IDLE_GC_MS or
+    more spend their first few ms on gc.collect(), so the collection
+    costs no extra time and doesn't land in the next control loop.
+    """
+    ms = int(ms)
+    if ms >= IDLE_GC_MS:
+        start = utime.ticks_ms()
+        gc.collect()
+        ms -= utime.ticks_diff(utime.ticks_ms(), start)
+    if ms > 0:
+        utime.sleep_ms(ms)
+
+
 # ---------------- motor/encoder wrappers ----------------
 
 COLLISION_SENSOR = port.F
@@ -113,6 +323,11 @@ def line_follow(speed, gain, target=50, lineside=1, distance=None, condition=Non
     Uses individual motor.run(...) (deg/sec) to drive.
     """
     n_Error = 0.0
+    condition = as_condition(condition)
+    if condition is not None:
+        condition.reset()
+    if MEM_LOG:
+        mem.begin("line_follow")
 
     while True:
         reflect_v = get_reflected_light(COLOUR_SENSOR, default=50)
@@ -146,6 +361,10 @@ def line_follow(speed, gain, target=50, lineside=1, distance=None, condition=Non
         utime.sleep_ms(10)
 
     motor_pair.stop(PAIR_ID)
+    if MEM_LOG:
+        mem.end()
+    if condition is not None:
+        condition.stopped()
 
 
 def gyro_turn(heading, speed=20):
@@ -161,9 +380,13 @@ def gyro_turn(heading, speed=20):
     DECAY = 35  # Higher = slower drop in speed (tune between 25–45)
     TOL = 1.0
     global DEBUG
+    if PREDICT:
+        heading_est.reset()
+    if MEM_LOG:
+        mem.begin("gyro_turn")
 
     while True:
-        current = yaw_deg()
+        current = heading_est.read() if PREDICT else yaw_deg()
         error = shortest_error(target, current)
 
         if abs(error) <= TOL:
@@ -184,10 +407,14 @@ def gyro_turn(heading, speed=20):
             )
 
         motor_pair.move(PAIR_ID, steering, velocity=pct_to_dps(turn_speed))
+        if PREDICT:
+            heading_est.commanded()
         utime.sleep_ms(20)
 
     motor_pair.stop(PAIR_ID)
-    utime.sleep_ms(100)
+    if MEM_LOG:
+        mem.end()
+    idle_ms(100)
 
 
 def gyro_follow(heading, gain=0.2, speed=30, distance=None, condition=None):
@@ -197,19 +424,28 @@ def gyro_follow(heading, gain=0.2, speed=30, distance=None, condition=None):
     gain: proportional gain
     speed: forward % speed
     distance: wheel degrees
-    condition: optional function to break early
+    condition: optional function or Condition to break early
     """
     n_TargetHeading = normalize_angle(heading)
+    condition = as_condition(condition)
+    if condition is not None:
+        condition.reset()
 
     motor.reset_relative_position(RIGHT, 0)
     motor.reset_relative_position(LEFT, 0)
+    if PREDICT:
+        heading_est.reset()
+    if MEM_LOG:
+        mem.begin("gyro_follow")
 
     while True:
-        n_CurrentHeading = yaw_deg()
+        n_CurrentHeading = heading_est.read() if PREDICT else yaw_deg()
         n_Error = shortest_error(n_TargetHeading, n_CurrentHeading)
 
         steering_cmd = int(clamp(-n_Error * gain, -100, 100))
         motor_pair.move(PAIR_ID, steering_cmd, velocity=pct_to_dps(speed))
+        if PREDICT:
+            heading_est.commanded()
 
         done = False
         if distance is not None:
@@ -229,7 +465,11 @@ def gyro_follow(heading, gain=0.2, speed=30, distance=None, condition=None):
         utime.sleep_ms(10)
 
     motor_pair.stop(PAIR_ID)
-    utime.sleep_ms(100)
+    if MEM_LOG:
+        mem.end()
+    if condition is not None:
+        condition.stopped()
+    idle_ms(100)
 
 
 # ---------------- missions ----------------
@@ -243,13 +483,13 @@ def Run_1_Rock():
     gyro_follow(heading=41, gain=-GAIN, speed=-30, distance=-25)
 
     motor.reset_relative_position(RIGHT_ACTUATOR, 0)
-    utime.sleep_ms(100)
+    idle_ms(100)
     motor.run_for_degrees(RIGHT_ACTUATOR, 1800, 1100)
-    utime.sleep_ms(1400)
+    idle_ms(1400)
     motor.run_for_degrees(RIGHT_ACTUATOR, -1000, 1100)
-    utime.sleep_ms(1000)
+    idle_ms(1000)
 
-    utime.sleep_ms(100)
+    idle_ms(100)
     gyro_turn(heading=25, speed=-10)
     gyro_follow(heading=25, gain=GAIN, speed=30, distance=20)
 
@@ -277,9 +517,9 @@ def Run_1_Rock():
     # Score Flag
     motor.reset_relative_position(LEFT_ACTUATOR, 0)
     motor.run_for_degrees(LEFT_ACTUATOR, 170, 120)
-    utime.sleep_ms(1500)
+    idle_ms(1500)
     motor.run_for_degrees(LEFT_ACTUATOR, -150, 150)
-    utime.sleep_ms(750)
+    idle_ms(750)
 
     gyro_follow(heading=-90, gain=-GAIN, speed=-30, distance=-135)
     gyro_turn(heading=88, speed=15)
@@ -287,9 +527,9 @@ def Run_1_Rock():
     # Score Basket
     motor.reset_relative_position(LEFT_ACTUATOR, 0)
     motor.run_for_degrees(LEFT_ACTUATOR, 190, 150)
-    utime.sleep_ms(750)
+    idle_ms(750)
     motor.run_for_degrees(LEFT_ACTUATOR, -140, 150)
-    utime.sleep_ms(750)
+    idle_ms(750)
 
     motor.run_to_absolute_position(LEFT_ACTUATOR, 0, 300)
     motor.run_to_absolute_position(RIGHT_ACTUATOR, 0, 300)
@@ -297,7 +537,6 @@ def Run_1_Rock():
     gyro_follow(heading=87, gain=-GAIN, speed=-70, distance=-800)
     gyro_turn(heading=25, speed=50)
     gyro_follow(heading=25, gain=-GAIN, speed=-100, distance=-1450)
-    utime.sleep(10)
 
 
 def Run_2_Silo():
@@ -312,9 +551,9 @@ def Run_2_Silo():
     # Push Silo lever 5 times
     for i in range(4):
         motor.run_for_degrees(RIGHT_ACTUATOR, 580, 450)
-        utime.sleep_ms(800)
+        idle_ms(800)
         motor.run_for_degrees(RIGHT_ACTUATOR, -580, 375)
-        utime.sleep_ms(1000)
+        idle_ms(1000)
 
     motor.run_to_absolute_position(LEFT_ACTUATOR, 0, 300)
     motor.run_to_absolute_position(RIGHT_ACTUATOR, 0, 300)
@@ -322,15 +561,13 @@ def Run_2_Silo():
     gyro_turn(heading=15)
     gyro_follow(heading=15, gain=-0.2, speed=-60, distance=-850)
 
-    utime.sleep(10)
-
 
 def Run_3_Travel():
     GAIN = 2
     motor.run_to_absolute_position(RIGHT_ACTUATOR, 0, 1000)
     motor.run_to_absolute_position(LEFT_ACTUATOR, 0, 1000)
 
-    utime.sleep_ms(300)
+    idle_ms(300)
     motor.reset_relative_position(RIGHT_ACTUATOR, 0)
     motor.reset_relative_position(LEFT_ACTUATOR, 0)
 
@@ -353,24 +590,24 @@ def Run_3_Travel():
     # Score Roof
     gyro_follow(heading=42, gain=GAIN, speed=55, distance=50)
     motor.run_for_degrees(RIGHT_ACTUATOR, 400, 360)
-    utime.sleep_ms(1500)
+    idle_ms(1500)
     gyro_follow(heading=42, gain=-GAIN, speed=-50, distance=-300)
     gyro_follow(heading=42, gain=GAIN, speed=50, distance=100)
     motor.run_for_degrees(RIGHT_ACTUATOR, -400, 360)
-    utime.sleep_ms(250)
+    idle_ms(250)
     gyro_follow(heading=42, gain=-GAIN, speed=-50, distance=-200)
 
     # Travel
     gyro_turn(heading=90)
     motor.run_for_degrees(LEFT_ACTUATOR, -580, 360)
-    utime.sleep_ms(200)
+    idle_ms(200)
     gyro_follow(heading=90, gain=GAIN, speed=50, distance=575)
 
     # Collect sample
     gyro_turn(heading=0)
     gyro_follow(heading=0, gain=GAIN, speed=40, distance=200)
     motor.run_for_degrees(LEFT_ACTUATOR, 180, 450)
-    utime.sleep_ms(300)
+    idle_ms(300)
     gyro_follow(heading=0, gain=-GAIN, speed=-50, distance=-340)
     motor.run_for_degrees(LEFT_ACTUATOR, 360, 360)
 
@@ -386,10 +623,10 @@ def Run_3_Travel():
 
     # Statue
     motor.run_for_degrees(RIGHT_ACTUATOR, 400, 360)
-    utime.sleep_ms(1000)
+    idle_ms(1000)
     gyro_turn(heading=-10, speed=20)
     motor.run_for_degrees(RIGHT_ACTUATOR, -400, 360)
-    utime.sleep_ms(2000)
+    idle_ms(2000)
 
     gyro_turn(heading=90, speed=20)
     gyro_follow(heading=90, gain=GAIN, speed=50, distance=250)
@@ -398,11 +635,11 @@ def Run_3_Travel():
     gyro_follow(heading=45, gain=GAIN, speed=50, distance=675)
     gyro_turn(heading=-47, speed=20)
     motor.run_for_degrees(RIGHT_ACTUATOR, 400, 360)
-    utime.sleep_ms(200)
+    idle_ms(200)
     gyro_follow(heading=-47, gain=GAIN, speed=50, distance=500)
     gyro_follow(heading=53, gain=GAIN, speed=40, distance=100)
     motor.run_for_degrees(RIGHT_ACTUATOR, -200, 360)
-    utime.sleep_ms(3000)
+    idle_ms(3000)
     gyro_follow(heading=-47, gain=-GAIN, speed=-50, distance=-800)
     gyro_follow(heading=0, gain=-GAIN, speed=-75, distance=600)
 
@@ -417,22 +654,22 @@ def Run_7_GREEN():
         heading=9, gain=GAIN, speed=40, distance=250
     )  # forward to activate mission 2
     motor.run_for_degrees(LEFT_ACTUATOR, -560, 1100)  # lift brush
-    utime.sleep_ms(500)
+    idle_ms(500)
     gyro_follow(
         heading=9, gain=GAIN, speed=40, distance=200
     )  # forward to activate mission 2
     gyro_follow(heading=4, gain=-GAIN, speed=-40, distance=-200)  # reverse
     gyro_turn(heading=0, speed=20)  # recenter
 
-    utime.sleep_ms(50)
+    idle_ms(50)
     gyro_follow(
         heading=0,
         gain=-GAIN,
         speed=-100,
         distance=None,
-        condition=lambda: (color_sensor.color(COLLISION_SENSOR)) == color.GREEN,
+        condition=color_is(COLLISION_SENSOR, color.GREEN),
     )  # reverse until hit wall
-    utime.sleep_ms(1000)
+    idle_ms(1000)
 
 
 def Run_4_Drop():
@@ -451,11 +688,11 @@ def Run_5_Crane():
     gyro_follow(heading=0, gain=GAIN, speed=50, distance=400)
     # Raise Crane
     gyro_turn(heading=-84, speed=25)
-    utime.sleep_ms(100)
+    idle_ms(100)
     gyro_follow(heading=-84, gain=GAIN, speed=40, distance=253)
     gyro_turn(heading=-84, speed=25)
     motor.run_for_degrees(LEFT_ACTUATOR, -800, -200)
-    utime.sleep_ms(2500)
+    idle_ms(2500)
 
     gyro_follow(heading=-90, gain=-GAIN, speed=-40, distance=-250)
     gyro_turn(heading=0, speed=40)
@@ -468,22 +705,22 @@ def Run_6_Boat():
     GAIN = 2
     # Uncover Boat
     gyro_follow(heading=-1, gain=GAIN, speed=50, distance=820)
-    utime.sleep_ms(200)
+    idle_ms(200)
     gyro_follow(heading=0, gain=-GAIN, speed=-55, distance=-120)
 
     # Raise Boat
     gyro_turn(heading=75, speed=25)
-    utime.sleep_ms(100)
+    idle_ms(100)
     gyro_follow(heading=75, gain=GAIN, speed=40, distance=180)
     gyro_turn(heading=0, speed=25)
     gyro_follow(heading=0, gain=GAIN, speed=40, distance=300)
-    utime.sleep_ms(100)
+    idle_ms(100)
 
     # Drop Flag
     motor.run_for_degrees(RIGHT_ACTUATOR, 120, 100)
-    utime.sleep_ms(1500)
+    idle_ms(1500)
     motor.run_for_degrees(RIGHT_ACTUATOR, -120, 100)
-    utime.sleep_ms(500)
+    idle_ms(500)
 
     gyro_follow(heading=10, gain=-GAIN, speed=-100, distance=-1000)
     print("done")
@@ -493,6 +730,81 @@ def Run_Away():
     gyro_follow(heading=0, gain=0.2, speed=75, distance=3700)
 
 
-if __name__ == "__main__":
+# ---------------- launcher ----------------
+
+# what to re-zero before a run starts (drive encoders are reset by gyro_follow)
+ZERO_YAW = 1
+# actuator relative positions, for runs using motor.run_to_relative_position();
+# run_for_degrees and run_to_absolute_position don't depend on them
+ZERO_ACTUATORS = 2
+
+# planned match order: (matrix label, mission, re-zero flags)
+RUNS = [
+    ("1", Run_1_Rock, ZERO_YAW),
+    ("2", Run_2_Silo, ZERO_YAW),
+    ("3", Run_3_Travel, ZERO_YAW),
+    ("4", Run_4_Drop, ZERO_YAW),
+    ("5", Run_5_Crane, ZERO_YAW),
+    ("6", Run_6_Boat, ZERO_YAW),
+    ("7", Run_7_GREEN, ZERO_YAW),
+    ("A", Run_Away, ZERO_YAW),
+]
+
+
+def read_press():
+    """
+    Wait for a press of LEFT and/or RIGHT and for its release: -1 for LEFT,
+    1 for RIGHT, 0 if both were held together at any point (a chord).
+    Returning only after the release keeps hands off the robot at start.
+    """
+    while not (button.pressed(button.LEFT) or button.pressed(button.RIGHT)):
+        utime.sleep_ms(20)
+    left = right = False
+    while True:
+        held_left = button.pressed(button.LEFT)
+        held_right = button.pressed(button.RIGHT)
+        if not (held_left or held_right):
+            break
+        left = left or held_left
+        right = right or held_right
+        utime.sleep_ms(10)
+    if left and right:
+        return 0
+    return -1 if left else 1
+
+
+def rezero(flags):
+    if flags & ZERO_ACTUATORS:
+        motor.reset_relative_position(RIGHT_ACTUATOR, 0)
+        motor.reset_relative_position(LEFT_ACTUATOR, 0)
+    if flags & ZERO_YAW:
+        motion_sensor.reset_yaw(0)
+
+
+def launcher(start=0):
+    """
+    Resident mission launcher: init() once, then LEFT/RIGHT pick a run and
+    pressing LEFT+RIGHT together starts it. CENTER is left alone: the
+    firmware uses it to stop the program. Advances to the next planned run
+    when one finishes.
+    """
     init()
-    Run_3_Travel()
+    idx = start % len(RUNS)
+    while True:
+        label, run, flags = RUNS[idx]
+        light_matrix.write(label)
+        step = read_press()
+        if step:
+            idx = (idx + step) % len(RUNS)
+            continue
+        rezero(flags)
+        gc.collect()
+        run()
+        motor_pair.stop(PAIR_ID)
+        if MEM_LOG:
+            mem.report()
+        idx = (idx + 1) % len(RUNS)
+
+
+if __name__ == "__main__":
+    launcher()